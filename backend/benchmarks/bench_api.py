@@ -0,0 +1,358 @@
+"""
+Banc de charge reproductible de l'API : débit et latences p50/p95/p99 par route, en JSON.
+
+- Jeu de données synthétique configurable (10k cours, 200k leçons, 5k quiz par défaut) dans une
+  base SQLite fichier, migrée comme en production ; il est réutilisé tant que ses paramètres ne changent pas.
+- Le Blob Storage est remplacé par le bouchon local des tests (uploads et signatures SAS).
+- La vraie application tourne sous uvicorn ; des clients aiohttp concurrents jouent un mélange
+  de routes tiré au sort avec une graine fixe (même séquence de requêtes à chaque exécution).
+
+Usage :
+    python -m backend.benchmarks.bench_api run [--courses 10000] [--lessons 200000] [--quizzes 5000]
+        [--requests 20000] [--concurrency 64] [--output rapport.json] [--baseline reference.json]
+    python -m backend.benchmarks.bench_api compare reference.json rapport.json [--threshold 0.2]
+
+Avec --baseline (ou en mode compare), le code de sortie est 1 si une route régresse au-delà du seuil :
+à lancer sur chaque PR, avec une référence produite sur la même machine (run --output reference.json).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import aiohttp
+
+from .bench_async import free_port, wait_until_up
+from .bench_search import percentile
+
+BENCH_DIR = os.getenv("BENCH_DIR", os.path.join(tempfile.gettempdir(), "bench-api"))
+
+QUESTIONS_PER_QUIZ = 10
+CHOICES_PER_QUESTION = 3
+WORDS = ["python", "cloud", "azure", "données", "réseau", "sécurité", "design", "marketing", "gestion", "api",
+         "docker", "sql", "statistiques", "react", "devops", "finance", "linux", "machine", "learning", "web"]
+CATEGORIES = ["Programming", "Cloud", "Data Science", "Design", "Marketing", "Business"]
+LEVELS = ["Beginner", "Intermediate", "Advanced"]
+
+
+# --- JEU DE DONNÉES ---
+def _question_id(quiz_id: int, index: int) -> int:
+    return (quiz_id - 1) * QUESTIONS_PER_QUIZ + index + 1
+
+def _choice_id(question_id: int, index: int) -> int:
+    return (question_id - 1) * CHOICES_PER_QUESTION + index + 1
+
+
+def seed(db_path: str, courses: int, lessons: int, quizzes: int, seed_value: int = 0):
+    """Base migrée puis remplie par insertions en lot ; ids explicites pour construire les requêtes sans relire la base"""
+    from sqlalchemy import insert
+    from sqlmodel import create_engine
+    from ..migrations import migrate
+    from ..models import Course, Lesson, Quiz, QuizQuestion, QuizChoice
+    from ..services.ordering import ORDER_GAP
+
+    signature = {"courses": courses, "lessons": lessons, "quizzes": quizzes, "seed": seed_value}
+    meta_path = db_path + ".json"
+    if os.path.exists(db_path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            if json.load(f) == signature:
+                print(f"Jeu de données réutilisé : {db_path}")
+                return
+        os.unlink(db_path)
+    elif os.path.exists(db_path):
+        os.unlink(db_path)
+
+    start = time.perf_counter()
+    rng = random.Random(seed_value)
+    engine = create_engine(f"sqlite:///{db_path}")
+    migrate(engine)
+    origin = datetime(2024, 1, 1)
+
+    def chunks(rows, size=20_000):
+        for i in range(0, len(rows), size):
+            yield rows[i:i + size]
+
+    with engine.begin() as conn:
+        rows = [
+            {
+                "id": c, "title": f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} {c}", "description": "Cours synthétique",
+                "category": CATEGORIES[c % len(CATEGORIES)], "level": LEVELS[c % len(LEVELS)], "slug": f"cours-{c}",
+                "created_at": origin + timedelta(minutes=c), "version": 0,
+            }
+            for c in range(1, courses + 1)
+        ]
+        for chunk in chunks(rows):
+            conn.execute(insert(Course.__table__), chunk)
+
+        rows = []
+        for l in range(1, lessons + 1):
+            course_id = (l - 1) % courses + 1
+            is_file = l % 3 == 0
+            rows.append({
+                "id": l, "course_id": course_id, "order": ((l - 1) // courses + 1) * ORDER_GAP,
+                "title": f"Leçon {rng.choice(WORDS)} {rng.choice(WORDS)} {l}", "description": None,
+                "content_type": "pdf" if is_file else "text",
+                "content_url": f"bench/{l}.pdf" if is_file else None,
+                "content_text": None if is_file else " ".join(rng.choice(WORDS) for _ in range(40)),
+            })
+        for chunk in chunks(rows):
+            conn.execute(insert(Lesson.__table__), chunk)
+
+        conn.execute(insert(Quiz.__table__), [
+            {"id": q, "title": f"Quiz {q}", "description": None, "order": 0, "course_id": (q - 1) % courses + 1}
+            for q in range(1, quizzes + 1)
+        ])
+        questions = [
+            {"id": _question_id(q, j), "quiz_id": q, "text": f"Question {j}", "points": 1}
+            for q in range(1, quizzes + 1) for j in range(QUESTIONS_PER_QUIZ)
+        ]
+        for chunk in chunks(questions):
+            conn.execute(insert(QuizQuestion.__table__), chunk)
+        choices = [
+            {"id": _choice_id(question["id"], k), "question_id": question["id"], "text": f"Choix {k}", "is_correct": k == 1}
+            for question in questions for k in range(CHOICES_PER_QUESTION)
+        ]
+        for chunk in chunks(choices):
+            conn.execute(insert(QuizChoice.__table__), chunk)
+    engine.dispose()
+
+    with open(meta_path, "w") as f:
+        json.dump(signature, f)
+    print(f"Jeu de données créé en {time.perf_counter() - start:.1f} s : {db_path}")
+
+
+# --- SCÉNARIOS (route, poids, fabrique de requête) ---
+def scenarios(args):
+    # Les cours, leçons et quiz les plus consultés sont toujours les mêmes (ensemble chaud borné)
+    hot_courses = max(1, min(args.courses, args.courses // 10))
+    hot_lessons = max(1, min(args.lessons, args.lessons // 10))
+    hot_quizzes = max(1, min(args.quizzes, args.quizzes // 10))
+
+    def submit(rng):
+        quiz_id = rng.randint(1, hot_quizzes)
+        answers = [
+            {"question_id": _question_id(quiz_id, j), "choice_id": _choice_id(_question_id(quiz_id, j), rng.randrange(CHOICES_PER_QUESTION))}
+            for j in range(QUESTIONS_PER_QUIZ)
+        ]
+        return "POST", f"/api/quiz/{quiz_id}/submit", {"json": answers}
+
+    return [
+        ("GET /api/courses", 10, lambda rng: ("GET", f"/api/courses?limit=20&category={rng.choice(CATEGORIES)}", None)),
+        ("GET /api/courses/{slug_or_id}/full", 15, lambda rng: ("GET", f"/api/courses/cours-{rng.randint(1, hot_courses)}/full", None)),
+        ("GET /api/courses/{course_id}/lessons", 15, lambda rng: ("GET", f"/api/courses/{rng.randint(1, hot_courses)}/lessons", None)),
+        ("GET /api/lessons/{lesson_id}", 20, lambda rng: ("GET", f"/api/lessons/{rng.randint(1, hot_lessons)}", None)),
+        ("GET /api/quiz/{quiz_id}", 10, lambda rng: ("GET", f"/api/quiz/{rng.randint(1, hot_quizzes)}", None)),
+        ("POST /api/quiz/{quiz_id}/submit", 10, submit),
+        ("GET /api/search", 10, lambda rng: ("GET", f"/api/search?q={rng.choice(WORDS)}+{rng.choice(WORDS)[:3]}", None)),
+        ("POST /api/storage/sign", 5, lambda rng: ("POST", "/api/storage/sign", {"json": {"course_id": rng.randint(1, hot_courses)}})),
+        # Contenu unique par requête : mesure un vrai envoi, pas la déduplication
+        ("POST /api/upload", 5, lambda rng: ("POST", "/api/upload", {"upload": b"%PDF-1.4 " + rng.randbytes(16) + bytes(16 * 1024)})),
+    ]
+
+
+def build_plan(args, total: int, seed_value: int):
+    """Séquence de requêtes déterministe (même graine => mêmes requêtes)"""
+    rng = random.Random(seed_value)
+    table = scenarios(args)
+    routes = [name for name, _, _ in table]
+    weights = [weight for _, weight, _ in table]
+    factories = {name: factory for name, _, factory in table}
+    return [(route, *factories[route](rng)) for route in rng.choices(routes, weights=weights, k=total)]
+
+
+# --- CHARGE ---
+async def drive(base_url: str, plan, concurrency: int):
+    results = {}
+    queue = iter(plan)
+
+    async def client(http):
+        for route, method, path, options in queue:
+            kwargs = {}
+            if options and "json" in options:
+                kwargs["json"] = options["json"]
+            elif options and "upload" in options:
+                form = aiohttp.FormData()
+                form.add_field("file", options["upload"], filename="bench.pdf", content_type="application/pdf")
+                kwargs["data"] = form
+            start = time.perf_counter()
+            try:
+                async with http.request(method, base_url + path, **kwargs) as response:
+                    await response.read()
+                    ok = response.status < 400
+            except aiohttp.ClientError:
+                ok = False
+            stats = results.setdefault(route, {"latencies": [], "errors": 0})
+            stats["latencies"].append(time.perf_counter() - start)
+            stats["errors"] += not ok
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(http) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def summarize(results: dict, elapsed: float) -> dict:
+    def stats(latencies, errors):
+        return {
+            "count": len(latencies),
+            "errors": errors,
+            "rps": round(len(latencies) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        }
+
+    routes = {route: stats(r["latencies"], r["errors"]) for route, r in sorted(results.items())}
+    all_latencies = [l for r in results.values() for l in r["latencies"]]
+    return {"routes": routes, "total": stats(all_latencies, sum(r["errors"] for r in results.values()))}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run(args) -> dict:
+    from ..tests.azurite_stub import ACCOUNT_KEY, ACCOUNT_NAME, AzuriteStub
+
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    db_path = os.path.join(BENCH_DIR, f"bench-{args.courses}-{args.lessons}-{args.quizzes}.db")
+    seed(db_path, args.courses, args.lessons, args.quizzes, args.seed)
+
+    with AzuriteStub(discard_content=True) as stub:
+        port = free_port()
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{db_path}",
+            "ASYNC_DATABASE_URL": f"sqlite+aiosqlite:///{db_path}",
+            "STORAGE_ACCOUNT_CONNECTION_STRING": stub.connection_string,
+            "storage_account_name": ACCOUNT_NAME,
+            "STORAGE_ACCOUNT_KEY": ACCOUNT_KEY,
+            "SEARCH_INDEX_PATH": os.path.join(BENCH_DIR, f"search-{args.courses}-{args.lessons}.json"),
+        }
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--workers", str(args.workers),
+             "--log-level", "warning", "--no-access-log"],
+            env=env, stdout=subprocess.DEVNULL,
+        )
+        try:
+            wait_until_up(port, process, timeout=120)
+            base_url = f"http://127.0.0.1:{port}"
+            # Échauffement (index de recherche, caches, pool) avec une autre graine : non mesuré
+            asyncio.run(drive(base_url, build_plan(args, args.warmup, args.seed + 1), args.concurrency))
+            results, elapsed = asyncio.run(drive(base_url, build_plan(args, args.requests, args.seed), args.concurrency))
+        finally:
+            process.terminate()
+            process.wait()
+
+    report = summarize(results, elapsed)
+    report["meta"] = {
+        "revision": git_revision(),
+        "date": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "dataset": {"courses": args.courses, "lessons": args.lessons, "quizzes": args.quizzes, "seed": args.seed},
+        "load": {"requests": args.requests, "concurrency": args.concurrency, "workers": args.workers},
+        "elapsed_s": round(elapsed, 3),
+    }
+    return report
+
+
+# --- COMPARAISON À UNE RÉFÉRENCE ---
+def compare(baseline: dict, current: dict, threshold: float, min_delta_ms: float):
+    """Liste des régressions : latence p50/p95 ou débit dégradés de plus de `threshold` (ratio), ou nouvelles erreurs"""
+    regressions = []
+    for route, base in baseline["routes"].items():
+        now = current["routes"].get(route)
+        if now is None:
+            regressions.append(f"{route} : absente du rapport")
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            if now[metric] > base[metric] * (1 + threshold) and now[metric] - base[metric] >= min_delta_ms:
+                regressions.append(f"{route} : {metric} {base[metric]:.1f} -> {now[metric]:.1f}")
+        if now["rps"] < base["rps"] * (1 - threshold):
+            regressions.append(f"{route} : débit {base['rps']:.1f} -> {now['rps']:.1f} req/s")
+        if now["errors"] > base["errors"]:
+            regressions.append(f"{route} : erreurs {base['errors']} -> {now['errors']}")
+    return regressions
+
+
+def print_report(report: dict, baseline: dict = None):
+    print(f"  {'route':<38} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'err':>5}" + ("   p95 réf." if baseline else ""))
+    for route, r in [*report["routes"].items(), ("TOTAL", report["total"])]:
+        line = f"  {route:<38} {r['rps']:8.1f} {r['p50_ms']:6.1f}ms {r['p95_ms']:6.1f}ms {r['p99_ms']:6.1f}ms {r['errors']:5d}"
+        ref = (baseline or {}).get("routes", {}).get(route) if route != "TOTAL" else (baseline or {}).get("total")
+        if ref:
+            line += f"   {ref['p95_ms']:6.1f}ms"
+        print(line)
+
+
+def check(baseline_path: str, report: dict, threshold: float, min_delta_ms: float) -> int:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print_report(report, baseline)
+    if baseline.get("meta", {}).get("dataset") != report.get("meta", {}).get("dataset"):
+        print("Attention : jeu de données différent de celui de la référence")
+    regressions = compare(baseline, report, threshold, min_delta_ms)
+    for line in regressions:
+        print(f"RÉGRESSION {line}")
+    if regressions:
+        return 1
+    print(f"Aucune régression au-delà de {threshold:.0%}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc de charge de l'API")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Lance le banc et écrit le rapport JSON")
+    run_parser.add_argument("--courses", type=int, default=10_000)
+    run_parser.add_argument("--lessons", type=int, default=200_000)
+    run_parser.add_argument("--quizzes", type=int, default=5_000)
+    run_parser.add_argument("--requests", type=int, default=20_000)
+    run_parser.add_argument("--warmup", type=int, default=2_000)
+    run_parser.add_argument("--concurrency", type=int, default=64)
+    run_parser.add_argument("--workers", type=int, default=1)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--output", default=os.path.join(BENCH_DIR, "report.json"))
+    run_parser.add_argument("--baseline", help="Rapport de référence : code de sortie 1 en cas de régression")
+
+    compare_parser = commands.add_parser("compare", help="Compare un rapport à une référence")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("report")
+
+    for p in (run_parser, compare_parser):
+        p.add_argument("--threshold", type=float, default=0.2, help="Dégradation tolérée (0.2 = 20%%)")
+        p.add_argument("--min-delta-ms", type=float, default=2.0, help="Écart de latence ignoré en dessous (bruit)")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.report) as f:
+            report = json.load(f)
+        sys.exit(check(args.baseline, report, args.threshold, args.min_delta_ms))
+
+    report = run(args)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Rapport : {args.output}")
+    if args.baseline:
+        sys.exit(check(args.baseline, report, args.threshold, args.min_delta_ms))
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Débit (requêtes/s) d'une route de lecture en synchrone vs asynchrone, à nombre de workers égal.
+
+La BDD est un fichier SQLite dont chaque requête est ralentie de --latency-ms pour simuler
+l'aller-retour réseau vers Azure SQL :
+- "sync"  : ancien chemin, handler `def` + Session (un thread du pool Starlette par requête en attente)
+- "async" : la vraie application (handler `async def` + AsyncSession sur aiosqlite)
+
+Le générateur de charge tourne sur la même machine : avec peu de cœurs, le CPU plafonne
+les deux modes et l'écart n'apparaît qu'avec une latence plus forte (ex: --latency-ms 200).
+
+Usage : python -m backend.benchmarks.bench_async [--workers 1] [--concurrency 200] [--requests 3000] [--latency-ms 50]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+from .bench_search import percentile
+
+BENCH_DB_PATH = os.getenv("BENCH_DB_PATH", os.path.join(tempfile.gettempdir(), "bench-async.db"))
+BENCH_LATENCY_MS = float(os.getenv("BENCH_LATENCY_MS", "50"))
+BENCH_POOL_SIZE = int(os.getenv("BENCH_POOL_SIZE", "200"))
+
+# --- LATENCE SIMULÉE (côté "serveur" : l'attente se fait dans le thread qui porte la connexion) ---
+class SlowCursor(sqlite3.Cursor):
+    def execute(self, *args, **kwargs):
+        time.sleep(BENCH_LATENCY_MS / 1000)
+        return super().execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        time.sleep(BENCH_LATENCY_MS / 1000)
+        return super().executemany(*args, **kwargs)
+
+
+class SlowConnection(sqlite3.Connection):
+    def cursor(self, factory=SlowCursor):
+        return super().cursor(factory)
+
+
+# --- APPLICATIONS (fabriques pour uvicorn --factory) ---
+def create_sync_app():
+    """Route GET /api/courses/{id}/lessons telle qu'elle était avant le passage en asynchrone"""
+    from fastapi import Depends, FastAPI, HTTPException
+    from sqlalchemy.pool import QueuePool
+    from sqlmodel import Session, create_engine, select
+    from ..models import Course, Lesson
+
+    engine = create_engine(
+        "sqlite://",
+        creator=lambda: sqlite3.connect(BENCH_DB_PATH, check_same_thread=False, factory=SlowConnection),
+        poolclass=QueuePool, pool_size=BENCH_POOL_SIZE, max_overflow=0,
+    )
+
+    def get_session():
+        with Session(engine) as session:
+            yield session
+
+    app = FastAPI()
+
+    @app.get("/api/courses/{course_id}/lessons")
+    def list_lessons_for_course(course_id: int, session: Session = Depends(get_session)):
+        course = session.exec(select(Course.created_at, Course.version).where(Course.id == course_id)).first()
+        if not course:
+            raise HTTPException(status_code=404, detail="Cours introuvable")
+        return session.exec(select(Lesson).where(Lesson.course_id == course_id).order_by(Lesson.order)).all()
+
+    return app
+
+
+def create_async_app():
+    """La vraie application, branchée sur la même base ralentie"""
+    import aiosqlite
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    from ..database import get_async_session
+    from ..main import app
+
+    engine = create_async_engine(
+        "sqlite+aiosqlite://",
+        async_creator=lambda: aiosqlite.connect(BENCH_DB_PATH, check_same_thread=False, factory=SlowConnection),
+        poolclass=AsyncAdaptedQueuePool, pool_size=BENCH_POOL_SIZE, max_overflow=0,
+    )
+
+    async def get_bench_session():
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            yield session
+
+    app.dependency_overrides[get_async_session] = get_bench_session
+    return app
+
+
+# --- JEU DE DONNÉES ---
+def seed(path: str, courses: int, lessons_per_course: int):
+    from sqlmodel import Session, SQLModel, create_engine
+    from ..models import Course, Lesson
+
+    if os.path.exists(path):
+        os.unlink(path)
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        for c in range(1, courses + 1):
+            session.add(Course(id=c, title=f"Cours {c}", slug=f"cours-{c}"))
+            for l in range(lessons_per_course):
+                session.add(Lesson(title=f"Leçon {l}", content_text="texte " * 50, order=l, course_id=c))
+        session.commit()
+    engine.dispose()
+
+
+# --- CHARGE ---
+async def hammer(base_url: str, course_ids, total: int, concurrency: int):
+    latencies = []
+    errors = 0
+    queue = iter(range(total))
+
+    async def user(http):
+        nonlocal errors
+        for i in queue:
+            start = time.perf_counter()
+            async with http.get(f"{base_url}/api/courses/{course_ids[i % len(course_ids)]}/lessons") as response:
+                await response.read()
+                if response.status != 200:
+                    errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(user(http) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return total / elapsed, latencies, errors
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(port: int, process, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("uvicorn s'est arrêté au démarrage")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("uvicorn ne répond pas")
+
+
+def run_mode(mode: str, args, course_ids):
+    port = free_port()
+    env = {**os.environ, "BENCH_DB_PATH": BENCH_DB_PATH, "BENCH_LATENCY_MS": str(args.latency_ms), "BENCH_POOL_SIZE": str(args.pool_size)}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"backend.benchmarks.bench_async:create_{mode}_app", "--factory",
+         "--port", str(port), "--workers", str(args.workers), "--lifespan", "off", "--log-level", "warning", "--no-access-log"],
+        env=env,
+    )
+    try:
+        wait_until_up(port, process)
+        base_url = f"http://127.0.0.1:{port}"
+        asyncio.run(hammer(base_url, course_ids, min(args.requests, 200), args.concurrency)) # échauffement
+        return asyncio.run(hammer(base_url, course_ids, args.requests, args.concurrency))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--latency-ms", type=float, default=BENCH_LATENCY_MS)
+    parser.add_argument("--pool-size", type=int, default=BENCH_POOL_SIZE)
+    parser.add_argument("--courses", type=int, default=50)
+    parser.add_argument("--lessons", type=int, default=10)
+    args = parser.parse_args()
+
+    seed(BENCH_DB_PATH, args.courses, args.lessons)
+    course_ids = list(range(1, args.courses + 1))
+
+    print(f"{args.workers} worker(s), {args.concurrency} clients, {args.requests} requêtes, latence BDD {args.latency_ms} ms")
+    results = {}
+    for mode in ("sync", "async"):
+        rps, latencies, errors = run_mode(mode, args, course_ids)
+        results[mode] = rps
+        print(
+            f"  {mode:<6} {rps:8.0f} req/s   p50 {percentile(latencies, 50) * 1000:7.1f} ms"
+            f"   p99 {percentile(latencies, 99) * 1000:7.1f} ms   erreurs {errors}"
+        )
+    print(f"  async / sync : x{results['async'] / results['sync']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark de la correction des quiz :
+- "legacy"   : ancien chemin, un session.get(QuizChoice) par réponse
+- "compiled" : clé de correction compilée (services/grading.py), une copie à la fois
+- "batch"    : correction vectorisée NumPy de toutes les copies d'un coup
+
+Usage : python -m backend.benchmarks.bench_grading [--questions 40] [--submissions 5000]
+"""
+import argparse
+import random
+import time
+
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.pool import StaticPool
+
+from ..models import Course, Quiz, QuizQuestion, QuizChoice
+from ..services.grading import compile_answer_key, grade_submission, grade_batch
+
+
+def seed(session: Session, nb_questions: int) -> int:
+    course = Course(title="Bench", slug="bench")
+    session.add(course)
+    session.flush()
+    quiz = Quiz(title="Bench", course_id=course.id)
+    session.add(quiz)
+    session.flush()
+    for i in range(nb_questions):
+        question = QuizQuestion(text=f"Q{i}", points=1 + i % 3, quiz_id=quiz.id)
+        session.add(question)
+        session.flush()
+        for j in range(4):
+            session.add(QuizChoice(text=f"C{j}", is_correct=(j == 0), question_id=question.id))
+    session.commit()
+    return quiz.id
+
+
+def legacy_grade(session: Session, quiz_id: int, answers):
+    # Reproduction fidèle de l'ancienne route submit_quiz
+    questions = session.exec(select(QuizQuestion).where(QuizQuestion.quiz_id == quiz_id)).all()
+    question_map = {q.id: q for q in questions}
+    max_score = sum(q.points for q in questions)
+    score = 0
+    for question_id, choice_id in answers:
+        question = question_map.get(question_id)
+        if not question:
+            continue
+        choice = session.get(QuizChoice, choice_id)
+        if choice and choice.question_id == question_id and choice.is_correct:
+            score += question.points
+    return score, max_score
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--submissions", type=int, default=5000)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    rng = random.Random(0)
+
+    with Session(engine) as session:
+        quiz_id = seed(session, args.questions)
+        choices = session.exec(select(QuizChoice.question_id, QuizChoice.id)).all()
+        by_question = {}
+        for question_id, choice_id in choices:
+            by_question.setdefault(question_id, []).append(choice_id)
+        submissions = [
+            [(q, rng.choice(c)) for q, c in by_question.items()]
+            for _ in range(args.submissions)
+        ]
+
+        # Le cache d'identité de la session fausserait l'ancien chemin : on le vide à chaque copie
+        start = time.perf_counter()
+        legacy_scores = []
+        for answers in submissions:
+            legacy_scores.append(legacy_grade(session, quiz_id, answers)[0])
+            session.expunge_all()
+        legacy = time.perf_counter() - start
+
+        start = time.perf_counter()
+        key = compile_answer_key(session, quiz_id)
+        compiled_scores = [grade_submission(key, answers)["score"] for answers in submissions]
+        compiled = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch_scores = grade_batch(key, submissions).tolist()
+        batch = time.perf_counter() - start
+
+    assert legacy_scores == compiled_scores == batch_scores
+
+    print(f"{args.submissions} copies x {args.questions} questions")
+    for name, elapsed in (("legacy", legacy), ("compiled", compiled), ("batch", batch)):
+        print(f"  {name:<9} {elapsed * 1000:9.1f} ms  ({args.submissions / elapsed:12.0f} copies/s, x{legacy / elapsed:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark de l'index de recherche sur un corpus synthétique (100k leçons par défaut).
+
+Mesure le temps d'indexation, de snapshot/rechargement, et la latence des requêtes
+(p50/p95/p99). Code de sortie 1 si le p99 dépasse la cible.
+
+Usage : python -m backend.benchmarks.bench_search [--lessons 100000] [--queries 2000] [--p99-target-ms 50]
+"""
+import argparse
+import itertools
+import os
+import random
+import tempfile
+import time
+
+from ..services.search_index import SearchIndex
+
+SYLLABLES = ["ba", "ré", "ti", "lo", "mé", "cu", "na", "pé", "so", "vi", "dé", "ra", "za", "go", "fé", "tru", "clé", "ton", "sion", "ment"]
+
+
+def make_vocabulary(rng: random.Random, size: int):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lessons", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--vocabulary", type=int, default=20_000)
+    parser.add_argument("--p99-target-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    vocabulary = make_vocabulary(rng, args.vocabulary)
+    # Distribution de Zipf : quelques mots très fréquents, une longue traîne de mots rares
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+    def text(n):
+        return " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=n))
+
+    index = SearchIndex()
+    start = time.perf_counter()
+    for lesson_id in range(1, args.lessons + 1):
+        index.add("lesson", lesson_id, text(5), [text(20), text(60)], course_id=lesson_id // 20 + 1)
+    build = time.perf_counter() - start
+
+    # Dossier privé : le snapshot est refusé dans un dossier modifiable par les autres (/tmp)
+    directory = tempfile.mkdtemp(prefix="bench-search-")
+    path = os.path.join(directory, "index.json")
+    start = time.perf_counter()
+    index.save(path)
+    save = time.perf_counter() - start
+    start = time.perf_counter()
+    restored = SearchIndex()
+    restored.load(path)
+    load = time.perf_counter() - start
+    os.unlink(path)
+    os.rmdir(directory)
+
+    queries = []
+    for _ in range(args.queries):
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(1, 3))
+        if rng.random() < 0.3:
+            words[-1] = words[-1][:3] # saisie en cours : préfixe
+        queries.append(" ".join(words))
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        restored.search(query, limit=20)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    p50, p95, p99 = (percentile(latencies, p) for p in (50, 95, 99))
+    print(f"{args.lessons} leçons, {len(index.terms)} termes")
+    print(f"  indexation   {build:8.2f} s ({args.lessons / build:,.0f} docs/s)")
+    print(f"  snapshot     {save:8.2f} s   rechargement {load:.2f} s")
+    print(f"  requêtes     p50 {p50:.2f} ms   p95 {p95:.2f} ms   p99 {p99:.2f} ms (cible {args.p99_target_ms} ms)")
+    if p99 > args.p99_target_ms:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
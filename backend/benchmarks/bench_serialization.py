@@ -0,0 +1,110 @@
+"""
+Micro-benchmark de la sérialisation des routes de lecture chaudes (temps CPU par requête) :
+- "response_model" : ancien chemin, validation Pydantic du modèle de réponse puis json.dumps (JSONResponse)
+- "orjson"         : payload construit à partir des colonnes lues, sérialisé par orjson
+- "cached"         : bytes déjà sérialisés pour cette version (services/http_cache.py), comparaison d'ETag seulement
+
+Usage : python -m backend.benchmarks.bench_serialization [--lessons 200] [--questions 40] [--requests 2000]
+"""
+import argparse
+import json
+import time
+from typing import List
+
+from pydantic import TypeAdapter
+
+from ..models import ContentType, Lesson, LessonRead
+from ..services.cache import serialized_responses
+from ..services.http_cache import cache_response, cached_response, dumps
+
+LESSON_FIELDS = list(LessonRead.model_fields)
+
+
+def make_lessons(count: int):
+    return [
+        Lesson(
+            id=i, course_id=1, order=(i + 1) * 1024, title=f"Leçon {i} : introduction détaillée",
+            description="Présentation du chapitre, objectifs et prérequis. " * 3,
+            content_type=ContentType.pdf if i % 2 else ContentType.text,
+            content_url=f"{i:064x}.pdf" if i % 2 else None,
+            content_text=None if i % 2 else "Contenu de la leçon en Markdown. " * 20,
+        )
+        for i in range(count)
+    ]
+
+
+def make_quiz(questions: int) -> dict:
+    return {
+        "id": 1, "title": "Quiz de fin de chapitre", "description": None,
+        "questions": [
+            {"id": q, "text": f"Question {q} : quelle est la bonne réponse ?", "points": 1 + q % 3,
+             "choices": [{"id": q * 4 + c, "text": f"Réponse {c}", "is_correct": c == 0} for c in range(4)]}
+            for q in range(questions)
+        ],
+    }
+
+
+def legacy_json(content) -> bytes:
+    # Rendu de starlette.responses.JSONResponse
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def cpu_per_request(function, requests: int) -> float:
+    """Temps CPU moyen (µs) d'un appel"""
+    function()
+    start = time.process_time()
+    for _ in range(requests):
+        function()
+    return (time.process_time() - start) / requests * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lessons", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    lessons = make_lessons(args.lessons)
+    rows = [{f: getattr(lesson, f) for f in LESSON_FIELDS} for lesson in lessons]
+    quiz = make_quiz(args.questions)
+    adapter = TypeAdapter(List[LessonRead])
+    etag = '"bench"'
+
+    def lessons_response_model():
+        # Ce que fait FastAPI avec response_model=List[LessonRead] : validation, dump "json", json.dumps
+        return legacy_json(adapter.dump_python(adapter.validate_python(lessons, from_attributes=True), mode="json"))
+
+    def lessons_orjson():
+        return dumps(rows)
+
+    def quiz_json():
+        return json.dumps(quiz, ensure_ascii=False).encode("utf-8")
+
+    def quiz_orjson():
+        return dumps(quiz)
+
+    serialized_responses.clear()
+    cache_response(("lessons", 1), etag, rows, "lessons")
+    cache_response(("quiz", 1), etag, quiz, "quiz")
+
+    assert json.loads(lessons_response_model()) == json.loads(lessons_orjson())
+    assert json.loads(quiz_json()) == json.loads(quiz_orjson())
+
+    print(f"{args.lessons} leçons, quiz de {args.questions} questions, {args.requests} requêtes")
+    for name, paths in (
+        ("liste des leçons", (("response_model", lessons_response_model), ("orjson", lessons_orjson),
+                              ("cached", lambda: cached_response(("lessons", 1), etag, "lessons")))),
+        ("quiz", (("json", quiz_json), ("orjson", quiz_orjson),
+                  ("cached", lambda: cached_response(("quiz", 1), etag, "quiz")))),
+    ):
+        print(f"  {name}")
+        timings = [(label, cpu_per_request(function, args.requests)) for label, function in paths]
+        reference = timings[0][1]
+        for label, elapsed in timings:
+            print(f"    {label:<15} {elapsed:10.1f} µs CPU / requête  (x{reference / elapsed:.1f})")
+    serialized_responses.clear()
+
+
+if __name__ == "__main__":
+    main()
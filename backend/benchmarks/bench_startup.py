@@ -0,0 +1,111 @@
+"""
+Temps de démarrage d'un worker jusqu'à la première requête servie.
+
+Chaque démarrage est un nouveau processus (comme un worker gunicorn recyclé par max_requests),
+sur une base SQLite déjà initialisée dont chaque requête SQL est ralentie de --latency-ms
+(aller-retour réseau vers Azure SQL) :
+- "legacy"  : ancien lifespan, SQLModel.metadata.create_all() dans chaque worker
+- "current" : vérification de la version du schéma (une requête, qui échauffe le pool)
+
+Usage : python -m backend.benchmarks.bench_startup [--runs 5] [--latency-ms 10]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+CHILD_FLAG = "--child"
+
+
+def child(mode: str, db_path: str, latency_ms: float, spawned_at: float):
+    """Exécuté dans le processus mesuré"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    statements = []
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def slow(conn, cursor, statement, *args):
+        statements.append(statement)
+        time.sleep(latency_ms / 1000)
+
+    start = time.perf_counter()
+    from contextlib import asynccontextmanager
+    from fastapi.testclient import TestClient
+    from sqlmodel import SQLModel
+    from ..database import get_engine
+    from ..main import app
+    imported = time.perf_counter()
+
+    if mode == "legacy":
+        @asynccontextmanager
+        async def legacy_lifespan(app):
+            SQLModel.metadata.create_all(get_engine())
+            yield
+        app.router.lifespan_context = legacy_lifespan
+
+    with TestClient(app) as client:
+        started = time.perf_counter()
+        startup_statements = len(statements)
+        response = client.get("/api/courses?limit=1")
+        served = time.perf_counter()
+        assert response.status_code == 200, response.text
+
+    print(json.dumps({
+        "import": imported - start,
+        "startup": started - imported,
+        "first_request": served - started,
+        "total": time.time() - spawned_at,
+        "startup_statements": startup_statements,
+    }))
+
+
+def run(mode: str, db_path: str, latency_ms: float) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-m", "backend.benchmarks.bench_startup", CHILD_FLAG, mode, db_path, str(latency_ms), str(time.time())],
+        check=True, capture_output=True, text=True,
+        env={**os.environ, "SEARCH_INDEX_PATH": os.path.join(os.path.dirname(db_path), "index.json")},
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == CHILD_FLAG:
+        mode, db_path, latency_ms, spawned_at = sys.argv[2:6]
+        child(mode, db_path, float(latency_ms), float(spawned_at))
+        return
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    from sqlmodel import create_engine
+    from ..migrations import migrate
+
+    directory = tempfile.mkdtemp(prefix="bench-startup-")
+    db_path = os.path.join(directory, "bench.db")
+    # Base déjà migrée : on mesure le démarrage "normal" d'un worker, pas la première installation
+    engine = create_engine(f"sqlite:///{db_path}")
+    migrate(engine)
+    engine.dispose()
+
+    print(f"{args.runs} démarrages par mode, latence BDD {args.latency_ms} ms")
+    print(f"  {'mode':<8} {'import':>9} {'démarrage':>10} {'1re req.':>9} {'total':>9} {'SQL au démarrage':>17}")
+    for mode in ("legacy", "current"):
+        results = [run(mode, db_path, args.latency_ms) for _ in range(args.runs)]
+        mean = {key: sum(r[key] for r in results) / len(results) for key in results[0]}
+        print(
+            f"  {mode:<8} {mean['import'] * 1000:7.0f} ms {mean['startup'] * 1000:7.0f} ms "
+            f"{mean['first_request'] * 1000:6.0f} ms {mean['total'] * 1000:6.0f} ms {mean['startup_statements']:17.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Débit du backend de stockage filesystem (STORAGE_BACKEND=filesystem), en Mo/s, rapport JSON.
+
+- upload   : écriture atomique (fichier temporaire + fsync + renommage) de --files fichiers
+  de --size-mb Mo, avec --concurrency uploads simultanés (upload_file_to_blob_async).
+- download : les mêmes fichiers lus par des clients aiohttp via leurs URL signées, servis par le
+  serveur de fichiers lancé dans un processus à part, en deux modes :
+  "sendfile" (os.sendfile, zéro copie) et "copy" (AIOHTTP_NOSENDFILE=1 : lecture puis écriture en Python).
+
+Usage : python -m backend.benchmarks.bench_storage [--files 16] [--size-mb 64] [--concurrency 8]
+    [--rounds 3] [--root /tmp/bench-storage] [--output rapport.json]
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import aiohttp
+
+from .bench_async import free_port, wait_until_up
+
+BENCH_DIR = os.getenv("BENCH_DIR", os.path.join(tempfile.gettempdir(), "bench-storage"))
+BENCH_SECRET = "secret-du-banc"
+MB = 1024 * 1024
+
+
+def _storage(root: str):
+    from ..services.local_storage import FilesystemStorage
+    return FilesystemStorage(root=root, secret=BENCH_SECRET.encode())
+
+
+# --- UPLOAD ---
+async def upload(root: str, files: int, size: int, concurrency: int, seed_value: int = 0):
+    from ..services import blob_service
+
+    blob_service.set_storage_backend(_storage(root))
+    # Contenu pseudo-aléatoire (incompressible), différent d'un fichier à l'autre
+    block = random.Random(seed_value).randbytes(MB)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index: int):
+        content = bytes([index % 256]) + block[1:]
+        async with semaphore:
+            await blob_service.upload_file_to_blob_async(io.BytesIO(content * (size // MB)), f"bench/{index}.bin")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(files)))
+    elapsed = time.perf_counter() - start
+    blob_service.set_storage_backend(None)
+    return elapsed
+
+
+# --- DOWNLOAD ---
+async def download(urls, concurrency: int):
+    latencies = []
+    received = 0
+    queue = iter(urls)
+
+    async def client(http):
+        nonlocal received
+        for url in queue:
+            start = time.perf_counter()
+            async with http.get(url) as response:
+                response.raise_for_status()
+                async for chunk in response.content.iter_chunked(MB):
+                    received += len(chunk)
+            latencies.append(time.perf_counter() - start)
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(http) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return received, elapsed, latencies
+
+
+def run_download(mode: str, args, names):
+    port = free_port()
+    env = {**os.environ, "STORAGE_URL_SECRET": BENCH_SECRET}
+    if mode == "copy":
+        env["AIOHTTP_NOSENDFILE"] = "1"
+    process = subprocess.Popen(
+        [sys.executable, "-m", "backend.benchmarks.bench_storage", "serve", "--root", args.root, "--port", str(port)],
+        env=env,
+    )
+    try:
+        wait_until_up(port, process)
+        storage = _storage(args.root)
+        storage.public_url = f"http://127.0.0.1:{port}/files"
+        expiry = datetime.now(timezone.utc) + timedelta(hours=1)
+        urls = [storage.signed_url(name, expiry) for name in names]
+        asyncio.run(download(urls[:args.concurrency], args.concurrency))  # échauffement (cache de pages)
+        results = [asyncio.run(download(urls, args.concurrency)) for _ in range(args.rounds)]
+    finally:
+        process.terminate()
+        process.wait()
+    # Meilleure manche : la moins perturbée par le reste de la machine
+    received, elapsed, latencies = min(results, key=lambda result: result[1])
+    return {
+        "mb_per_s": round(received / MB / elapsed, 1),
+        "seconds": round(elapsed, 3),
+        "file_p50_ms": round(sorted(latencies)[len(latencies) // 2] * 1000, 1),
+    }
+
+
+def serve(root: str, port: int):
+    """Serveur de fichiers seul (processus enfant du banc)"""
+    async def forever():
+        storage = _storage(root)
+        await storage.start(host="127.0.0.1", port=port)
+        await asyncio.Event().wait()
+
+    asyncio.run(forever())
+
+
+def run(args) -> dict:
+    size = args.size_mb * MB
+    upload_seconds = asyncio.run(upload(args.root, args.files, size, args.concurrency, args.seed))
+    names = [f"bench/{i}.bin" for i in range(args.files)]
+    report = {
+        "meta": {
+            "files": args.files,
+            "size_mb": args.size_mb,
+            "concurrency": args.concurrency,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "upload": {
+            "mb_per_s": round(args.files * size / MB / upload_seconds, 1),
+            "seconds": round(upload_seconds, 3),
+        },
+        "download": {mode: run_download(mode, args, names) for mode in ("sendfile", "copy")},
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit du stockage filesystem")
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "serve"])
+    parser.add_argument("--files", type=int, default=16)
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--root", default=os.path.join(BENCH_DIR, "root"))
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--output", default=os.path.join(BENCH_DIR, "report.json"))
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.root, args.port)
+        return
+
+    report = run(args)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"upload   : {report['upload']['mb_per_s']:>8} Mo/s")
+    for mode, result in report["download"].items():
+        print(f"{mode:<9}: {result['mb_per_s']:>8} Mo/s (p50 par fichier {result['file_p50_ms']} ms)")
+    print(f"Rapport : {args.output}")
+
+
+if __name__ == "__main__":
+    main()
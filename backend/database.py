@@ -1,37 +1,110 @@
 import os
+import threading
 from pathlib import Path
 from dotenv import load_dotenv
 from urllib.parse import quote_plus
-from sqlmodel import create_engine, SQLModel, Session
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlmodel import create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 # --- CHARGEMENT DU FICHIER .ENV ---
+# Simple lecture de fichier (les réglages des services en dépendent) ; la validation,
+# elle, n'a lieu qu'à la création du premier moteur : importer ce module ne lève plus d'erreur.
 env_path = Path(__file__).resolve().parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
-# --- RÉCUPÉRATION DES VARIABLES ---
-server = os.getenv("sql_server_fqdn")
-database = os.getenv("sql_database_name")
-username = os.getenv("DB_USER")
-password = os.getenv("DB_PASSWORD")
+# --- RÉGLAGES OPTIONNELS ---
+# Pilote asynchrone utilisé par les routes (pymssql n'a pas de version asynchrone)
+ASYNC_DB_DRIVER = os.getenv("ASYNC_DB_DRIVER", "aioodbc")
+ODBC_DRIVER = os.getenv("ODBC_DRIVER", "ODBC Driver 18 for SQL Server")
+# URLs complètes optionnelles (prioritaires), ex: sqlite:///./local.db et sqlite+aiosqlite:///./local.db
+DATABASE_URL = os.getenv("DATABASE_URL")
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+# Affichage de chaque requête SQL dans la console (debug uniquement : coûteux en charge)
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes")
 
-if not password or not server:
-    raise ValueError(f"Variables d'environnement manquantes. Vérifiez : {env_path}")
 
-# --- CRÉATION DU MOTEUR (SQLModel) ---
-encoded_password = quote_plus(password)
-# On utilise pymssql comme pilote
-SQLALCHEMY_DATABASE_URL = f"mssql+pymssql://{username}:{encoded_password}@{server}/{database}"
+# --- CONFIGURATION (lue au premier besoin) ---
+def _credentials():
+    server = os.getenv("sql_server_fqdn")
+    password = os.getenv("DB_PASSWORD")
+    if not password or not server:
+        raise ValueError(f"Variables d'environnement manquantes. Vérifiez : {env_path}")
+    return server, os.getenv("sql_database_name"), os.getenv("DB_USER"), quote_plus(password)
 
-# echo=True permet de voir les requêtes SQL dans la console
-engine = create_engine(SQLALCHEMY_DATABASE_URL, echo=True)
+def build_database_url() -> str:
+    if DATABASE_URL:
+        return DATABASE_URL
+    server, database, username, encoded_password = _credentials()
+    # On utilise pymssql comme pilote
+    return f"mssql+pymssql://{username}:{encoded_password}@{server}/{database}"
 
-# --- DÉPENDANCE POUR L'API ---
+def build_async_database_url() -> str:
+    if ASYNC_DATABASE_URL:
+        return ASYNC_DATABASE_URL
+    server, database, username, encoded_password = _credentials()
+    return (
+        f"mssql+{ASYNC_DB_DRIVER}://{username}:{encoded_password}@{server}/{database}"
+        f"?driver={quote_plus(ODBC_DRIVER)}"
+    )
+
+def _pool_options(url: str) -> dict:
+    if url.startswith("sqlite"):
+        return {}
+    return {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_pre_ping": True}
+
+
+# --- MOTEUR SYNCHRONE (migrations, scripts) ---
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    """Créé au premier appel. DB_ECHO=true permet de voir les requêtes SQL dans la console"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                url = build_database_url()
+                _engine = create_engine(url, echo=DB_ECHO, **_pool_options(url))
+    return _engine
+
+
+# --- MOTEUR ASYNCHRONE (routes de l'API) ---
+_async_engine = None
+_async_session_maker = None
+
+def get_async_engine():
+    """Créé au premier appel : le pilote asynchrone n'est importé que s'il sert"""
+    global _async_engine, _async_session_maker
+    if _async_engine is None:
+        url = build_async_database_url()
+        _async_engine = create_async_engine(url, echo=DB_ECHO, **_pool_options(url))
+        _async_session_maker = async_sessionmaker(_async_engine, class_=AsyncSession, expire_on_commit=False)
+    return _async_engine
+
+def get_async_session_maker():
+    """Fabrique de sessions pour les tâches de fond (hors requête HTTP)"""
+    get_async_engine()
+    return _async_session_maker
+
+async def dispose_async_engine():
+    """Ferme les connexions du pool asynchrone (arrêt du worker)"""
+    global _async_engine, _async_session_maker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _async_session_maker = None
+
+# --- DÉPENDANCES POUR L'API ---
 def get_session():
-    """Cette fonction sera utilisée par les routes pour obtenir une session BDD"""
-    with Session(engine) as session:
+    """Session synchrone (scripts, benchmarks)"""
+    with Session(get_engine()) as session:
         yield session
 
-# --- INITIALISATION DES TABLES ---
-def create_db_and_tables():
-    # C'est ici que SQLModel crée les tables si elles n'existent pas
-    SQLModel.metadata.create_all(engine)
\ No newline at end of file
+async def get_async_session():
+    """Session utilisée par les routes : la connexion ne bloque pas de thread pendant l'attente SQL"""
+    get_async_engine()
+    async with _async_session_maker() as session:
+        yield session
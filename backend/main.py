@@ -1,31 +1,88 @@
-from fastapi import FastAPI
+import os
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 
-from .database import create_db_and_tables
+from .database import get_async_engine, get_async_session_maker, dispose_async_engine
+from .migrations import check_schema_version
+from .services.blob_service import get_storage_backend
+from .services.search_index import search_index
+from .services.attempts import attempt_buffer
+from .services.blob_cleanup import BlobDeletionInProgress, blob_cleanup
+from .services.file_metadata import metadata_extractor
+from .services.invalidation import invalidation_bus
+from .middleware import UploadSizeLimitMiddleware, MetricsMiddleware
+from .services.metrics import render_metrics
 
-from .routes import courses, storage, quiz
+from .routes import courses, storage, quiz, search
+
+SCHEMA_CHECK_ON_STARTUP = os.getenv("SCHEMA_CHECK_ON_STARTUP", "true").lower() in ("1", "true", "yes")
 
 # --- STARTUP EVENT ---
 # Cette méthode moderne remplace le @app.on_event("startup")
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("--- DÉMARRAGE : Initialisation de la BDD ---")
-    create_db_and_tables() 
+    # Le schéma est créé/migré une seule fois (python -m backend.migrations ou hook gunicorn) :
+    # chaque worker vérifie seulement la version, ce qui ouvre aussi la première connexion du pool
+    if SCHEMA_CHECK_ON_STARTUP:
+        version = await check_schema_version(get_async_engine())
+        print(f"--- DÉMARRAGE : schéma en version {version} ---")
+    # Invalidations des caches reçues des autres workers (socket Unix ou Redis, voir services/invalidation.py)
+    await invalidation_bus.start()
+    # Écriture périodique des tentatives de quiz mises en file
+    attempt_buffer.start(get_async_session_maker())
+    # Suppression en arrière-plan des fichiers mis dans l'outbox par les routes
+    blob_cleanup.start(get_async_session_maker())
+    # Métadonnées des nouveaux fichiers (pages, durée...), analysées dans un pool de processus
+    metadata_extractor.start(get_async_session_maker())
+    # Backend filesystem : serveur des URL signées (sendfile) ; rien à faire pour Azure
+    await get_storage_backend().start()
     yield
     print("--- ARRÊT ---")
+    await blob_cleanup.stop()
+    await metadata_extractor.stop()
+    # Les tentatives encore en file sont écrites avant de fermer le pool
+    await attempt_buffer.stop()
+    # Snapshot de l'index de recherche : le prochain worker n'aura pas à tout réindexer
+    if search_index.ready:
+        search_index.save()
+    # Fermeture du pool de connexions Blob / du serveur de fichiers du worker
+    await get_storage_backend().aclose()
+    await invalidation_bus.stop()
+    await dispose_async_engine()
 
 # --- INITIALISATION APP ---
 app = FastAPI(
     title="E-Learning API",
     version="1.1",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # Sérialisation orjson pour toutes les routes (les routes de lecture chaudes renvoient des bytes déjà prêts)
+    default_response_class=ORJSONResponse,
 )
 
+# --- MIDDLEWARES ---
+app.add_middleware(UploadSizeLimitMiddleware)
+# Ajouté en dernier = le plus externe : mesure aussi les réponses 413
+app.add_middleware(MetricsMiddleware)
+
+# --- ERREURS ---
+@app.exception_handler(BlobDeletionInProgress)
+async def blob_deletion_in_progress(request: Request, exc: BlobDeletionInProgress):
+    # Upload identique à un fichier en cours de suppression (voir services/blob_cleanup.py) : à refaire ensuite
+    return ORJSONResponse(status_code=409, content={"detail": str(exc)}, headers={"Retry-After": "5"})
+
 # --- ENREGISTREMENT DES ROUTEURS ---
 app.include_router(courses.router, prefix="/api", tags=["Courses"])
 app.include_router(storage.router, prefix="/api", tags=["Storage"])
 app.include_router(quiz.router, prefix="/api", tags=["Quiz"])
+app.include_router(search.router, prefix="/api", tags=["Search"])
 
 @app.get("/")
 def read_root():
-    return {"message": "API E-Learning avec SQLModel & Azure Storage est en ligne !"}
\ No newline at end of file
+    return {"message": "API E-Learning avec SQLModel & Azure Storage est en ligne !"}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Métriques au format texte Prometheus (tous les workers gunicorn)"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
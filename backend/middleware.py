@@ -0,0 +1,72 @@
+import json
+import time
+
+from .services.blob_service import MAX_UPLOAD_SIZE
+from .services.metrics import http_request_duration, http_request_sql_queries, http_request_sql_seconds, start_request_stats
+
+# Marge pour les autres champs du formulaire multipart (titre, description...)
+MULTIPART_OVERHEAD = 1024 * 1024
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Rejette (413) les uploads trop gros AVANT la lecture du corps,
+    en se basant sur l'en-tête Content-Length.
+    """
+
+    def __init__(self, app, paths=("/api/upload", "/api/lessons"), max_size: int = None):
+        self.app = app
+        self.paths = set(paths)
+        self.max_size = max_size or MAX_UPLOAD_SIZE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in self.paths:
+            headers = dict(scope["headers"])
+            length = headers.get(b"content-length")
+            if length and length.isdigit() and int(length) > self.max_size + MULTIPART_OVERHEAD:
+                body = json.dumps({"detail": f"Fichier trop volumineux (max {self.max_size} octets)"}).encode()
+                await send({
+                    "type": "http.response.start",
+                    "status": 413,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), (b"connection", b"close")],
+                })
+                await send({"type": "http.response.body", "body": body})
+                return
+        await self.app(scope, receive, send)
+
+
+class MetricsMiddleware:
+    """
+    Mesure chaque requête HTTP : durée, nombre de requêtes SQL et temps SQL.
+    Étiquetée par modèle de route (/api/courses/{slug_or_id}) pour garder une cardinalité bornée.
+    """
+
+    def __init__(self, app, exclude=("/metrics",)):
+        self.app = app
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        stats = start_request_stats()
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Le routeur renseigne scope["route"] une fois la route trouvée
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            http_request_duration.labels(method, template, str(status)).observe(time.perf_counter() - start)
+            http_request_sql_queries.labels(method, template).observe(stats.queries)
+            http_request_sql_seconds.labels(method, template).observe(stats.sql_seconds)
@@ -0,0 +1,163 @@
+"""
+Migrations du schéma, exécutées UNE fois par déploiement (et non dans chaque worker) :
+- soit en commande : python -m backend.migrations
+- soit par le hook pré-fork de gunicorn (voir gunicorn.conf.py)
+
+Les workers se contentent de vérifier la version du schéma au démarrage (une requête).
+Chaque migration est idempotente : elle peut être rejouée sur une base déjà à jour.
+"""
+from sqlalchemy import Column, Integer, MetaData, Table, func, inspect, literal, select, text
+from sqlmodel import SQLModel
+
+from . import models  # noqa: F401  (enregistre les tables dans SQLModel.metadata)
+from .database import get_engine
+
+schema_metadata = MetaData()
+schema_version_table = Table("schema_version", schema_metadata, Column("version", Integer, nullable=False))
+
+
+class SchemaVersionError(RuntimeError):
+    """La base n'est pas (encore) migrée pour cette version du code"""
+
+
+# --- OUTILS ---
+def _has_column(conn, table: str, column: str) -> bool:
+    return column in {c["name"] for c in inspect(conn).get_columns(table)}
+
+def _create_missing_indexes(conn, table_name: str):
+    """Crée les index déclarés dans les modèles qui n'existent pas encore en base"""
+    table = SQLModel.metadata.tables[table_name]
+    existing = {ix["name"] for ix in inspect(conn).get_indexes(table_name)}
+    for index in table.indexes:
+        if index.name not in existing:
+            index.create(conn)
+
+
+# --- MIGRATIONS (numérotées, dans l'ordre) ---
+def _initial_tables(conn):
+    # Crée les tables absentes (base neuve) ; sans effet sur les tables existantes
+    SQLModel.metadata.create_all(conn)
+
+def _course_version(conn):
+    if not _has_column(conn, "course", "version"):
+        conn.execute(text("ALTER TABLE course ADD version INTEGER NOT NULL DEFAULT 0"))
+
+def _course_catalog_indexes(conn):
+    # course.level, créé sans longueur (VARCHAR(max) sous SQL Server), ne peut pas être une clé d'index :
+    # la colonne est bornée avant la création de ix_course_level_created_at_id (SQLite ignore les longueurs)
+    level = {c["name"]: c for c in inspect(conn).get_columns("course")}["level"]
+    if conn.dialect.name != "sqlite" and getattr(level["type"], "length", None) != 50:
+        column_type = models.Course.__table__.c.level.type.compile(dialect=conn.dialect)
+        if conn.dialect.name == "postgresql":
+            conn.execute(text(f"ALTER TABLE course ALTER COLUMN level TYPE {column_type}"))
+        elif conn.dialect.name == "mysql":
+            conn.execute(text(f"ALTER TABLE course MODIFY level {column_type} NULL"))
+        else:
+            conn.execute(text(f"ALTER TABLE course ALTER COLUMN level {column_type} NULL"))
+    _create_missing_indexes(conn, "course")
+
+def _quiz_attempts(conn):
+    for model in (models.QuizAttempt, models.QuizStats, models.QuizQuestionStats):
+        model.__table__.create(conn, checkfirst=True)
+    _create_missing_indexes(conn, "quizattempt")
+
+def _blob_deletion_outbox(conn):
+    models.BlobDeletion.__table__.create(conn, checkfirst=True)
+
+def _lesson_order_index(conn):
+    _create_missing_indexes(conn, "lesson")
+
+def _foreign_key_indexes(conn):
+    # lesson.course_id est déjà couvert par ix_lesson_course_id_order (première colonne)
+    for table_name in ("quiz", "quizquestion", "quizchoice"):
+        _create_missing_indexes(conn, table_name)
+
+def _blob_refs(conn):
+    models.BlobRef.__table__.create(conn, checkfirst=True)
+    if conn.execute(select(func.count()).select_from(models.BlobRef.__table__)).scalar():
+        return
+    # Fichiers déjà en place : une référence par leçon (les liens http(s) ne sont pas des fichiers)
+    lesson = models.Lesson.__table__
+    conn.execute(models.BlobRef.__table__.insert().from_select(
+        ["blob_name", "refcount", "created_at"],
+        select(lesson.c.content_url, func.count(), func.current_timestamp())
+        .where(
+            lesson.c.content_url.is_not(None), lesson.c.content_url != "",
+            ~lesson.c.content_url.ilike("http://%"), ~lesson.c.content_url.ilike("https://%"),
+        )
+        .group_by(lesson.c.content_url),
+    ))
+
+def _lesson_metadata(conn):
+    metadata_table = models.LessonMetadata.__table__
+    metadata_table.create(conn, checkfirst=True)
+    _create_missing_indexes(conn, metadata_table.name)
+    # Fichiers déjà en place : mis en file pour l'extraction en arrière-plan
+    refs = models.BlobRef.__table__
+    conn.execute(metadata_table.insert().from_select(
+        ["blob_name", "status", "attempts", "next_attempt_at", "updated_at"],
+        select(refs.c.blob_name, literal("pending"), literal(0), func.current_timestamp(), func.current_timestamp())
+        .where(~select(metadata_table.c.blob_name).where(metadata_table.c.blob_name == refs.c.blob_name).exists()),
+    ))
+
+def _pending_uploads(conn):
+    models.PendingUpload.__table__.create(conn, checkfirst=True)
+    _create_missing_indexes(conn, models.PendingUpload.__table__.name)
+
+MIGRATIONS = [
+    (1, "Tables initiales", _initial_tables),
+    (2, "Compteur de version des cours (ETag)", _course_version),
+    (3, "Index de pagination du catalogue", _course_catalog_indexes),
+    (4, "Tentatives et statistiques des quiz", _quiz_attempts),
+    (5, "Outbox des suppressions de fichiers", _blob_deletion_outbox),
+    (6, "Index d'ordre des leçons", _lesson_order_index),
+    (7, "Index des clés étrangères des quiz", _foreign_key_indexes),
+    (8, "Compteurs de références des fichiers", _blob_refs),
+    (9, "Métadonnées des fichiers des leçons", _lesson_metadata),
+    (10, "Uploads directs en cours", _pending_uploads),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+# --- EXÉCUTION ---
+def migrate(engine=None) -> int:
+    """Applique les migrations manquantes, chacune dans sa transaction. Retourne la version finale."""
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        schema_metadata.create_all(conn)
+        version = conn.execute(select(schema_version_table.c.version)).scalar()
+        if version is None:
+            conn.execute(schema_version_table.insert().values(version=0))
+            version = 0
+
+    for number, description, apply in MIGRATIONS:
+        if number <= version:
+            continue
+        print(f"Migration {number} : {description}")
+        with engine.begin() as conn:
+            apply(conn)
+            conn.execute(schema_version_table.update().values(version=number))
+        version = number
+    return version
+
+
+async def check_schema_version(async_engine):
+    """
+    Vérification faite par chaque worker au démarrage : une seule requête,
+    qui ouvre au passage la première connexion du pool (échauffement).
+    """
+    try:
+        async with async_engine.connect() as conn:
+            version = (await conn.execute(select(schema_version_table.c.version))).scalar()
+    except Exception as e:
+        raise SchemaVersionError(f"Schéma non initialisé ({e}). Lancez : python -m backend.migrations") from e
+    if version is None or version < SCHEMA_VERSION:
+        raise SchemaVersionError(
+            f"Schéma en version {version}, le code attend la version {SCHEMA_VERSION}. "
+            "Lancez : python -m backend.migrations"
+        )
+    return version
+
+
+if __name__ == "__main__":
+    print(f"Schéma à jour (version {migrate()})")
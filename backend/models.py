@@ -1,6 +1,7 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from enum import Enum
 from datetime import datetime
+from sqlalchemy import JSON, Column, Index
 from sqlmodel import Field, Relationship, SQLModel
 
 # --- ENUMS ---
@@ -24,13 +25,22 @@ class CourseBase(SQLModel):
     title: str = Field(index=True, max_length=255)
     description: Optional[str] = None
     category: CategoryName = CategoryName.programming
-    level: Optional[str] = "Beginner"
+    level: Optional[str] = Field(default="Beginner", max_length=50) # indexé : longueur bornée (SQL Server n'indexe pas VARCHAR(max))
     image_url: Optional[str] = None
 
 class Course(CourseBase, table=True):
+    # Index pour la pagination par curseur (created_at, id) et les filtres du catalogue
+    __table_args__ = (
+        Index("ix_course_created_at_id", "created_at", "id"),
+        Index("ix_course_category_created_at_id", "category", "created_at", "id"),
+        Index("ix_course_level_created_at_id", "level", "created_at", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     slug: str = Field(unique=True, index=True, max_length=255)
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    # Incrémentée à chaque écriture sur le cours, ses leçons ou ses quiz (sert aux ETag)
+    version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
     lessons: List["Lesson"] = Relationship(back_populates="course", cascade_delete=True)
     quizzes: List["Quiz"] = Relationship(back_populates="course", cascade_delete=True)
@@ -51,16 +61,23 @@ class LessonBase(SQLModel):
     content_type: ContentType = ContentType.text 
     content_url: Optional[str] = None # URL vers Azure Blob Storage (PDF, Vidéo, Word...)
     content_text: Optional[str] = None # Pour du contenu texte direct (Markdown/HTML)
-    order: int = 0 # Pour ordonner les leçons (1, 2, 3...)
+    order: int = 0 # Pour ordonner les leçons : valeurs espacées (1024, 2048...), voir services/ordering.py
     course_id: int = Field(foreign_key="course.id")
 
 class Lesson(LessonBase, table=True):
+    # Lecture des leçons d'un cours dans l'ordre de l'index
+    __table_args__ = (Index("ix_lesson_course_id_order", "course_id", "order"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     course: Course = Relationship(back_populates="lessons")
 
 class LessonCreate(LessonBase):
     pass
 
+class LessonOrderUpdate(SQLModel):
+    # Tous les ids des leçons du cours, dans le nouvel ordre
+    lesson_ids: List[int]
+
 class LessonRead(LessonBase):
     id: int
 
@@ -70,7 +87,7 @@ class QuizBase(SQLModel):
     title: str
     description: Optional[str] = None
     order: int = 0
-    course_id: int = Field(foreign_key="course.id")
+    course_id: int = Field(foreign_key="course.id", index=True)
 
 class Quiz(QuizBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -88,7 +105,7 @@ class QuizRead(QuizBase):
 class QuizQuestionBase(SQLModel):
     text: str
     points: int = 1
-    quiz_id: int = Field(foreign_key="quiz.id")
+    quiz_id: int = Field(foreign_key="quiz.id", index=True)
 
 class QuizQuestion(QuizQuestionBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -103,7 +120,7 @@ class QuizQuestionRead(QuizQuestionBase):
 class QuizChoiceBase(SQLModel):
     text: str
     is_correct: bool = False
-    question_id: int = Field(foreign_key="quizquestion.id")
+    question_id: int = Field(foreign_key="quizquestion.id", index=True)
 
 class QuizChoice(QuizChoiceBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -114,10 +131,137 @@ class QuizChoiceRead(SQLModel):
     text: str 
     # On n'envoie PAS is_correct au front-end pour éviter la triche !
 
+# --- TENTATIVES ET STATISTIQUES DES QUIZ ---
+class QuizAttempt(SQLModel, table=True):
+    """Une copie corrigée. Écrite en différé, par lots (voir services/attempts.py)"""
+    __table_args__ = (Index("ix_quizattempt_quiz_id_created_at", "quiz_id", "created_at"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    quiz_id: int = Field(foreign_key="quiz.id")
+    reference: Optional[str] = Field(default=None, max_length=255)
+    score: int
+    total_points: int
+    passed: bool
+    # question_id (texte, clé JSON) -> bonne réponse ?
+    results: Dict[str, bool] = Field(default_factory=dict, sa_column=Column(JSON))
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class QuizStats(SQLModel, table=True):
+    """Agrégats tenus à jour à chaque écriture de tentatives (pas de parcours de quizattempt)"""
+    quiz_id: int = Field(primary_key=True, foreign_key="quiz.id")
+    attempts: int = 0
+    passed: int = 0
+    score_sum: int = 0
+
+class QuizQuestionStats(SQLModel, table=True):
+    # Pas de clé étrangère vers la question : les lignes des questions supprimées sont nettoyées à part
+    quiz_id: int = Field(primary_key=True, foreign_key="quiz.id")
+    question_id: int = Field(primary_key=True)
+    answered: int = 0
+    correct: int = 0
+
+# --- OUTBOX DES SUPPRESSIONS DE FICHIERS ---
+class BlobDeletion(SQLModel, table=True):
+    """
+    Fichier à supprimer du Blob Storage, écrit dans la même transaction que la suppression en base.
+    Traité en arrière-plan (voir services/blob_cleanup.py) ; la ligne disparaît une fois le fichier supprimé.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    blob_name: str = Field(max_length=1024)
+    attempts: int = 0
+    next_attempt_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    last_error: Optional[str] = Field(default=None, max_length=1000)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+# --- RÉFÉRENCES DES FICHIERS (stockage adressé par contenu) ---
+class BlobRef(SQLModel, table=True):
+    """
+    Nombre de leçons qui pointent vers un fichier : un même fichier (même empreinte SHA-256)
+    peut servir à plusieurs leçons. Il n'est supprimé du stockage que lorsque ce nombre retombe à 0.
+    """
+    blob_name: str = Field(primary_key=True, max_length=255)
+    refcount: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+# --- UPLOADS DIRECTS EN COURS ---
+class PendingUpload(SQLModel, table=True):
+    """
+    Upload direct vers le stockage (POST /api/uploads/initiate) pas encore finalisé.
+    La ligne disparaît à la finalisation (la leçon est créée) ou à l'expiration (le fichier éventuel part dans l'outbox).
+    """
+    id: str = Field(primary_key=True, max_length=32)
+    blob_name: str = Field(max_length=255)
+    course_id: int # sans clé étrangère : le cours peut être supprimé entre-temps, vérifié à la finalisation
+    size: int
+    mime_type: str = Field(max_length=255)
+    expires_at: datetime = Field(index=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class UploadInitiate(SQLModel):
+    course_id: int
+    filename: str = Field(max_length=255)
+    size: int = Field(ge=0)
+    mime_type: str = Field(default="application/octet-stream", max_length=255)
+
+class UploadComplete(SQLModel):
+    upload_id: str
+    title: str
+    description: Optional[str] = None
+    content_type: Optional[ContentType] = None # déduit de l'extension si absent
+    order: Optional[int] = None
+
+# --- MÉTADONNÉES DES FICHIERS DES LEÇONS ---
+class LessonMetadataBase(SQLModel):
+    mime_type: Optional[str] = Field(default=None, max_length=255) # type réel (octets magiques)
+    size: Optional[int] = None
+    sha256: Optional[str] = Field(default=None, max_length=64)
+    page_count: Optional[int] = None # PDF
+    text_length: Optional[int] = None # PDF : nombre approximatif de caractères
+    duration_seconds: Optional[float] = None # vidéo
+    width: Optional[int] = None
+    height: Optional[int] = None
+    container: Optional[str] = Field(default=None, max_length=20) # mp4, quicktime, avi, webm...
+
+class LessonMetadata(LessonMetadataBase, table=True):
+    """
+    Métadonnées du fichier d'une leçon, extraites en arrière-plan après l'upload (voir services/file_metadata.py).
+    Une ligne par fichier : les leçons qui partagent un fichier (même empreinte) partagent ses métadonnées.
+    """
+    blob_name: str = Field(primary_key=True, max_length=255)
+    status: str = Field(default="pending", max_length=20) # pending, done, failed
+    attempts: int = 0
+    next_attempt_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    last_error: Optional[str] = Field(default=None, max_length=1000)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class LessonMetadataRead(LessonMetadataBase):
+    status: str
+
 # --- Mises à jour des modèles de lecture imbriqués ---
 # Ces classes permettent de lire un Quiz avec ses questions d'un coup
 class QuizQuestionReadWithChoices(QuizQuestionRead):
     choices: List[QuizChoiceRead] = []
 
 class QuizReadWithQuestions(QuizRead):
-    questions: List[QuizQuestionReadWithChoices] = []
\ No newline at end of file
+    questions: List[QuizQuestionReadWithChoices] = []
+
+# --- VUE "PAGE DU COURS" (un seul appel) ---
+class LessonSummary(SQLModel):
+    # Sans content_text (potentiellement lourd) ni URL : chargés sur la page de la leçon
+    id: int
+    title: str
+    description: Optional[str] = None
+    content_type: ContentType
+    order: int
+    course_id: int
+
+class QuizSummary(SQLModel):
+    id: int
+    title: str
+    description: Optional[str] = None
+    order: int
+    question_count: int
+
+class CourseBundle(CourseRead):
+    lessons: List[LessonSummary] = []
+    quizzes: List[QuizSummary] = []
@@ -1,16 +1,36 @@
 import re
-import uuid
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from sqlmodel import Session, select
+import base64
+from datetime import datetime, timezone
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_, func, bindparam, delete, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 # Import des modèles
 from ..models import (
-    Course, CourseCreate, CourseRead, 
-    Lesson, LessonCreate, LessonRead
+    Course, CourseCreate, CourseRead, CourseBundle, CategoryName,
+    Lesson, LessonCreate, LessonRead, LessonOrderUpdate, LessonMetadata, LessonMetadataRead,
+    Quiz, QuizQuestion
 )
-from ..database import get_session
-from ..services.blob_service import generate_sas_url, delete_file_from_blob, upload_file_to_blob
+from ..database import get_async_session
+from ..services.query_budget import max_queries
+from ..services.cache import invalidate_quiz
+from ..services.attempts import discard_deleted_quizzes
+from ..services.invalidation import invalidation_bus
+from ..services.blob_cleanup import blob_cleanup, add_blob_ref, cancel_blob_deletion, release_blob_refs
+from ..services.file_metadata import metadata_extractor
+from ..services.ordering import next_order, plan_reorder
+from ..services.content_proxy import content_proxy, parse_range, RangeNotSatisfiable
+from ..services.http_cache import (
+    course_etag, etag_matches, not_modified, cache_headers, cached_response, cache_response, bump_course_version
+)
+from ..services.blob_service import (
+    generate_sas_url, sas_bucket, is_blob_name, upload_deduplicated_async, file_extension,
+    UploadTooLargeError, MAX_UPLOAD_SIZE
+)
+from .quiz import delete_quizzes
 
 router = APIRouter()
 
@@ -25,87 +45,278 @@ def create_slug(title: str) -> str:
 #                 COURSES
 # ==========================================
 
-@router.get("/courses", response_model=List[CourseRead])
-def list_courses(session: Session = Depends(get_session)):
-    courses = session.exec(select(Course)).all()
-    return courses
+# --- PAGINATION PAR CURSEUR (keyset) ---
+COURSE_FIELDS = list(CourseRead.model_fields)
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(created_at: datetime, course_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{course_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, course_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(course_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+@router.get("/courses")
+@max_queries(1)
+async def list_courses(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    category: Optional[CategoryName] = None,
+    level: Optional[str] = None,
+    title_prefix: Optional[str] = Query(None, min_length=1, max_length=255),
+    fields: Optional[str] = Query(None, description="Champs à renvoyer, ex: id,title,slug"),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Catalogue paginé par curseur sur (created_at, id) : le coût d'une page
+    ne dépend pas de sa profondeur. Filtres côté serveur et projection optionnelle.
+    """
+    if fields:
+        selected = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in selected if f not in COURSE_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Champs inconnus : {', '.join(unknown)}")
+    else:
+        selected = COURSE_FIELDS
+
+    # created_at et id sont toujours lus : ils servent au curseur
+    columns = [getattr(Course, f) for f in dict.fromkeys(["created_at", "id", *selected])]
+    statement = select(*columns)
+
+    if category:
+        statement = statement.where(Course.category == category)
+    if level:
+        statement = statement.where(Course.level == level)
+    if title_prefix:
+        statement = statement.where(Course.title.like(f"{escape_like(title_prefix)}%", escape="\\"))
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        statement = statement.where(or_(
+            Course.created_at > cursor_created_at,
+            and_(Course.created_at == cursor_created_at, Course.id > cursor_id),
+        ))
+
+    statement = statement.order_by(Course.created_at, Course.id).limit(limit + 1)
+    rows = (await session.exec(statement)).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [{f: row._mapping[f] for f in selected} for row in rows]
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
+
+    return {"items": items, "next_cursor": next_cursor}
 
 @router.post("/courses", response_model=CourseRead)
-def create_course(course: CourseCreate, session: Session = Depends(get_session)):
+@max_queries(3)
+async def create_course(course: CourseCreate, session: AsyncSession = Depends(get_async_session)):
     # Génération du slug si non fourni
     if not course.slug:
         course.slug = create_slug(course.title)
     
     # Vérif unicité slug
-    existing = session.exec(select(Course).where(Course.slug == course.slug)).first()
+    existing = (await session.exec(select(Course).where(Course.slug == course.slug))).first()
     if existing:
         raise HTTPException(status_code=400, detail="Un cours avec ce titre/slug existe déjà.")
 
     db_course = Course.model_validate(course)
     session.add(db_course)
-    session.commit()
-    session.refresh(db_course)
+    await session.commit()
+    await session.refresh(db_course)
+    invalidation_bus.publish("course", db_course.id) # index de recherche de tous les workers
     return db_course
 
 @router.get("/courses/{slug_or_id}", response_model=CourseRead)
-def get_course(slug_or_id: str, session: Session = Depends(get_session)):
+@max_queries(1)
+async def get_course(slug_or_id: str, request: Request, session: AsyncSession = Depends(get_async_session)):
+    # Une seule ligne à lire : l'ETag se calcule sur l'objet chargé, le 304 évite la sérialisation
     if slug_or_id.isdigit():
-        course = session.get(Course, int(slug_or_id))
+        course = await session.get(Course, int(slug_or_id))
     else:
-        course = session.exec(select(Course).where(Course.slug == slug_or_id)).first()
+        course = (await session.exec(select(Course).where(Course.slug == slug_or_id))).first()
     
     if not course:
         raise HTTPException(status_code=404, detail="Cours introuvable")
-    return course
 
-@router.delete("/courses/{course_id}")
-def delete_course(course_id: int, session: Session = Depends(get_session)):
-    course = session.get(Course, course_id)
+    etag = course_etag("course", course.id, course.created_at, course.version)
+    if etag_matches(request, etag):
+        return not_modified(etag, "courses")
+    # Réponses construites et sérialisées ici : pas de validation par response_model (documentation seulement)
+    return cached_response(("course", course.id), etag, "courses") or cache_response(
+        ("course", course.id), etag, {f: getattr(course, f) for f in COURSE_FIELDS}, "courses"
+    )
+
+@router.get("/courses/{slug_or_id}/full", response_model=CourseBundle)
+@max_queries(3)
+async def get_course_bundle(slug_or_id: str, request: Request, session: AsyncSession = Depends(get_async_session)):
+    """
+    Tout ce qu'affiche la page d'un cours en un seul appel :
+    le cours, ses leçons (résumées, ordonnées) et ses quiz. 3 requêtes au plus,
+    une seule si ce worker a déjà sérialisé cette version du cours.
+    """
+    if slug_or_id.isdigit():
+        course = await session.get(Course, int(slug_or_id))
+    else:
+        course = (await session.exec(select(Course).where(Course.slug == slug_or_id))).first()
+
     if not course:
         raise HTTPException(status_code=404, detail="Cours introuvable")
+
+    # La version du cours couvre aussi ses leçons et ses quiz
+    etag = course_etag("bundle", course.id, course.created_at, course.version)
+    if etag_matches(request, etag):
+        return not_modified(etag, "courses")
+    cached = cached_response(("bundle", course.id), etag, "courses")
+    if cached is not None:
+        return cached
+
+    lessons = (await session.exec(
+        select(Lesson.id, Lesson.title, Lesson.description, Lesson.content_type, Lesson.order, Lesson.course_id)
+        .where(Lesson.course_id == course.id)
+        .order_by(Lesson.order, Lesson.id)
+    )).all()
+    # Sous-requête corrélée plutôt que GROUP BY (SQL Server refuse de grouper sur NVARCHAR(max))
+    question_count = (
+        select(func.count(QuizQuestion.id))
+        .where(QuizQuestion.quiz_id == Quiz.id)
+        .correlate(Quiz)
+        .scalar_subquery()
+    )
+    quizzes = (await session.exec(
+        select(Quiz.id, Quiz.title, Quiz.description, Quiz.order, question_count.label("question_count"))
+        .where(Quiz.course_id == course.id)
+        .order_by(Quiz.order, Quiz.id)
+    )).all()
+
+    # Les colonnes lues sont celles de LessonSummary et QuizSummary
+    bundle = {f: getattr(course, f) for f in COURSE_FIELDS}
+    bundle["lessons"] = [dict(row._mapping) for row in lessons]
+    bundle["quizzes"] = [dict(row._mapping) for row in quizzes]
+    return cache_response(("bundle", course.id), etag, bundle, "courses")
+
+@router.delete("/courses/{course_id}")
+@max_queries(15)
+async def delete_course(course_id: int, session: AsyncSession = Depends(get_async_session)):
+    if (await session.exec(select(Course.id).where(Course.id == course_id))).first() is None:
+        raise HTTPException(status_code=404, detail="Cours introuvable")
     
-    for lesson in course.lessons:
-        if lesson.content_url:
-            delete_file_from_blob(lesson.content_url)
+    # Pas de chargement paresseux en asynchrone : on lit explicitement ce qu'il faut nettoyer
+    lessons = (await session.exec(select(Lesson.id, Lesson.content_url).where(Lesson.course_id == course_id))).all()
+    quiz_ids = (await session.exec(select(Quiz.id).where(Quiz.course_id == course_id))).all()
+
+    # Fichiers qui ne servent plus à aucune leçon : supprimés en arrière-plan (outbox validée avec le cours)
+    queued = await release_blob_refs(session, [lesson.content_url for lesson in lessons])
 
-    session.delete(course)
-    session.commit()
+    # DELETE groupés plutôt que la cascade ORM (une requête par collection chargée)
+    lesson_ids = [lesson.id for lesson in lessons]
+    await delete_quizzes(session, quiz_ids)
+    await session.exec(delete(Lesson).where(Lesson.course_id == course_id))
+    await session.exec(delete(Course).where(Course.id == course_id))
+    await session.commit()
+    if queued:
+        blob_cleanup.wake()
+    # Caches et index de recherche de tous les workers
+    invalidate_quiz(*quiz_ids)
+    discard_deleted_quizzes(*quiz_ids)
+    invalidation_bus.publish("course", course_id)
+    invalidation_bus.publish("lesson", *lesson_ids)
     return {"message": "Cours supprimé"}
 
 # ==========================================
 #                 LESSONS
 # ==========================================
 
+LESSON_FIELDS = list(LessonRead.model_fields)
+
 @router.get("/courses/{course_id}/lessons", response_model=List[LessonRead])
-def list_lessons_for_course(course_id: int, session: Session = Depends(get_session)):
-    # Vérif si le cours existe
-    course = session.get(Course, course_id)
+@max_queries(2)
+async def list_lessons_for_course(course_id: int, request: Request, session: AsyncSession = Depends(get_async_session)):
+    # Vérif si le cours existe + version pour l'ETag (une requête légère)
+    course = (await session.exec(select(Course.created_at, Course.version).where(Course.id == course_id))).first()
     if not course:
         raise HTTPException(status_code=404, detail="Cours introuvable")
-        
-    statement = select(Lesson).where(Lesson.course_id == course_id).order_by(Lesson.order)
-    lessons = session.exec(statement).all()
-    return lessons
+
+    etag = course_etag("lessons", course_id, course.created_at, course.version)
+    if etag_matches(request, etag):
+        return not_modified(etag, "lessons")
+    cached = cached_response(("lessons", course_id), etag, "lessons")
+    if cached is not None:
+        return cached
+
+    # Parcours de l'index (course_id, order) ; colonnes lues directement, sans objets ORM
+    statement = (
+        select(*[getattr(Lesson, f) for f in LESSON_FIELDS])
+        .where(Lesson.course_id == course_id)
+        .order_by(Lesson.order, Lesson.id)
+    )
+    lessons = (await session.exec(statement)).all()
+    return cache_response(("lessons", course_id), etag, [dict(row._mapping) for row in lessons], "lessons")
+
+@router.patch("/courses/{course_id}/lessons/order")
+@max_queries(4)
+async def reorder_lessons(course_id: int, payload: LessonOrderUpdate, session: AsyncSession = Depends(get_async_session)):
+    """
+    Applique un nouvel ordre complet en une transaction.
+    Seules les leçons déplacées sont réécrites (une ligne pour un déplacement simple),
+    sauf s'il faut renuméroter le cours faute de place entre deux voisines.
+    """
+    course = (await session.exec(select(Course.id).where(Course.id == course_id))).first()
+    if course is None:
+        raise HTTPException(status_code=404, detail="Cours introuvable")
+
+    rows = (await session.exec(select(Lesson.id, Lesson.order).where(Lesson.course_id == course_id))).all()
+    current = {row.id: row.order for row in rows}
+    if len(payload.lesson_ids) != len(current) or set(payload.lesson_ids) != set(current):
+        raise HTTPException(status_code=422, detail="lesson_ids doit contenir chaque leçon du cours exactement une fois")
+
+    changes, renumbered = plan_reorder(current, payload.lesson_ids)
+    if changes:
+        # Un seul UPDATE (executemany) pour toutes les lignes modifiées
+        table = Lesson.__table__
+        await session.exec(
+            update(table).where(table.c.id == bindparam("lesson_id")).values(order=bindparam("new_order")),
+            params=[{"lesson_id": lesson_id, "new_order": value} for lesson_id, value in changes.items()],
+        )
+        await bump_course_version(session, course_id)
+        await session.commit()
+
+    current.update(changes)
+    return {
+        "course_id": course_id,
+        "updated": len(changes),
+        "renumbered": renumbered,
+        "lessons": [{"id": lesson_id, "order": current[lesson_id]} for lesson_id in payload.lesson_ids],
+    }
 
 @router.post("/lessons", response_model=LessonRead)
-def create_lesson(
+@max_queries(9)
+async def create_lesson(
     course_id: int = Form(...),
     title: str = Form(...),
     description: str = Form(None),
     content_type: str = Form("text"),
     content_text: str = Form(None),
     content_url: str = Form(None),
-    order: int = Form(0),
+    order: Optional[int] = Form(None),
     file: UploadFile = File(None),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """
     Ajoute une leçon à un cours.
     Supporte 2 modes:
     - contenu texte (content_type=text + content_text)
     - contenu fichier (upload) ou lien externe (content_url)
+    Sans order (ou 0, valeur par défaut du formulaire), la leçon est ajoutée en fin de cours.
     """
-    if not session.get(Course, course_id):
+    if not await session.get(Course, course_id):
         raise HTTPException(status_code=404, detail="Cours lié introuvable")
 
     final_content_type = content_type or "text"
@@ -114,10 +325,10 @@ def create_lesson(
 
     # Gestion upload fichier si présent
     if file:
+        if file.size is not None and file.size > MAX_UPLOAD_SIZE:
+            raise HTTPException(status_code=413, detail=f"Fichier trop volumineux (max {MAX_UPLOAD_SIZE} octets)")
         try:
-            print(f"Fichier reçu: {file.filename}") # DEBUG
-            ext = file.filename.split(".")[-1].lower() if "." in file.filename else "bin"
-            unique_filename = f"{uuid.uuid4()}.{ext}"
+            ext = file_extension(file.filename) or "bin"
 
             # Détermination du Content-Type pour Azure
             mime_type = file.content_type
@@ -127,20 +338,14 @@ def create_lesson(
             elif ext in ["mp4", "mov", "avi"]:
                 mime_type = "video/mp4"
             
-            # Lecture du fichier
-            print("Lecture du fichier en cours...") 
-            file_content = file.file.read()
-            print(f"Fichier lu ({len(file_content)} octets). Envoi vers Azure avec type {mime_type}...")
-
-            # Upload AVEC le content_type
-            upload_file_to_blob(file_content, unique_filename, content_type=mime_type)
-            print("Upload Azure RÉUSSI !")
-
-            final_content_url = unique_filename
+            # Stocké sous son empreinte SHA-256 : un fichier déjà présent n'est pas renvoyé
+            final_content_url = await upload_deduplicated_async(file, ext, content_type=mime_type)
 
             if ext == "pdf":
                 final_content_type = "pdf"
                 
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Erreur upload Azure : {str(e)}")
     else:
@@ -157,6 +362,10 @@ def create_lesson(
     except Exception:
         raise HTTPException(status_code=422, detail=f"content_type invalide: {final_content_type}")
 
+    if not order:
+        last = (await session.exec(select(func.max(Lesson.order)).where(Lesson.course_id == course_id))).one()
+        order = next_order(last)
+
     db_lesson = Lesson(
         title=title,
         description=description,
@@ -168,52 +377,148 @@ def create_lesson(
     )
 
     session.add(db_lesson)
-    session.commit()
-    session.refresh(db_lesson)
+    if file:
+        # Un fichier identique en attente de suppression est conservé
+        await cancel_blob_deletion(session, final_content_url)
+    new_file = await add_blob_ref(session, final_content_url)
+    await bump_course_version(session, course_id)
+    await session.commit()
+    if new_file:
+        metadata_extractor.wake() # pages, durée... extraites en arrière-plan
+    await session.refresh(db_lesson)
+    invalidation_bus.publish("lesson", db_lesson.id)
     return db_lesson
 
 @router.get("/lessons/{lesson_id}")
-def get_lesson_details(lesson_id: int, session: Session = Depends(get_session)):
-    lesson = session.get(Lesson, lesson_id)
-    if not lesson:
+@max_queries(2)
+async def get_lesson_details(lesson_id: int, request: Request, session: AsyncSession = Depends(get_async_session)):
+    # Requête légère : version du cours + nom du blob (l'URL signée change à chaque tranche SAS)
+    head = (await session.exec(
+        select(Course.created_at, Course.version, Lesson.content_url)
+        .join(Lesson, Lesson.course_id == Course.id)
+        .where(Lesson.id == lesson_id)
+    )).first()
+    if not head:
         raise HTTPException(status_code=404, detail="Leçon introuvable")
+
+    now = datetime.now(timezone.utc) # même instant pour l'ETag et la signature
+    bucket = sas_bucket(now) if is_blob_name(head.content_url) else None
+    etag = course_etag("lesson", lesson_id, head.created_at, head.version, bucket)
+    if etag_matches(request, etag):
+        return not_modified(etag, "lessons")
+    # L'URL signée ne change pas dans une tranche SAS (qui fait partie de l'ETag) : la réponse peut être gardée
+    cached = cached_response(("lesson", lesson_id), etag, "lessons")
+    if cached is not None:
+        return cached
+
+    # Métadonnées du fichier (pages, durée...) dans la même requête ; None tant qu'il n'y a pas de fichier
+    lesson, metadata = (await session.exec(
+        select(Lesson, LessonMetadata)
+        .outerjoin(LessonMetadata, LessonMetadata.blob_name == Lesson.content_url)
+        .where(Lesson.id == lesson_id)
+    )).one()
+    result = lesson.model_dump()
+    result["metadata"] = LessonMetadataRead.model_validate(metadata).model_dump() if metadata else None
     
-    response = lesson.model_dump()
-    
-    if lesson.content_url and not str(lesson.content_url).lower().startswith(("http://", "https://")):
-        signed_url = generate_sas_url(lesson.content_url)
-        response["content_url_signed"] = signed_url
+    if is_blob_name(lesson.content_url):
+        signed_url = generate_sas_url(lesson.content_url, now=now)
+        result["content_url_signed"] = signed_url
     
-    return response
+    return cache_response(("lesson", lesson_id), etag, result, "lessons")
+
+@router.get("/lessons/{lesson_id}/content")
+@max_queries(1)
+async def get_lesson_content(lesson_id: int, request: Request, session: AsyncSession = Depends(get_async_session)):
+    """
+    Fichier de la leçon (PDF, vidéo...) servi par l'API, pour les déploiements où le stockage
+    n'est pas joignable par les navigateurs. Requêtes Range prises en charge (206) :
+    le lecteur vidéo peut se déplacer sans tout télécharger.
+    """
+    row = (await session.exec(select(Lesson.id, Lesson.content_url).where(Lesson.id == lesson_id))).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Leçon introuvable")
+    if not is_blob_name(row.content_url):
+        raise HTTPException(status_code=404, detail="Aucun fichier pour cette leçon")
+
+    info = await content_proxy.info(row.content_url)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Fichier introuvable")
+
+    if etag_matches(request, info.etag):
+        return not_modified(info.etag, "content")
+    headers = {"Accept-Ranges": "bytes", **cache_headers(info.etag, "content")}
+    byte_range = None
+    # If-Range : la plage n'est valable que pour la version du fichier que le client a déjà
+    if request.headers.get("if-range", info.etag) == info.etag:
+        try:
+            byte_range = parse_range(request.headers.get("range"), info.size)
+        except RangeNotSatisfiable:
+            raise HTTPException(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                detail="Plage hors du fichier",
+                headers={"Content-Range": f"bytes */{info.size}"},
+            )
+
+    start, end = byte_range or (0, info.size - 1)
+    headers["Content-Length"] = str(end - start + 1)
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{info.size}"
+    return StreamingResponse(
+        content_proxy.stream(row.content_url, info, start, end),
+        status_code=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
+        media_type=info.content_type or "application/octet-stream",
+        headers=headers,
+    )
 
 @router.put("/lessons/{lesson_id}", response_model=LessonRead)
-def update_lesson(lesson_id: int, lesson_update: LessonCreate, session: Session = Depends(get_session)):
-    db_lesson = session.get(Lesson, lesson_id)
+@max_queries(12)
+async def update_lesson(lesson_id: int, lesson_update: LessonCreate, session: AsyncSession = Depends(get_async_session)):
+    db_lesson = await session.get(Lesson, lesson_id)
     if not db_lesson:
         raise HTTPException(status_code=404, detail="Leçon introuvable")
     
+    previous_course_id = db_lesson.course_id
+    previous_content_url = db_lesson.content_url
     lesson_data = lesson_update.model_dump(exclude_unset=True)
     for key, value in lesson_data.items():
         setattr(db_lesson, key, value)
         
     session.add(db_lesson)
-    session.commit()
-    session.refresh(db_lesson)
+    await session.flush()
+    queued = 0
+    new_file = False
+    if db_lesson.content_url != previous_content_url:
+        new_file = await add_blob_ref(session, db_lesson.content_url)
+        queued = await release_blob_refs(session, [previous_content_url])
+    await bump_course_version(session, previous_course_id)
+    if db_lesson.course_id != previous_course_id:
+        await bump_course_version(session, db_lesson.course_id)
+    await session.commit()
+    if queued:
+        blob_cleanup.wake()
+    if new_file:
+        metadata_extractor.wake()
+    await session.refresh(db_lesson)
+    invalidation_bus.publish("lesson", db_lesson.id) # document ré-indexé dans chaque worker
     return db_lesson
 
 @router.delete("/lessons/{lesson_id}")
-def delete_lesson(lesson_id: int, session: Session = Depends(get_session)):
-    lesson = session.get(Lesson, lesson_id)
+@max_queries(7)
+async def delete_lesson(lesson_id: int, session: AsyncSession = Depends(get_async_session)):
+    lesson = await session.get(Lesson, lesson_id)
     if not lesson:
         raise HTTPException(status_code=404, detail="Leçon introuvable")
     
     # Nettoyage Azure Blob Storage
-    # Si la leçon a un fichier attaché (PDF/Vidéo), on le supprime du Cloud
-    if lesson.content_url:
-        delete_file_from_blob(lesson.content_url)
+    # Si la leçon a un fichier attaché (PDF/Vidéo) qu'aucune autre leçon n'utilise, il est supprimé du Cloud en arrière-plan
+    queued = await release_blob_refs(session, [lesson.content_url])
     
     # Suppression BDD
-    session.delete(lesson)
-    session.commit()
+    await session.delete(lesson)
+    await bump_course_version(session, lesson.course_id)
+    await session.commit()
+    if queued:
+        blob_cleanup.wake()
+    invalidation_bus.publish("lesson", lesson_id)
     
     return {"message": "Leçon et fichier associé supprimés"}
\ No newline at end of file
@@ -1,24 +1,38 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.orm import selectinload
+from sqlalchemy import delete, func, insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from pydantic import BaseModel
 
-from ..database import get_session
+from ..database import get_async_session
+from ..services.query_budget import max_queries
+from ..services.cache import quiz_snapshots, invalidate_quiz
+from ..services.grading import get_answer_key, grade_submission, grade_batch_details, is_passed
+from ..services.attempts import attempt_buffer, attempt_row, aggregate, delete_quiz_history, discard_deleted_quizzes
+from ..services.http_cache import (
+    course_etag, etag_matches, not_modified, dumps, json_response, bump_course_version
+)
 from ..models import (
     Quiz, QuizCreate, QuizRead, 
     QuizQuestion, QuizQuestionBase, QuizQuestionRead,
     QuizChoice, QuizChoiceBase,
+    QuizStats, QuizQuestionStats,
     Course
 )
 
 router = APIRouter()
 
 # --- MODÈLES DE CRÉATION IMBRIQUÉS (Pour simplifier la vie du Frontend) ---
+# L'id est optionnel : fourni, il permet au PUT de mettre à jour la ligne existante
 class ChoicePayload(BaseModel):
+    id: Optional[int] = None
     text: str
     is_correct: bool
 
 class QuestionPayload(BaseModel):
+    id: Optional[int] = None
     text: str
     points: int = 1
     choices: List[ChoicePayload]
@@ -26,140 +40,283 @@ class QuestionPayload(BaseModel):
 class FullQuizCreate(QuizCreate):
     questions: List[QuestionPayload] = []
 
+# --- UTILITAIRES D'ÉCRITURE ---
+async def bulk_insert_questions(session: AsyncSession, quiz_id: int, questions: List[QuestionPayload]):
+    """
+    Insère des questions puis tous leurs choix par lots (executemany) :
+    2 requêtes quel que soit le nombre de questions.
+    Les ids des questions sont renvoyés par l'INSERT lui-même (RETURNING) : pas de relecture,
+    sûr même si un autre quiz est écrit en parallèle.
+    """
+    if not questions:
+        return
+    # SQL Server, PostgreSQL : SQLAlchemy renvoie les ids dans l'ordre du payload, par lots.
+    # SQLite ne le permet qu'avec un INSERT par ligne ; mais la base y est verrouillée en écriture
+    # jusqu'au commit et les rowid d'un INSERT multi-lignes sont croissants : les ids triés suffisent.
+    ordered = session.get_bind().dialect.name != "sqlite"
+    new_ids = (await session.exec(
+        insert(QuizQuestion).returning(QuizQuestion.id, sort_by_parameter_order=ordered),
+        params=[{"text": q.text, "points": q.points, "quiz_id": quiz_id} for q in questions],
+    )).scalars().all()
+    if not ordered:
+        new_ids = sorted(new_ids)
+    choices = [
+        {"text": c.text, "is_correct": c.is_correct, "question_id": question_id}
+        for question_id, q in zip(new_ids, questions)
+        for c in q.choices
+    ]
+    if choices:
+        await session.exec(insert(QuizChoice), params=choices)
+
+async def delete_quizzes(session: AsyncSession, quiz_ids: List[int]):
+    """
+    Supprime des quiz, leurs questions, leurs choix et leur historique par DELETE groupés :
+    nombre de requêtes constant (la cascade ORM chargerait les choix question par question).
+    """
+    if not quiz_ids:
+        return
+    await delete_quiz_history(session, quiz_ids)
+    question_ids = select(QuizQuestion.id).where(QuizQuestion.quiz_id.in_(quiz_ids))
+    for statement in (
+        delete(QuizChoice).where(QuizChoice.question_id.in_(question_ids)),
+        delete(QuizQuestion).where(QuizQuestion.quiz_id.in_(quiz_ids)),
+        delete(Quiz).where(Quiz.id.in_(quiz_ids)),
+    ):
+        await session.exec(statement.execution_options(synchronize_session=False))
+
+def update_fields(obj, **values):
+    # On ne touche que les colonnes réellement modifiées (UPDATE minimal)
+    for key, value in values.items():
+        if getattr(obj, key) != value:
+            setattr(obj, key, value)
+
+def match_rows(existing: list, payloads: list) -> list:
+    """
+    Associe chaque élément du payload à une ligne existante :
+    d'abord par id explicite, puis par position pour ceux qui n'en ont pas.
+    Retourne une liste de (ligne existante ou None, payload).
+    """
+    by_id = {row.id: row for row in existing}
+    explicit = {p.id for p in payloads if p.id in by_id}
+    free_rows = iter([row for row in existing if row.id not in explicit])
+    pairs = []
+    for payload in payloads:
+        if payload.id in explicit:
+            pairs.append((by_id[payload.id], payload))
+        else:
+            pairs.append((next(free_rows, None), payload))
+    return pairs
+
+async def apply_quiz_diff(session: AsyncSession, db_quiz: Quiz, quiz_data: FullQuizCreate):
+    """N'insère, ne modifie ou ne supprime que les lignes qui ont changé (ids des choix conservés)"""
+    update_fields(db_quiz, title=quiz_data.title, description=quiz_data.description, order=quiz_data.order)
+
+    existing_questions = sorted(db_quiz.questions, key=lambda q: q.id)
+    kept = set()
+    new_questions = []
+    new_choices = []
+    for db_question, q_data in match_rows(existing_questions, quiz_data.questions):
+        if db_question is None:
+            new_questions.append(q_data)
+            continue
+        kept.add(db_question.id)
+        update_fields(db_question, text=q_data.text, points=q_data.points)
+
+        existing_choices = sorted(db_question.choices, key=lambda c: c.id)
+        kept_choices = set()
+        for db_choice, c_data in match_rows(existing_choices, q_data.choices):
+            if db_choice is None:
+                new_choices.append({"text": c_data.text, "is_correct": c_data.is_correct, "question_id": db_question.id})
+                continue
+            kept_choices.add(db_choice.id)
+            update_fields(db_choice, text=c_data.text, is_correct=c_data.is_correct)
+        for db_choice in existing_choices:
+            if db_choice.id not in kept_choices:
+                db_question.choices.remove(db_choice) # delete-orphan => DELETE au flush
+
+    removed = [db_question for db_question in existing_questions if db_question.id not in kept]
+    for db_question in removed:
+        db_quiz.questions.remove(db_question)
+    if removed:
+        # Statistiques des questions supprimées (pas de clé étrangère : nettoyage explicite)
+        await session.exec(delete(QuizQuestionStats).where(QuizQuestionStats.question_id.in_([q.id for q in removed])))
+
+    # Les ajouts passent par des insertions en lot (le flush des modifications ORM se fait avant)
+    if new_choices:
+        await session.exec(insert(QuizChoice), params=new_choices)
+    await bulk_insert_questions(session, db_quiz.id, new_questions)
+
 # --- ROUTES QUIZ ---
 
 @router.post("/courses/{course_id}/quiz", response_model=QuizRead)
-def create_full_quiz(course_id: int, quiz_data: FullQuizCreate, session: Session = Depends(get_session)):
+@max_queries(6)
+async def create_full_quiz(course_id: int, quiz_data: FullQuizCreate, session: AsyncSession = Depends(get_async_session)):
     """
     Création optimisée d'un quiz et de ses questions en une seule transaction.
+    Les questions puis les choix sont insérés par lots (id du quiz récupéré au flush).
     """
-    course = session.get(Course, course_id)
+    course = await session.get(Course, course_id)
     if not course:
         raise HTTPException(status_code=404, detail="Cours introuvable")
 
-    # Création du Quiz
     db_quiz = Quiz(title=quiz_data.title, description=quiz_data.description, order=quiz_data.order, course_id=course_id)
     session.add(db_quiz)
-    session.commit()
-    session.refresh(db_quiz)
-
-    # Création des Questions et Choix
-    for q_data in quiz_data.questions:
-        db_question = QuizQuestion(text=q_data.text, points=q_data.points, quiz_id=db_quiz.id)
-        session.add(db_question)
-        session.commit()
-        session.refresh(db_question)
-        
-        for c_data in q_data.choices:
-            db_choice = QuizChoice(text=c_data.text, is_correct=c_data.is_correct, question_id=db_question.id)
-            session.add(db_choice)
-    
-    session.commit()
+    await session.flush() # Récupère l'id du quiz sans valider la transaction
+    await bulk_insert_questions(session, db_quiz.id, quiz_data.questions)
+    await bump_course_version(session, course_id)
+    await session.commit()
+    # Un id peut être réutilisé après suppression (SQLite) : on repart d'un cache propre
+    invalidate_quiz(db_quiz.id)
     return db_quiz
 
 @router.put("/courses/{course_id}/quiz", response_model=QuizRead)
-def replace_quiz_for_course(course_id: int, quiz_data: FullQuizCreate, session: Session = Depends(get_session)):
-    course = session.get(Course, course_id)
+@max_queries(8)
+async def replace_quiz_for_course(course_id: int, quiz_data: FullQuizCreate, session: AsyncSession = Depends(get_async_session)):
+    """
+    Met à jour le quiz du cours par différence avec l'existant,
+    au lieu de tout supprimer puis tout recréer.
+    """
+    course = await session.get(Course, course_id)
     if not course:
         raise HTTPException(status_code=404, detail="Cours introuvable")
 
-    # Supprimer tous les quiz du cours (questions/choix supprimés en cascade)
-    existing_quizzes = session.exec(select(Quiz).where(Quiz.course_id == course_id)).all()
-    for q in existing_quizzes:
-        session.delete(q)
-    session.commit()
-
-    # Recréer avec les nouvelles données
-    new_quiz = Quiz(title=quiz_data.title, description=quiz_data.description, order=quiz_data.order, course_id=course_id)
-    session.add(new_quiz)
-    session.commit()
-    session.refresh(new_quiz)
-
-    for q_data in quiz_data.questions:
-        db_question = QuizQuestion(text=q_data.text, points=q_data.points, quiz_id=new_quiz.id)
-        session.add(db_question)
-        session.commit()
-        session.refresh(db_question)
-
-        for c_data in q_data.choices:
-            db_choice = QuizChoice(text=c_data.text, is_correct=c_data.is_correct, question_id=db_question.id)
-            session.add(db_choice)
-
-    session.commit()
-    return new_quiz
+    statement = (
+        select(Quiz)
+        .where(Quiz.course_id == course_id)
+        .order_by(Quiz.order, Quiz.id)
+        .options(selectinload(Quiz.questions).selectinload(QuizQuestion.choices))
+    )
+    existing_quizzes = (await session.exec(statement)).all()
+
+    if existing_quizzes:
+        db_quiz, extra_quizzes = existing_quizzes[0], existing_quizzes[1:]
+        # Un seul quiz par cours : les autres sont supprimés (questions/choix en cascade)
+        await delete_quiz_history(session, [q.id for q in extra_quizzes])
+        for q in extra_quizzes:
+            await session.delete(q)
+        await apply_quiz_diff(session, db_quiz, quiz_data)
+    else:
+        extra_quizzes = []
+        db_quiz = Quiz(title=quiz_data.title, description=quiz_data.description, order=quiz_data.order, course_id=course_id)
+        session.add(db_quiz)
+        await session.flush()
+        await bulk_insert_questions(session, db_quiz.id, quiz_data.questions)
+
+    stale_ids = [q.id for q in extra_quizzes]
+    await bump_course_version(session, course_id)
+    await session.commit()
+    invalidate_quiz(db_quiz.id, *stale_ids)
+    return db_quiz
 
 @router.get("/courses/{course_id}/quiz", response_model=List[QuizRead])
-def list_quiz_for_course(course_id: int, session: Session = Depends(get_session)):
-    quiz = session.exec(select(Quiz).where(Quiz.course_id == course_id).order_by(Quiz.order)).all()
+@max_queries(1)
+async def list_quiz_for_course(course_id: int, session: AsyncSession = Depends(get_async_session)):
+    quiz = (await session.exec(select(Quiz).where(Quiz.course_id == course_id).order_by(Quiz.order))).all()
     return quiz
 
-@router.get("/quiz/{quiz_id}")
-def get_quiz_details_for_student(quiz_id: int, session: Session = Depends(get_session)):
-    quiz = session.get(Quiz, quiz_id)
-    if not quiz:
-        raise HTTPException(status_code=404, detail="Quiz introuvable")
-    
+def quiz_etag(quiz_id: int, created_at, version: int, include_answers: bool) -> str:
+    return course_etag("quiz-full" if include_answers else "quiz", quiz_id, created_at, version)
+
+async def lookup_quiz_etag(session: AsyncSession, quiz_id: int, include_answers: bool = False) -> Optional[str]:
+    """Requête légère (version du cours parent) pour répondre 304 sans charger le quiz"""
+    head = (await session.exec(
+        select(Course.created_at, Course.version)
+        .join(Quiz, Quiz.course_id == Course.id)
+        .where(Quiz.id == quiz_id)
+    )).first()
+    if head is None:
+        return None
+    return quiz_etag(quiz_id, head.created_at, head.version, include_answers)
+
+async def load_quiz_payload(session: AsyncSession, quiz_id: int, include_answers: bool = False) -> Optional[Tuple[dict, str]]:
+    """
+    Charge un quiz, ses questions et ses choix en UNE seule requête (jointure),
+    au lieu d'une requête par question. Retourne (payload, ETag).
+    """
+    statement = (
+        select(
+            Quiz.id, Quiz.title, Quiz.description,
+            QuizQuestion.id, QuizQuestion.text, QuizQuestion.points,
+            QuizChoice.id, QuizChoice.text, QuizChoice.is_correct,
+            Course.created_at, Course.version,
+        )
+        .join(Course, Course.id == Quiz.course_id)
+        .outerjoin(QuizQuestion, QuizQuestion.quiz_id == Quiz.id)
+        .outerjoin(QuizChoice, QuizChoice.question_id == QuizQuestion.id)
+        .where(Quiz.id == quiz_id)
+        .order_by(QuizQuestion.id, QuizChoice.id)
+    )
+    rows = (await session.exec(statement)).all()
+    if not rows:
+        return None
+
     # On construit la réponse manuellement pour contrôler ce qu'on envoie
+    first = rows[0]
     result = {
-        "id": quiz.id,
-        "title": quiz.title,
-        "description": quiz.description,
+        "id": first[0],
+        "title": first[1],
+        "description": first[2],
         "questions": []
     }
-    
-    # On charge les questions triées
-    questions = session.exec(select(QuizQuestion).where(QuizQuestion.quiz_id == quiz_id)).all()
-    
-    for q in questions:
-        q_data = {
-            "id": q.id,
-            "text": q.text,
-            "points": q.points,
-            "choices": []
-        }
-        # On charge les choix
-        choices = session.exec(select(QuizChoice).where(QuizChoice.question_id == q.id)).all()
-        for c in choices:
-            q_data["choices"].append({
-                "id": c.id,
-                "text": c.text
-                # PAS de is_correct ici !
-            })
-        result["questions"].append(q_data)
-        
-    return result
+    current = None
+    for _, _, _, q_id, q_text, q_points, c_id, c_text, c_correct, _, _ in rows:
+        if q_id is None:
+            continue
+        if current is None or current["id"] != q_id:
+            current = {"id": q_id, "text": q_text, "points": q_points, "choices": []}
+            result["questions"].append(current)
+        if c_id is None:
+            continue
+        choice = {"id": c_id, "text": c_text}
+        if include_answers:
+            choice["is_correct"] = c_correct
+        # Sinon PAS de is_correct : on évite la triche !
+        current["choices"].append(choice)
+    return result, quiz_etag(quiz_id, first[9], first[10], include_answers)
+
+@router.get("/quiz/{quiz_id}")
+@max_queries(1)
+async def get_quiz_details_for_student(quiz_id: int, request: Request, session: AsyncSession = Depends(get_async_session)):
+    # Snapshot immuable (ETag + JSON déjà sérialisé) : les parties suivantes ne touchent pas la BDD
+    cached = quiz_snapshots.get(quiz_id)
+    if cached is None:
+        generation = quiz_snapshots.generation
+        # Worker froid : si le client a déjà une version, une requête légère suffit peut-être
+        if request.headers.get("if-none-match"):
+            etag = await lookup_quiz_etag(session, quiz_id)
+            if etag is None:
+                raise HTTPException(status_code=404, detail="Quiz introuvable")
+            if etag_matches(request, etag):
+                return not_modified(etag, "quiz")
+        loaded = await load_quiz_payload(session, quiz_id)
+        if loaded is None:
+            raise HTTPException(status_code=404, detail="Quiz introuvable")
+        result, etag = loaded
+        cached = (etag, dumps(result))
+        # Pas gardé si le quiz a été modifié (par n'importe quel worker) pendant le chargement
+        quiz_snapshots.set(quiz_id, cached, generation=generation)
+
+    etag, snapshot = cached
+    if etag_matches(request, etag):
+        return not_modified(etag, "quiz")
+    return json_response(snapshot, etag, "quiz")
 
 @router.get("/quiz/{quiz_id}/full")
-def get_quiz_details_for_editor(quiz_id: int, session: Session = Depends(get_session)):
-    quiz = session.get(Quiz, quiz_id)
-    if not quiz:
+@max_queries(2)
+async def get_quiz_details_for_editor(quiz_id: int, request: Request, session: AsyncSession = Depends(get_async_session)):
+    # Vue éditeur, peu sollicitée : pas de cache, une seule requête pour un client sans ETag
+    if request.headers.get("if-none-match"):
+        etag = await lookup_quiz_etag(session, quiz_id, include_answers=True)
+        if etag is None:
+            raise HTTPException(status_code=404, detail="Quiz introuvable")
+        if etag_matches(request, etag):
+            return not_modified(etag, "quiz")
+
+    loaded = await load_quiz_payload(session, quiz_id, include_answers=True)
+    if loaded is None:
         raise HTTPException(status_code=404, detail="Quiz introuvable")
-
-    result = {
-        "id": quiz.id,
-        "title": quiz.title,
-        "description": quiz.description,
-        "questions": []
-    }
-
-    questions = session.exec(select(QuizQuestion).where(QuizQuestion.quiz_id == quiz_id)).all()
-    for q in questions:
-        q_data = {
-            "id": q.id,
-            "text": q.text,
-            "points": q.points,
-            "choices": []
-        }
-        choices = session.exec(select(QuizChoice).where(QuizChoice.question_id == q.id)).all()
-        for c in choices:
-            q_data["choices"].append({
-                "id": c.id,
-                "text": c.text,
-                "is_correct": c.is_correct
-            })
-        result["questions"].append(q_data)
-
-    return result
+    result, etag = loaded
+    return json_response(dumps(result), etag, "quiz")
 
 # --- ROUTE CORRECTION ---
 
@@ -167,61 +324,125 @@ class UserAnswer(BaseModel):
     question_id: int
     choice_id: int
 
+class QuizSubmission(BaseModel):
+    reference: Optional[str] = None # Identifiant libre de la copie (ex: n° étudiant)
+    answers: List[UserAnswer]
+
 @router.post("/quiz/{quiz_id}/submit")
-def submit_quiz(quiz_id: int, answers: List[UserAnswer], session: Session = Depends(get_session)):
-    quiz = session.get(Quiz, quiz_id)
-    if not quiz:
+@max_queries(8)
+async def submit_quiz(quiz_id: int, answers: List[UserAnswer], session: AsyncSession = Depends(get_async_session)):
+    # Clé de correction compilée et mise en cache : aucune requête par réponse
+    key = await get_answer_key(session, quiz_id)
+    if not key:
         raise HTTPException(status_code=404, detail="Quiz introuvable")
 
-    score = 0
-    max_score = 0
-    results_detail = []
-
-    # On récupère toutes les questions du quiz
-    questions = session.exec(select(QuizQuestion).where(QuizQuestion.quiz_id == quiz_id)).all()
-    question_map = {q.id: q for q in questions} # Dictionnaire pour accès rapide
-
-    # Calcul du score maximum possible
-    for q in questions:
-        max_score += q.points
-
-    # Vérification des réponses utilisateur
-    for ans in answers:
-        question = question_map.get(ans.question_id)
-        if not question:
-            continue # Question n'appartient pas au quiz ou n'existe pas
-            
-        choice = session.get(QuizChoice, ans.choice_id)
-        
-        # Vérif : Le choix existe, appartient à la bonne question, et est correct
-        is_correct = False
-        if choice and choice.question_id == ans.question_id and choice.is_correct:
-            score += question.points
-            is_correct = True
-            
-        results_detail.append({
-            "question_id": ans.question_id,
-            "is_correct": is_correct
-        })
+    result = grade_submission(key, ((ans.question_id, ans.choice_id) for ans in answers))
+    # Enregistrement différé : la requête qui remplit la file écrit tout le lot
+    row = attempt_row(
+        quiz_id, result["score"], key.total_points, result["passed"],
+        ((d["question_id"], d["is_correct"]) for d in result["details"]),
+    )
+    if attempt_buffer.add([row]):
+        await attempt_buffer.flush(session)
+    return result
 
-    passed = (score / max_score) >= 0.5 if max_score > 0 else False
+@router.post("/quiz/{quiz_id}/submit/batch")
+@max_queries(8)
+async def submit_quiz_batch(quiz_id: int, submissions: List[QuizSubmission], session: AsyncSession = Depends(get_async_session)):
+    """Corrige des milliers de copies en un appel (import le jour de l'examen)"""
+    key = await get_answer_key(session, quiz_id)
+    if not key:
+        raise HTTPException(status_code=404, detail="Quiz introuvable")
+
+    scores, details = grade_batch_details(key, [[(ans.question_id, ans.choice_id) for ans in sub.answers] for sub in submissions])
+
+    results = [
+        {
+            "reference": sub.reference,
+            "score": score,
+            "passed": is_passed(score, key.total_points)
+        }
+        for sub, score in zip(submissions, scores.tolist())
+    ]
+    rows = [
+        attempt_row(quiz_id, r["score"], key.total_points, r["passed"], sub_details, reference=r["reference"])
+        for r, sub_details in zip(results, details)
+    ]
+    if attempt_buffer.add(rows):
+        await attempt_buffer.flush(session)
+
+    return {
+        "quiz_title": key.title,
+        "total_points": key.total_points,
+        "results": results
+    }
+
+@router.get("/quiz/{quiz_id}/stats")
+@max_queries(2)
+async def get_quiz_stats(quiz_id: int, session: AsyncSession = Depends(get_async_session)):
+    """
+    Agrégats du quiz lus dans quizstats / quizquestionstats (2 requêtes, sans parcourir les tentatives).
+    Les tentatives encore en file dans CE worker sont ajoutées ; celles des autres workers
+    apparaissent après leur prochaine écriture (ATTEMPT_FLUSH_INTERVAL).
+    """
+    head = (await session.exec(
+        select(Quiz.id, QuizStats.attempts, QuizStats.passed, QuizStats.score_sum)
+        .outerjoin(QuizStats, QuizStats.quiz_id == Quiz.id)
+        .where(Quiz.id == quiz_id)
+    )).first()
+    if head is None:
+        raise HTTPException(status_code=404, detail="Quiz introuvable")
+
+    questions = (await session.exec(
+        select(
+            QuizQuestion.id, QuizQuestion.text,
+            func.coalesce(QuizQuestionStats.answered, 0), func.coalesce(QuizQuestionStats.correct, 0),
+        )
+        .outerjoin(QuizQuestionStats, (QuizQuestionStats.quiz_id == QuizQuestion.quiz_id) & (QuizQuestionStats.question_id == QuizQuestion.id))
+        .where(QuizQuestion.quiz_id == quiz_id)
+        .order_by(QuizQuestion.id)
+    )).all()
+
+    pending_quiz, pending_questions = aggregate(attempt_buffer.pending(quiz_id))
+    extra = pending_quiz.get((quiz_id,), [0, 0, 0])
+    attempts = (head[1] or 0) + extra[0]
+    passed = (head[2] or 0) + extra[1]
+    score_sum = (head[3] or 0) + extra[2]
+
+    question_stats = []
+    for question_id, text, answered, correct in questions:
+        extra_answered, extra_correct = pending_questions.get((quiz_id, question_id), [0, 0])
+        answered += extra_answered
+        correct += extra_correct
+        question_stats.append({
+            "question_id": question_id,
+            "text": text,
+            "answered": answered,
+            "correct": correct,
+            "correct_rate": correct / answered if answered else None,
+        })
 
     return {
-        "quiz_title": quiz.title,
-        "score": score,
-        "total_points": max_score,
+        "quiz_id": quiz_id,
+        "attempts": attempts,
         "passed": passed,
-        "details": results_detail
+        "pass_rate": passed / attempts if attempts else None,
+        "average_score": score_sum / attempts if attempts else None,
+        "questions": question_stats,
     }
 
 
 @router.delete("/quiz/{quiz_id}")
-def delete_quiz(quiz_id: int, session: Session = Depends(get_session)):
-    quiz = session.get(Quiz, quiz_id)
-    if not quiz:
+@max_queries(8)
+async def delete_quiz(quiz_id: int, session: AsyncSession = Depends(get_async_session)):
+    course_id = (await session.exec(select(Quiz.course_id).where(Quiz.id == quiz_id))).first()
+    if course_id is None:
         raise HTTPException(status_code=404, detail="Quiz introuvable")
         
-    session.delete(quiz)
-    session.commit()
+    await delete_quizzes(session, [quiz_id])
+    await bump_course_version(session, course_id)
+    await session.commit()
+    invalidate_quiz(quiz_id)
+    discard_deleted_quizzes(quiz_id)
     
     return {"message": "Quiz supprimé avec succès"}
\ No newline at end of file
@@ -0,0 +1,54 @@
+import asyncio
+from typing import Optional
+from anyio import from_thread
+from fastapi import APIRouter, Depends, Query
+from starlette.concurrency import run_in_threadpool
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..database import get_async_session
+from ..services.query_budget import max_queries, unbudgeted
+from ..services.search_index import search_index
+
+router = APIRouter()
+
+# Une seule construction de l'index à la fois par worker
+_index_loading = asyncio.Lock()
+
+
+class _ThreadSession:
+    """
+    Session asynchrone utilisée depuis un thread du pool : chaque requête SQL repasse par
+    la boucle d'événements, l'indexation (tokenisation, postings) reste dans le thread.
+    """
+    def __init__(self, session: AsyncSession):
+        self._session = session
+
+    def exec(self, statement):
+        return from_thread.run(self._session.exec, statement)
+
+
+@router.get("/search")
+@max_queries(0)
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    type: Optional[str] = Query(None, pattern="^(course|lesson)$"),
+    limit: int = Query(20, ge=1, le=100),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Recherche plein texte dans les cours et les leçons (index inversé en mémoire, BM25).
+    Insensible aux accents et à la casse ; le dernier mot peut être un préfixe.
+    """
+    # Premier appel du worker : chargement du snapshot disque (ou indexation complète), hors budget
+    # et hors de la boucle d'événements (les autres requêtes du worker continuent d'être servies)
+    if not search_index.ready:
+        async with _index_loading:
+            with unbudgeted():
+                await run_in_threadpool(search_index.ensure_ready, _ThreadSession(session))
+    # Documents écrits depuis (par ce worker ou un autre, via le bus d'invalidation) : relus, hors budget
+    if search_index.dirty:
+        with unbudgeted():
+            await run_in_threadpool(search_index.refresh, _ThreadSession(session))
+    # Calcul des scores (NumPy) hors de la boucle d'événements
+    results = await run_in_threadpool(search_index.search, q, limit, type)
+    return {"query": q, "results": results}
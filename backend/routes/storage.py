@@ -1,38 +1,190 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from ..services.blob_service import upload_file_to_blob, delete_file_from_blob
 import uuid
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import delete, func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..database import get_async_session
+from ..services.query_budget import max_queries
+from ..models import (
+    BlobRef, ContentType, Course, Lesson, LessonRead, PendingUpload, UploadComplete, UploadInitiate
+)
+from ..services.blob_cleanup import (
+    BlobDeletionInProgress, blob_cleanup, add_blob_ref, cancel_blob_deletion, enqueue_blob_deletions
+)
+from ..services.file_metadata import metadata_extractor
+from ..services.http_cache import bump_course_version
+from ..services.ordering import next_order
+from ..services.invalidation import invalidation_bus
+from ..services.blob_service import (
+    upload_deduplicated_async, file_extension, content_blob_name, delete_file_from_blob_async, generate_sas_url,
+    generate_upload_url, get_blob_info_async, is_blob_name, UploadTooLargeError, MAX_UPLOAD_SIZE,
+    UPLOAD_URL_VALIDITY_SECONDS
+)
 
 router = APIRouter()
 
 @router.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+@max_queries(2)
+async def upload_file(file: UploadFile = File(...), session: AsyncSession = Depends(get_async_session)):
     """
     1. Reçoit un fichier (PDF, Vidéo, Image...)
-    2. L'envoie sur Azure Blob Storage
-    3. Retourne le nom unique du fichier à stocker dans la BDD (content_url)
+    2. L'envoie sur Azure Blob Storage, sous son empreinte SHA-256 (rien n'est envoyé s'il y est déjà)
+    3. Retourne le nom du fichier à stocker dans la BDD (content_url)
+    Le fichier est envoyé bloc par bloc, sans jamais être chargé entièrement en mémoire.
     """
+    if file.size is not None and file.size > MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail=f"Fichier trop volumineux (max {MAX_UPLOAD_SIZE} octets)")
+
     try:
-        # Génération d'un nom unique (ex: "mon-cours.pdf" -> "a1b2-c3d4... .pdf")
-        extension = file.filename.split(".")[-1]
-        unique_filename = f"{uuid.uuid4()}.{extension}"
-        
-        # Lecture et envoi
-        file_data = await file.read()
-        uploaded_name = upload_file_to_blob(file_data, unique_filename)
+        # Nom = empreinte du contenu (ex: "mon-cours.pdf" -> "9f86d0...0f00a08.pdf")
+        uploaded_name = await upload_deduplicated_async(file, file_extension(file.filename), content_type=file.content_type)
+        # Un fichier identique en attente de suppression est conservé
+        await cancel_blob_deletion(session, uploaded_name)
+        await session.commit()
         
         return {
             "filename": uploaded_name, 
             "original_name": file.filename,
             "message": "Fichier uploadé avec succès. Utilisez 'filename' pour créer votre leçon."
         }
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except BlobDeletionInProgress:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur upload : {str(e)}")
     
 
 @router.delete("/upload/{filename}")
-def delete_uploaded_file(filename: str):
-    """Route utilitaire pour supprimer un fichier manuellement"""
-    success = delete_file_from_blob(filename)
+@max_queries(1)
+async def delete_uploaded_file(filename: str, session: AsyncSession = Depends(get_async_session)):
+    """Route utilitaire pour supprimer un fichier manuellement (refusé s'il sert encore à une leçon)"""
+    refcount = (await session.exec(select(BlobRef.refcount).where(BlobRef.blob_name == filename))).first()
+    if refcount and refcount > 0:
+        raise HTTPException(status_code=409, detail=f"Fichier encore utilisé par {refcount} leçon(s)")
+    success = await delete_file_from_blob_async(filename)
     if not success:
         raise HTTPException(status_code=404, detail="Fichier introuvable ou erreur suppression")
-    return {"message": f"Fichier {filename} supprimé avec succès"}
\ No newline at end of file
+    return {"message": f"Fichier {filename} supprimé avec succès"}
+
+
+# --- UPLOAD DIRECT (le navigateur envoie le fichier au stockage, l'API ne voit jamais son contenu) ---
+# Type de leçon déduit de l'extension quand il n'est pas précisé à la finalisation
+LESSON_TYPE_BY_EXTENSION = {
+    "pdf": ContentType.pdf,
+    "mp4": ContentType.video, "mov": ContentType.video, "avi": ContentType.video, "webm": ContentType.video, "mkv": ContentType.video,
+    "doc": ContentType.word, "docx": ContentType.word,
+}
+
+@router.post("/uploads/initiate")
+@max_queries(2)
+async def initiate_upload(request: UploadInitiate, session: AsyncSession = Depends(get_async_session)):
+    """
+    Étape 1 : URL d'écriture seule, de courte durée, pour un nouveau fichier de la taille annoncée.
+    Le client envoie le fichier avec la méthode et les en-têtes renvoyés, puis appelle /uploads/complete.
+    """
+    if request.size > MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail=f"Fichier trop volumineux (max {MAX_UPLOAD_SIZE} octets)")
+    if not await session.get(Course, request.course_id):
+        raise HTTPException(status_code=404, detail="Cours introuvable")
+
+    # Nom aléatoire et non l'empreinte du contenu : l'API ne lit pas le fichier et ne peut donc pas la vérifier
+    upload_id = uuid.uuid4().hex
+    blob_name = content_blob_name(upload_id, file_extension(request.filename))
+    now = datetime.now(timezone.utc)
+    target = generate_upload_url(blob_name, request.size, request.mime_type, now=now)
+    if target is None:
+        raise HTTPException(status_code=503, detail="Upload direct indisponible : signature du stockage non configurée")
+
+    expires_at = (now + timedelta(seconds=UPLOAD_URL_VALIDITY_SECONDS)).replace(tzinfo=None)
+    session.add(PendingUpload(
+        id=upload_id, blob_name=blob_name, course_id=request.course_id,
+        size=request.size, mime_type=request.mime_type, expires_at=expires_at,
+    ))
+    await session.commit()
+    return {"upload_id": upload_id, "filename": blob_name, "expires_at": expires_at, **target}
+
+@router.post("/uploads/complete", response_model=LessonRead)
+@max_queries(10)
+async def complete_upload(request: UploadComplete, session: AsyncSession = Depends(get_async_session)):
+    """Étape 2 : vérifie le fichier reçu par le stockage (présent, taille et type annoncés) puis crée la leçon"""
+    pending = await session.get(PendingUpload, request.upload_id)
+    if pending is None:
+        raise HTTPException(status_code=404, detail="Upload inconnu ou expiré")
+
+    info = await get_blob_info_async(pending.blob_name)
+    if info is None:
+        raise HTTPException(status_code=409, detail="Fichier pas encore reçu par le stockage")
+    problem = None
+    if info.size != pending.size:
+        problem = f"Taille reçue ({info.size} octets) différente de la taille annoncée ({pending.size} octets)"
+    elif info.content_type not in (None, pending.mime_type):
+        problem = f"Type reçu ({info.content_type}) différent du type annoncé ({pending.mime_type})"
+    if problem:
+        # L'URL ne permet pas de réécrire le fichier : l'upload est annulé, à recommencer
+        await session.exec(delete(PendingUpload).where(PendingUpload.id == pending.id))
+        await enqueue_blob_deletions(session, [pending.blob_name])
+        await session.commit()
+        blob_cleanup.wake()
+        raise HTTPException(status_code=422, detail=problem)
+
+    if not await session.get(Course, pending.course_id):
+        raise HTTPException(status_code=404, detail="Cours lié introuvable")
+    content_type = request.content_type or LESSON_TYPE_BY_EXTENSION.get(file_extension(pending.blob_name))
+    if content_type is None:
+        raise HTTPException(status_code=422, detail="content_type requis pour ce type de fichier")
+
+    # Une seule finalisation par upload, même si le client la rejoue en parallèle
+    claimed = await session.exec(delete(PendingUpload).where(PendingUpload.id == pending.id))
+    if claimed.rowcount != 1:
+        raise HTTPException(status_code=409, detail="Upload déjà finalisé")
+
+    order = request.order
+    if not order:
+        last = (await session.exec(select(func.max(Lesson.order)).where(Lesson.course_id == pending.course_id))).one()
+        order = next_order(last)
+    lesson = Lesson(
+        title=request.title,
+        description=request.description,
+        course_id=pending.course_id,
+        order=order,
+        content_type=content_type,
+        content_url=pending.blob_name,
+    )
+    session.add(lesson)
+    new_file = await add_blob_ref(session, pending.blob_name)
+    await bump_course_version(session, pending.course_id)
+    await session.commit()
+    await session.refresh(lesson)
+    if new_file:
+        metadata_extractor.wake()
+    invalidation_bus.publish("lesson", lesson.id)
+    return lesson
+
+
+class SignRequest(BaseModel):
+    course_id: int
+
+@router.post("/storage/sign")
+@max_queries(2)
+async def sign_course_files(request: SignRequest, session: AsyncSession = Depends(get_async_session)):
+    """Signe en un appel toutes les URL de fichiers des leçons d'un cours"""
+    if not await session.get(Course, request.course_id):
+        raise HTTPException(status_code=404, detail="Cours introuvable")
+
+    rows = (await session.exec(
+        select(Lesson.id, Lesson.content_url)
+        .where(Lesson.course_id == request.course_id, Lesson.content_url.is_not(None))
+        .order_by(Lesson.order, Lesson.id)
+    )).all()
+
+    return {
+        "course_id": request.course_id,
+        "files": [
+            {"lesson_id": lesson_id, "content_url": content_url, "content_url_signed": generate_sas_url(content_url)}
+            for lesson_id, content_url in rows
+            if is_blob_name(content_url)
+        ]
+    }
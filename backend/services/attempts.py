@@ -0,0 +1,207 @@
+"""
+Enregistrement des tentatives de quiz en écriture différée (write-behind).
+
+Les copies corrigées sont mises en file dans le worker puis écrites par lots :
+- dès que la file atteint ATTEMPT_BUFFER_SIZE (par la requête qui la remplit),
+- sinon toutes les ATTEMPT_FLUSH_INTERVAL secondes (tâche de fond),
+- et au plus tard à l'arrêt du worker (lifespan).
+Un pic de soumissions ne coûte donc plus un commit par copie.
+
+Chaque lot met aussi à jour, par incréments, les agrégats de quizstats / quizquestionstats :
+GET /quiz/{id}/stats les lit directement, sans parcourir les tentatives.
+"""
+import os
+import asyncio
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..models import Quiz, QuizAttempt, QuizQuestionStats, QuizStats
+from .invalidation import invalidation_bus
+from .upsert import upsert_counters
+
+# --- CONFIGURATION ---
+ATTEMPT_BUFFER_SIZE = int(os.getenv("ATTEMPT_BUFFER_SIZE", "200"))
+ATTEMPT_FLUSH_INTERVAL = float(os.getenv("ATTEMPT_FLUSH_INTERVAL", "2"))
+# Un lot qui échoue autant de fois de suite est abandonné (les tentatives de quiz supprimés sont retirées avant)
+ATTEMPT_FLUSH_RETRIES = int(os.getenv("ATTEMPT_FLUSH_RETRIES", "3"))
+
+
+def attempt_row(quiz_id: int, score: int, total_points: int, passed: bool,
+                details: Iterable[Tuple[int, bool]], reference: Optional[str] = None) -> dict:
+    """Ligne quizattempt prête à insérer ; l'horodatage est celui de la soumission, pas de l'écriture"""
+    return {
+        "quiz_id": quiz_id,
+        "reference": reference,
+        "score": score,
+        "total_points": total_points,
+        "passed": passed,
+        "results": {str(question_id): bool(correct) for question_id, correct in details},
+        "created_at": datetime.utcnow(),
+    }
+
+
+# --- AGRÉGATS ---
+def aggregate(rows: Iterable[dict]):
+    """Incréments (tentatives, réussites, somme des scores) par quiz et (réponses, bonnes réponses) par question"""
+    quizzes: Dict[Tuple[int], List[int]] = {}
+    questions: Dict[Tuple[int, int], List[int]] = {}
+    for row in rows:
+        quiz = quizzes.setdefault((row["quiz_id"],), [0, 0, 0])
+        quiz[0] += 1
+        quiz[1] += int(row["passed"])
+        quiz[2] += row["score"]
+        for question_id, correct in row["results"].items():
+            question = questions.setdefault((row["quiz_id"], int(question_id)), [0, 0])
+            question[0] += 1
+            question[1] += int(correct)
+    return quizzes, questions
+
+
+async def _add_to_counters(session: AsyncSession, table, keys: Tuple[str, ...], counters: Tuple[str, ...], deltas: dict):
+    """
+    compteur = compteur + delta, en une instruction (upsert groupé, executemany) :
+    sûr quand deux workers écrivent en même temps les premières tentatives d'un quiz.
+    """
+    rows = [{**dict(zip(keys, key)), **dict(zip(counters, values))} for key, values in deltas.items()]
+    await upsert_counters(session, table, rows, keys=keys, counters=counters)
+
+
+# --- FILE D'ÉCRITURE DIFFÉRÉE ---
+class AttemptBuffer:
+    """
+    File des tentatives non encore écrites (une par worker).
+    Utilisée uniquement depuis la boucle asyncio du worker : pas de verrou nécessaire.
+    """
+
+    def __init__(self, max_size: int = ATTEMPT_BUFFER_SIZE, interval: float = ATTEMPT_FLUSH_INTERVAL):
+        self.max_size = max_size
+        self.interval = interval
+        self._pending: List[dict] = []
+        self._failures = 0
+        self._task: Optional[asyncio.Task] = None
+        self._session_factory = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, rows: Iterable[dict]) -> bool:
+        """Met des tentatives en file. Retourne True si le seuil d'écriture est atteint."""
+        self._pending.extend(rows)
+        return len(self._pending) >= self.max_size
+
+    def pending(self, quiz_id: int) -> List[dict]:
+        return [row for row in self._pending if row["quiz_id"] == quiz_id]
+
+    def discard(self, quiz_ids: Iterable[int]):
+        """Oublie les tentatives en file de quiz supprimés"""
+        quiz_ids = set(quiz_ids)
+        self._pending = [row for row in self._pending if row["quiz_id"] not in quiz_ids]
+
+    # Abonnement au bus d'invalidation (événements "quiz_deleted" de tous les workers)
+    def invalidate(self, quiz_id: int):
+        self.discard([quiz_id])
+
+    def clear(self):
+        # Messages peut-être perdus : rien à oublier ici, flush() retire les tentatives de quiz disparus
+        pass
+
+    async def _without_deleted_quizzes(self, session: AsyncSession, batch: List[dict]) -> List[dict]:
+        """Tentatives dont le quiz existe encore (suppression ratée par le bus, ou antérieure à l'écriture)"""
+        quiz_ids = sorted({row["quiz_id"] for row in batch})
+        existing = set((await session.exec(select(Quiz.id).where(Quiz.id.in_(quiz_ids)))).scalars().all())
+        kept = [row for row in batch if row["quiz_id"] in existing]
+        if len(kept) < len(batch):
+            print(f"{len(batch) - len(kept)} tentative(s) de quiz supprimés abandonnées")
+        return kept
+
+    async def flush(self, session: AsyncSession) -> int:
+        """
+        Écrit toute la file en une transaction (tentatives + agrégats).
+        En cas d'échec, les tentatives de quiz supprimés entre-temps sont retirées (clés étrangères),
+        et le reste du lot est remis en tête de file pour la prochaine écriture :
+        la requête qui a déclenché l'écriture n'échoue pas pour autant.
+        """
+        batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+        try:
+            await session.exec(insert(QuizAttempt), params=batch)
+            quizzes, questions = aggregate(batch)
+            await _add_to_counters(session, QuizStats.__table__, ("quiz_id",), ("attempts", "passed", "score_sum"), quizzes)
+            await _add_to_counters(session, QuizQuestionStats.__table__, ("quiz_id", "question_id"), ("answered", "correct"), questions)
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            try:
+                # Quiz supprimés entre-temps : leurs tentatives sont retirées, le reste sera réécrit
+                batch = await self._without_deleted_quizzes(session, batch)
+            except Exception:
+                pass  # base injoignable : lot inchangé
+            await session.rollback()
+            self._failures += 1
+            if self._failures < ATTEMPT_FLUSH_RETRIES:
+                self._pending[:0] = batch
+                print(f"Écriture des tentatives en échec ({e}) : {len(batch)} remises en file")
+            else:
+                self._failures = 0
+                print(f"Écriture des tentatives en échec ({e}) : {len(batch)} abandonnées")
+            return 0
+        self._failures = 0
+        return len(batch)
+
+    async def drain(self, session_factory) -> int:
+        """Vide la file avec une session dédiée (tâche de fond, arrêt du worker)"""
+        if not self._pending:
+            return 0
+        async with session_factory() as session:
+            return await self.flush(session)
+
+    # --- ÉCRITURE PÉRIODIQUE ---
+    def start(self, session_factory):
+        self._session_factory = session_factory
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.drain(self._session_factory)
+            except Exception as e:
+                print(f"Écriture périodique des tentatives en échec : {e}")
+
+    async def stop(self):
+        """Arrêt du worker : plus d'écriture périodique, puis écriture de tout ce qui reste"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._session_factory is not None:
+            written = await self.drain(self._session_factory)
+            if written:
+                print(f"{written} tentatives écrites à l'arrêt")
+
+
+attempt_buffer = AttemptBuffer()
+
+
+async def delete_quiz_history(session: AsyncSession, quiz_ids: List[int]):
+    """À appeler AVANT de supprimer des quiz : tentatives et agrégats (les ids peuvent être réutilisés)"""
+    if not quiz_ids:
+        return
+    for model in (QuizAttempt, QuizQuestionStats, QuizStats):
+        await session.exec(delete(model).where(model.quiz_id.in_(quiz_ids)))
+    attempt_buffer.discard(quiz_ids)
+
+
+def discard_deleted_quizzes(*quiz_ids: int):
+    """À appeler après le commit de la suppression : les autres workers oublient aussi leurs tentatives en file"""
+    invalidation_bus.publish("quiz_deleted", *quiz_ids)
+
+
+invalidation_bus.subscribe("quiz_deleted", attempt_buffer)
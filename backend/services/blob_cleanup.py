@@ -0,0 +1,366 @@
+"""
+Suppression des fichiers du Blob Storage en arrière-plan (outbox).
+
+Les routes n'appellent plus Azure : elles écrivent les fichiers à supprimer dans la table
+blobdeletion, dans la même transaction que la suppression en base, et répondent tout de suite.
+Un worker de fond vide cette table par lots (API Blob Batch, 256 fichiers par appel) ;
+en cas d'échec, la ligne est retentée plus tard avec un délai exponentiel.
+
+Un fichier (adressé par son contenu) peut servir à plusieurs leçons : la table blobref compte
+ses références et il n'entre dans l'outbox que lorsque plus aucune leçon ne pointe vers lui.
+Pendant sa suppression, sa ligne blobref est marquée (refcount = BLOB_DELETING) : un upload
+identique ne peut pas lui ajouter de référence avant la fin de la suppression (BlobDeletionInProgress).
+
+Balayage des orphelins (fichiers du conteneur référencés par aucune leçon) :
+    python -m backend.services.blob_cleanup sweep            # liste seulement
+    python -m backend.services.blob_cleanup sweep --apply    # les ajoute à l'outbox
+    python -m backend.services.blob_cleanup drain            # traite l'outbox maintenant
+"""
+import os
+import asyncio
+import argparse
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, delete, insert, update
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..models import BlobDeletion, BlobRef, Lesson, LessonMetadata, PendingUpload
+from .blob_service import BLOB_BATCH_SIZE, delete_blobs_batch, is_blob_name, list_container_blobs
+from .file_metadata import queue_metadata
+from .invalidation import invalidation_bus
+from .upsert import upsert_counters
+
+# --- CONFIGURATION (secondes) ---
+BLOB_CLEANUP_INTERVAL = float(os.getenv("BLOB_CLEANUP_INTERVAL", "30"))
+BLOB_CLEANUP_BACKOFF_BASE = float(os.getenv("BLOB_CLEANUP_BACKOFF_BASE", "10"))
+BLOB_CLEANUP_BACKOFF_MAX = float(os.getenv("BLOB_CLEANUP_BACKOFF_MAX", "3600"))
+# Les lignes prises par un worker sont réservées le temps de l'appel (évite les doublons entre workers)
+BLOB_CLEANUP_LEASE = float(os.getenv("BLOB_CLEANUP_LEASE", "120"))
+# Un fichier plus récent peut appartenir à un upload dont la leçon n'est pas encore créée
+BLOB_SWEEP_MIN_AGE_HOURS = float(os.getenv("BLOB_SWEEP_MIN_AGE_HOURS", "24"))
+# Upload direct non finalisé : abandonné ce délai après l'expiration de son URL d'écriture
+# (un envoi commencé juste avant l'expiration peut encore se terminer)
+UPLOAD_EXPIRY_GRACE = float(os.getenv("UPLOAD_EXPIRY_GRACE", "3600"))
+
+# refcount d'un fichier dont la suppression est en cours (ligne réservée par le worker de nettoyage)
+BLOB_DELETING = -1
+
+
+class BlobDeletionInProgress(Exception):
+    """Fichier identique en cours de suppression : l'upload est à refaire une fois la suppression terminée"""
+
+    def __init__(self, blob_name: str):
+        super().__init__(f"Un fichier identique ({blob_name}) est en cours de suppression : réessayez dans quelques secondes")
+        self.blob_name = blob_name
+
+
+# --- ÉCRITURE DANS L'OUTBOX (dans la transaction de la route) ---
+async def enqueue_blob_deletions(session: AsyncSession, content_urls: Iterable[Optional[str]]) -> int:
+    """Ajoute les fichiers à supprimer ; le commit est fait par l'appelant"""
+    names = sorted({url for url in content_urls if is_blob_name(url)})
+    if names:
+        await session.exec(insert(BlobDeletion), params=[{"blob_name": name} for name in names])
+    return len(names)
+
+
+async def cancel_blob_deletion(session: AsyncSession, blob_name: str):
+    """
+    Fichier de nouveau utilisé (upload identique) : retiré de l'outbox ; le commit est fait par l'appelant.
+    Lève BlobDeletionInProgress si le worker de nettoyage est déjà en train de le supprimer.
+    """
+    await session.exec(delete(BlobDeletion).where(BlobDeletion.blob_name == blob_name))
+    deleting = (await session.exec(
+        select(BlobRef.blob_name).where(BlobRef.blob_name == blob_name, BlobRef.refcount == BLOB_DELETING)
+    )).first()
+    if deleting:
+        raise BlobDeletionInProgress(blob_name)
+
+
+def backoff_delay(attempts: int) -> float:
+    """Délai avant le prochain essai : base, 2 x base, 4 x base... plafonné"""
+    return min(BLOB_CLEANUP_BACKOFF_BASE * 2 ** max(attempts - 1, 0), BLOB_CLEANUP_BACKOFF_MAX)
+
+
+# --- RÉFÉRENCES DES FICHIERS ---
+async def add_blob_ref(session: AsyncSession, content_url: Optional[str]) -> bool:
+    """
+    Une leçon de plus pointe vers ce fichier ; un nouveau fichier est mis en file pour
+    l'extraction de ses métadonnées (retourne True). Le commit est fait par l'appelant.
+    Upsert : sûr si deux workers ajoutent en même temps la première référence.
+    Lève BlobDeletionInProgress si le fichier est en cours de suppression.
+    """
+    if not is_blob_name(content_url):
+        return False
+    table = BlobRef.__table__
+    row = await upsert_counters(
+        session, table, [{"blob_name": content_url, "refcount": 1, "created_at": datetime.utcnow()}],
+        keys=("blob_name",), counters=("refcount",),
+        only_if=lambda t: t.c.refcount >= 0, returning=("refcount",),
+    )
+    if row is None:
+        raise BlobDeletionInProgress(content_url)
+    if row[0] == 1:
+        await queue_metadata(session, content_url)
+        return True
+    return False
+
+
+async def release_blob_refs(session: AsyncSession, content_urls: Iterable[Optional[str]]) -> int:
+    """
+    Des leçons ne pointent plus vers ces fichiers : compteurs décrémentés (un UPDATE groupé),
+    et les fichiers qui ne sont plus référencés partent dans l'outbox.
+    Retourne le nombre de fichiers à supprimer ; le commit est fait par l'appelant.
+    """
+    released = Counter(url for url in content_urls if is_blob_name(url))
+    if not released:
+        return 0
+    table = BlobRef.__table__
+    await session.exec(
+        update(table)
+        .where(table.c.blob_name == bindparam("name"), table.c.refcount > 0)
+        .values(refcount=table.c.refcount - bindparam("released")),
+        params=[{"name": name, "released": count} for name, count in released.items()],
+    )
+    remaining = dict((await session.exec(
+        select(table.c.blob_name, table.c.refcount).where(table.c.blob_name.in_(list(released)))
+    )).all())
+    # Sans ligne blobref : fichier antérieur au comptage des références, supprimé comme avant
+    unused = sorted(name for name in released if remaining.get(name, 0) <= 0)
+    if unused:
+        # Ligne d'un fichier déjà en cours de suppression : gardée jusqu'à la fin de celle-ci
+        await session.exec(delete(table).where(table.c.blob_name.in_(unused), table.c.refcount >= 0))
+    return await enqueue_blob_deletions(session, unused)
+
+
+async def claim_blobs(session: AsyncSession, names: List[str]) -> set:
+    """
+    Réserve pour la suppression les fichiers sans référence (refcount = BLOB_DELETING, ligne créée
+    au besoin) ; retourne ceux qui sont de nouveau référencés. Le commit est fait par l'appelant.
+    Un add_blob_ref concurrent passe soit avant (le fichier est gardé), soit après (il échoue).
+    """
+    table = BlobRef.__table__
+    now = datetime.utcnow()
+    await upsert_counters(
+        session, table, [{"blob_name": name, "refcount": BLOB_DELETING, "created_at": now} for name in names],
+        keys=("blob_name",),
+    )
+    await session.exec(
+        update(table).where(table.c.blob_name.in_(names), table.c.refcount <= 0)
+        .values(refcount=BLOB_DELETING)
+    )
+    return set((await session.exec(
+        select(table.c.blob_name).where(table.c.blob_name.in_(names), table.c.refcount > 0)
+    )).all())
+
+
+# --- UPLOADS DIRECTS ABANDONNÉS ---
+async def expire_pending_uploads(session: AsyncSession, now: datetime = None, limit: int = BLOB_BATCH_SIZE) -> int:
+    """
+    Uploads directs jamais finalisés : la ligne est supprimée et le fichier (s'il a été envoyé)
+    part dans l'outbox. Retourne le nombre d'uploads expirés ; le commit est fait par l'appelant.
+    """
+    now = now or datetime.utcnow()
+    expired = (await session.exec(
+        select(PendingUpload.id, PendingUpload.blob_name)
+        .where(PendingUpload.expires_at <= now - timedelta(seconds=UPLOAD_EXPIRY_GRACE))
+        .limit(limit)
+    )).all()
+    if not expired:
+        return 0
+    await session.exec(delete(PendingUpload).where(PendingUpload.id.in_([row.id for row in expired])))
+    await enqueue_blob_deletions(session, [row.blob_name for row in expired])
+    return len(expired)
+
+
+# --- TRAITEMENT DE L'OUTBOX ---
+class BlobCleanupWorker:
+    """Tâche de fond du worker : traite l'outbox toutes les BLOB_CLEANUP_INTERVAL secondes, ou dès qu'on la réveille"""
+
+    def __init__(self, interval: float = BLOB_CLEANUP_INTERVAL, batch_size: int = BLOB_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def run_once(self, session_factory, deleter=None, now: datetime = None) -> Tuple[int, int]:
+        """Traite un lot de lignes échues. Retourne (fichiers supprimés, échecs)."""
+        deleter = deleter or delete_blobs_batch
+        now = now or datetime.utcnow()
+
+        async with session_factory() as session:
+            due = (await session.exec(
+                select(BlobDeletion)
+                .where(BlobDeletion.next_attempt_at <= now)
+                .order_by(BlobDeletion.next_attempt_at, BlobDeletion.id)
+                .limit(self.batch_size)
+            )).all()
+            if not due:
+                return 0, 0
+            # Fichiers réservés pour la suppression (refcount = BLOB_DELETING) : plus aucune référence
+            # ne peut leur être ajoutée. Un fichier de nouveau référencé (upload identique) reste, la ligne part.
+            reused = await claim_blobs(session, sorted({row.blob_name for row in due}))
+            if reused:
+                await session.exec(delete(BlobDeletion).where(BlobDeletion.id.in_([row.id for row in due if row.blob_name in reused])))
+                due = [row for row in due if row.blob_name not in reused]
+            if due:
+                await session.exec(
+                    update(BlobDeletion)
+                    .where(BlobDeletion.id.in_([row.id for row in due]))
+                    .values(next_attempt_at=now + timedelta(seconds=BLOB_CLEANUP_LEASE))
+                )
+            await session.commit()
+            if not due:
+                return 0, 0
+
+        # Appel Azure hors transaction
+        names = sorted({row.blob_name for row in due})
+        try:
+            failures = await deleter(names)
+        except Exception as e:
+            failures = {name: str(e) for name in names}
+
+        names_done = sorted(name for name in names if name not in failures)
+        done = [row.id for row in due if row.blob_name not in failures]
+        retries = [
+            {
+                "row_id": row.id,
+                "new_attempts": row.attempts + 1,
+                "retry_at": now + timedelta(seconds=backoff_delay(row.attempts + 1)),
+                "error": failures[row.blob_name][:1000],
+            }
+            for row in due if row.blob_name in failures
+        ]
+        async with session_factory() as session:
+            # Fin de la réservation : supprimé ou non, le fichier peut de nouveau être référencé
+            # (après un échec, un upload identique le garde ; sinon la ligne de l'outbox est retentée)
+            await session.exec(delete(BlobRef).where(BlobRef.blob_name.in_(names), BlobRef.refcount == BLOB_DELETING))
+            if done:
+                await session.exec(delete(BlobDeletion).where(BlobDeletion.id.in_(done)))
+                # Les métadonnées partent avec le fichier
+                await session.exec(delete(LessonMetadata).where(LessonMetadata.blob_name.in_(names_done)))
+            if retries:
+                table = BlobDeletion.__table__
+                await session.exec(
+                    update(table)
+                    .where(table.c.id == bindparam("row_id"))
+                    .values(attempts=bindparam("new_attempts"), next_attempt_at=bindparam("retry_at"), last_error=bindparam("error")),
+                    params=retries,
+                )
+            await session.commit()
+        if done:
+            # Propriétés du fichier gardées en cache par les workers (taille, ETag) : à relire s'il revient
+            invalidation_bus.publish("blob", *names_done)
+
+        if retries:
+            print(f"Suppression de {len(failures)} fichier(s) en échec, nouvel essai plus tard : {next(iter(failures.values()))}")
+        return len(done), len(retries)
+
+    async def drain(self, session_factory, deleter=None) -> int:
+        """Traite toutes les lignes échues (lot après lot), après avoir ajouté les uploads directs abandonnés"""
+        async with session_factory() as session:
+            if await expire_pending_uploads(session):
+                await session.commit()
+        total = 0
+        while True:
+            deleted, failed = await self.run_once(session_factory, deleter)
+            total += deleted
+            if deleted + failed < self.batch_size:
+                return total
+
+    # --- TÂCHE DE FOND ---
+    def wake(self):
+        """À appeler après le commit d'une route qui a rempli l'outbox"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self, session_factory):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(session_factory))
+
+    async def _run(self, session_factory):
+        while True:
+            try:
+                await self.drain(session_factory)
+            except Exception as e:
+                print(f"Traitement de l'outbox des fichiers en échec : {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def stop(self):
+        # Rien à vider : ce qui reste dans l'outbox sera traité par le prochain worker
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._wakeup = None
+
+
+blob_cleanup = BlobCleanupWorker()
+
+
+# --- BALAYAGE DES ORPHELINS ---
+def find_orphans(listing: Iterable[Tuple[str, datetime]], referenced: set, pending: set,
+                 min_age: timedelta, now: datetime = None) -> List[str]:
+    """Fichiers du conteneur ni référencés par une leçon, ni déjà dans l'outbox, et assez anciens"""
+    now = now or datetime.now(timezone.utc)
+    return sorted(
+        name for name, modified in listing
+        if name not in referenced and name not in pending and (modified is None or now - modified >= min_age)
+    )
+
+
+def sweep_orphans(engine=None, apply: bool = False, min_age_hours: float = BLOB_SWEEP_MIN_AGE_HOURS) -> List[str]:
+    """Compare le contenu du conteneur aux Lesson.content_url ; avec apply, ajoute les orphelins à l'outbox"""
+    from ..database import get_engine
+
+    with Session(engine or get_engine()) as session:
+        referenced = set(session.exec(select(Lesson.content_url).where(Lesson.content_url.is_not(None))).all())
+        pending = set(session.exec(select(BlobDeletion.blob_name)).all())
+        orphans = find_orphans(list_container_blobs(), referenced, pending, timedelta(hours=min_age_hours))
+        if apply and orphans:
+            session.exec(insert(BlobDeletion), params=[{"blob_name": name} for name in orphans])
+            session.commit()
+    return orphans
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nettoyage des fichiers du Blob Storage")
+    commands = parser.add_subparsers(dest="command", required=True)
+    sweep = commands.add_parser("sweep", help="Cherche les fichiers orphelins")
+    sweep.add_argument("--apply", action="store_true", help="Ajoute les orphelins à l'outbox")
+    sweep.add_argument("--min-age-hours", type=float, default=BLOB_SWEEP_MIN_AGE_HOURS)
+    commands.add_parser("drain", help="Traite l'outbox maintenant")
+    args = parser.parse_args()
+
+    if args.command == "sweep":
+        orphans = sweep_orphans(apply=args.apply, min_age_hours=args.min_age_hours)
+        for name in orphans:
+            print(name)
+        action = "ajoutés à l'outbox" if args.apply else "trouvés (relancer avec --apply pour les supprimer)"
+        print(f"{len(orphans)} fichier(s) orphelin(s) {action}")
+        return
+
+    from ..database import get_async_session_maker, dispose_async_engine
+    from .blob_service import get_storage_backend
+
+    async def drain():
+        try:
+            return await BlobCleanupWorker().drain(get_async_session_maker())
+        finally:
+            await get_storage_backend().aclose()
+            await dispose_async_engine()
+
+    print(f"{asyncio.run(drain())} fichier(s) supprimé(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,62 +1,689 @@
 import os
+import re
+import abc
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timedelta, timezone
-from azure.storage.blob import BlobServiceClient, generate_blob_sas, BlobSasPermissions, ContentSettings
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import aiohttp
+import requests
+from azure.core.exceptions import ResourceNotFoundError
+from azure.core.pipeline.transport import RequestsTransport, AioHttpTransport
+from azure.storage.blob import BlobServiceClient, BlobBlock, generate_blob_sas, BlobSasPermissions, ContentSettings
+from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
+
+from .cache import LRUCache
+from .metrics import blob_dedup_bytes_saved, blob_dedup_uploads, timed_blob
+
+# --- BACKEND DE STOCKAGE ---
+# azure : Azure Blob Storage (défaut) ; filesystem : disque local (voir services/local_storage.py)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "azure")
 
 CONNECTION_STRING = os.getenv("STORAGE_ACCOUNT_CONNECTION_STRING")
 
 CONTAINER_NAME = os.getenv("content_container_name", "content")
 ACCOUNT_NAME = os.getenv("storage_account_name")
-ACCOUNT_KEY = os.getenv("STORAGE_ACCOUNT_KEY") 
+ACCOUNT_KEY = os.getenv("STORAGE_ACCOUNT_KEY")
 
-def get_blob_client(filename: str):
+# --- RÉGLAGES DU CLIENT (timeouts en secondes) ---
+STORAGE_CONNECTION_TIMEOUT = int(os.getenv("STORAGE_CONNECTION_TIMEOUT", "10"))
+STORAGE_READ_TIMEOUT = int(os.getenv("STORAGE_READ_TIMEOUT", "120"))
+STORAGE_RETRY_TOTAL = int(os.getenv("STORAGE_RETRY_TOTAL", "3"))
+STORAGE_POOL_SIZE = int(os.getenv("STORAGE_POOL_SIZE", "20"))
+
+# --- UPLOAD EN STREAMING ---
+# Mémoire max par upload ≈ STORAGE_BLOCK_SIZE * (STORAGE_UPLOAD_CONCURRENCY + 1)
+STORAGE_BLOCK_SIZE = int(os.getenv("STORAGE_BLOCK_SIZE", str(4 * 1024 * 1024)))
+STORAGE_UPLOAD_CONCURRENCY = int(os.getenv("STORAGE_UPLOAD_CONCURRENCY", "4"))
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(2 * 1024 * 1024 * 1024)))
+
+# --- URL SAS (lecture) ---
+# Les URL sont calculées par tranche de temps : toutes les requêtes d'une même tranche
+# reçoivent exactement la même URL (cache navigateur/CDN). Une nouvelle URL est émise à
+# chaque tranche, donc bien avant l'expiration (il reste au moins VALIDITY - BUCKET).
+SAS_VALIDITY_SECONDS = int(os.getenv("SAS_VALIDITY_SECONDS", "3600"))
+SAS_BUCKET_SECONDS = int(os.getenv("SAS_BUCKET_SECONDS", "900"))
+SAS_CACHE_SIZE = int(os.getenv("SAS_CACHE_SIZE", "10000"))
+
+# --- UPLOAD DIRECT (navigateur -> stockage, sans passer par l'API) ---
+# Durée de validité des URL d'écriture remises par POST /api/uploads/initiate
+UPLOAD_URL_VALIDITY_SECONDS = int(os.getenv("UPLOAD_URL_VALIDITY_SECONDS", "900"))
+
+# Limite de l'API Blob Batch : 256 sous-requêtes par appel
+BLOB_BATCH_SIZE = 256
+
+if SAS_BUCKET_SECONDS >= SAS_VALIDITY_SECONDS:
+    raise ValueError("SAS_BUCKET_SECONDS doit être inférieur à SAS_VALIDITY_SECONDS")
+
+sas_cache = LRUCache(maxsize=SAS_CACHE_SIZE)
+
+
+class UploadTooLargeError(Exception):
+    """Le fichier dépasse MAX_UPLOAD_SIZE"""
+    def __init__(self, max_size: int):
+        super().__init__(f"Fichier trop volumineux (max {max_size} octets)")
+        self.max_size = max_size
+
+
+def get_connection_string():
     # Construit la connection string si elle n'est pas fournie directement
     conn_str = CONNECTION_STRING
     if not conn_str and ACCOUNT_NAME and ACCOUNT_KEY:
          conn_str = f"DefaultEndpointsProtocol=https;AccountName={ACCOUNT_NAME};AccountKey={ACCOUNT_KEY};EndpointSuffix=core.windows.net"
-    
+
     if not conn_str:
         raise Exception("Azure Storage Connection String not found")
+    return conn_str
 
-    blob_service_client = BlobServiceClient.from_connection_string(conn_str)
-    return blob_service_client.get_blob_client(container=CONTAINER_NAME, blob=filename)
 
-def upload_file_to_blob(file_obj, filename: str, content_type: str = None):
-    blob_client = get_blob_client(filename)
-    
+# --- GESTIONNAIRE DE CLIENTS (un par worker) ---
+class StorageClientManager:
+    """
+    Garde un client Blob vivant pour toute la durée du worker.
+    La session HTTP (et donc les connexions TLS) est réutilisée d'un appel à l'autre,
+    au lieu d'un nouveau BlobServiceClient à chaque upload/suppression.
+    """
+
+    def __init__(
+        self,
+        connection_string: str = None,
+        container_name: str = None,
+        connection_timeout: int = None,
+        read_timeout: int = None,
+        retry_total: int = None,
+        pool_size: int = None,
+    ):
+        self.connection_string = connection_string
+        self.container_name = container_name or CONTAINER_NAME
+        self.connection_timeout = connection_timeout or STORAGE_CONNECTION_TIMEOUT
+        self.read_timeout = read_timeout or STORAGE_READ_TIMEOUT
+        self.retry_total = STORAGE_RETRY_TOTAL if retry_total is None else retry_total
+        self.pool_size = pool_size or STORAGE_POOL_SIZE
+
+        self._lock = threading.Lock()
+        self._session = None
+        self._container = None
+        # Le client asynchrone est lié à la boucle d'événements qui l'a créé
+        self._async_loop = None
+        self._async_service = None
+        self._async_container = None
+
+    def _client_options(self):
+        return {
+            "connection_timeout": self.connection_timeout,
+            "read_timeout": self.read_timeout,
+            "retry_total": self.retry_total,
+        }
+
+    # --- CLIENT SYNCHRONE ---
+    @property
+    def container(self):
+        if self._container is None:
+            with self._lock:
+                if self._container is None:
+                    conn_str = self.connection_string or get_connection_string()
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    transport = RequestsTransport(session=session, session_owner=False, **self._client_options())
+                    service = BlobServiceClient.from_connection_string(
+                        conn_str, transport=transport, **self._client_options()
+                    )
+                    self._session = session
+                    self._container = service.get_container_client(self.container_name)
+        return self._container
+
+    def get_blob_client(self, filename: str):
+        return self.container.get_blob_client(filename)
+
+    # --- CLIENT ASYNCHRONE (asyncio / aiohttp) ---
+    async def get_async_container(self):
+        loop = asyncio.get_running_loop()
+        if self._async_container is None or self._async_loop is not loop:
+            # Nouvelle boucle (ex: TestClient) : l'ancienne session ne peut plus servir
+            conn_str = self.connection_string or get_connection_string()
+            session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.pool_size))
+            transport = AioHttpTransport(session=session, session_owner=True, **self._client_options())
+            self._async_service = AsyncBlobServiceClient.from_connection_string(
+                conn_str, transport=transport, **self._client_options()
+            )
+            self._async_container = self._async_service.get_container_client(self.container_name)
+            self._async_loop = loop
+        return self._async_container
+
+    async def get_async_blob_client(self, filename: str):
+        container = await self.get_async_container()
+        return container.get_blob_client(filename)
+
+    # --- FERMETURE ---
+    def close(self):
+        if self._container is not None:
+            self._container.close()
+            self._container = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    async def aclose(self):
+        if self._async_service is not None and self._async_loop is asyncio.get_running_loop():
+            await self._async_service.close()
+        self._async_service = None
+        self._async_container = None
+        self._async_loop = None
+        self.close()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_storage_manager() -> StorageClientManager:
+    """Retourne le gestionnaire partagé du worker (créé au premier appel)"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = StorageClientManager()
+    return _manager
+
+def set_storage_manager(manager: StorageClientManager = None):
+    """Remplace le gestionnaire courant (tests, changement de configuration)"""
+    global _manager
+    previous = _manager
+    _manager = manager
+    if previous is not None and previous is not manager:
+        previous.close()
+
+def get_blob_client(filename: str):
+    return get_storage_manager().get_blob_client(filename)
+
+def _content_settings(content_type: str = None):
     # Configuration des métadonnées du fichier
-    my_content_settings = None
     if content_type:
-        my_content_settings = ContentSettings(content_type=content_type)
+        return ContentSettings(content_type=content_type)
+    return None
+
+def _block_id(index: int) -> str:
+    # Tous les identifiants de bloc d'un blob doivent avoir la même longueur
+    return f"{index:08d}"
+
+
+async def _read_async(stream, size: int) -> bytes:
+    # UploadFile expose un read() async, un fichier classique un read() sync
+    data = stream.read(size)
+    if asyncio.iscoroutine(data):
+        data = await data
+    return data
+
+
+class BlobInfo(NamedTuple):
+    size: int
+    content_type: Optional[str]
+    etag: str
+
+
+# --- INTERFACE DES BACKENDS ---
+class StorageBackend(abc.ABC):
+    """
+    Opérations de stockage utilisées par l'application. Les routes et services passent par les
+    fonctions de ce module (upload_file_to_blob, delete_file_from_blob, generate_sas_url...),
+    qui délèguent au backend choisi par STORAGE_BACKEND.
+    """
+
+    @abc.abstractmethod
+    def upload_bytes(self, data: bytes, filename: str, content_type: str = None):
+        ...
+
+    @abc.abstractmethod
+    async def upload_bytes_async(self, data: bytes, filename: str, content_type: str = None):
+        ...
+
+    @abc.abstractmethod
+    def upload_stream(self, stream, filename: str, content_type: str, block_size: int, max_concurrency: int, max_size: int) -> int:
+        """Envoie un flux lu bloc par bloc (mémoire bornée) ; retourne le nombre d'octets"""
+
+    @abc.abstractmethod
+    async def upload_stream_async(self, stream, filename: str, content_type: str, block_size: int, max_concurrency: int, max_size: int) -> int:
+        ...
+
+    @abc.abstractmethod
+    def delete(self, filename: str):
+        """Lève une exception si le fichier n'a pas pu être supprimé (absent compris)"""
 
-    blob_client.upload_blob(
-        file_obj, 
-        overwrite=True, 
-        content_settings=my_content_settings # On applique le type ici
+    @abc.abstractmethod
+    async def delete_async(self, filename: str):
+        ...
+
+    @abc.abstractmethod
+    async def delete_many_async(self, filenames: List[str]) -> Dict[str, str]:
+        """Un fichier déjà absent compte comme supprimé. Retourne {nom: erreur} des échecs."""
+
+    @abc.abstractmethod
+    async def get_info_async(self, filename: str) -> Optional[BlobInfo]:
+        ...
+
+    @abc.abstractmethod
+    async def read_range_async(self, filename: str, offset: int, length: int) -> bytes:
+        ...
+
+    @abc.abstractmethod
+    def list_files(self) -> Iterator[Tuple[str, datetime]]:
+        ...
+
+    @abc.abstractmethod
+    def signed_url(self, filename: str, expiry: datetime) -> Optional[str]:
+        """URL de lecture valable jusqu'à expiry (None si la signature n'est pas configurée)"""
+
+    @abc.abstractmethod
+    def signed_upload_url(self, filename: str, expiry: datetime, max_size: int, content_type: str) -> Optional[dict]:
+        """
+        URL d'écriture seule pour un nouveau fichier, valable jusqu'à expiry :
+        {"method", "url", "headers"} à utiliser tel quel par le client (None si la signature n'est pas configurée).
+        """
+
+    @abc.abstractmethod
+    async def start(self):
+        """Démarrage du worker (lifespan)"""
+
+    @abc.abstractmethod
+    async def aclose(self):
+        """Arrêt du worker (lifespan)"""
+
+
+# --- AZURE BLOB STORAGE ---
+class AzureBlobStorage(StorageBackend):
+    """Comportement historique : conteneur Azure, clients partagés par worker (StorageClientManager)"""
+
+    def upload_bytes(self, data, filename, content_type=None):
+        get_blob_client(filename).upload_blob(
+            data,
+            overwrite=True,
+            content_settings=_content_settings(content_type) # On applique le type ici
+        )
+
+    async def upload_bytes_async(self, data, filename, content_type=None):
+        blob_client = await get_storage_manager().get_async_blob_client(filename)
+        await blob_client.upload_blob(data, overwrite=True, content_settings=_content_settings(content_type))
+
+    def upload_stream(self, stream, filename, content_type, block_size, max_concurrency, max_size):
+        """
+        Upload en streaming : chaque bloc lu est envoyé (Put Block) pendant que le suivant est lu,
+        avec au plus max_concurrency blocs en vol, puis la liste de blocs est validée.
+        """
+        blob_client = get_blob_client(filename)
+
+        first = stream.read(block_size)
+        second = stream.read(block_size) if len(first) == block_size else b""
+        if not second:
+            # Petit fichier : un seul Put Blob suffit
+            if len(first) > max_size:
+                raise UploadTooLargeError(max_size)
+            blob_client.upload_blob(first, overwrite=True, content_settings=_content_settings(content_type))
+            return len(first)
+
+        block_ids = []
+        total = 0
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            pending = set()
+            chunk = first
+            try:
+                while chunk:
+                    total += len(chunk)
+                    if total > max_size:
+                        raise UploadTooLargeError(max_size)
+                    # On attend qu'un bloc se libère avant d'en lire un nouveau (mémoire bornée)
+                    if len(pending) >= max_concurrency:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+                    block_id = _block_id(len(block_ids))
+                    block_ids.append(block_id)
+                    pending.add(executor.submit(blob_client.stage_block, block_id, chunk, length=len(chunk)))
+                    if second is not None:
+                        chunk, second = second, None
+                    else:
+                        chunk = stream.read(block_size)
+                for future in pending:
+                    future.result()
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+
+        blob_client.commit_block_list(
+            [BlobBlock(block_id=block_id) for block_id in block_ids],
+            content_settings=_content_settings(content_type),
+        )
+        return total
+
+    async def upload_stream_async(self, stream, filename, content_type, block_size, max_concurrency, max_size):
+        blob_client = await get_storage_manager().get_async_blob_client(filename)
+
+        first = await _read_async(stream, block_size)
+        second = await _read_async(stream, block_size) if len(first) == block_size else b""
+        if not second:
+            if len(first) > max_size:
+                raise UploadTooLargeError(max_size)
+            await blob_client.upload_blob(first, overwrite=True, content_settings=_content_settings(content_type))
+            return len(first)
+
+        block_ids = []
+        total = 0
+        pending = set()
+        chunk = first
+        try:
+            while chunk:
+                total += len(chunk)
+                if total > max_size:
+                    raise UploadTooLargeError(max_size)
+                if len(pending) >= max_concurrency:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
+                block_id = _block_id(len(block_ids))
+                block_ids.append(block_id)
+                pending.add(asyncio.ensure_future(blob_client.stage_block(block_id, chunk, length=len(chunk))))
+                if second is not None:
+                    chunk, second = second, None
+                else:
+                    chunk = await _read_async(stream, block_size)
+            if pending:
+                await asyncio.gather(*pending)
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            raise
+
+        await blob_client.commit_block_list(
+            [BlobBlock(block_id=block_id) for block_id in block_ids],
+            content_settings=_content_settings(content_type),
+        )
+        return total
+
+    def delete(self, filename):
+        get_blob_client(filename).delete_blob()
+
+    async def delete_async(self, filename):
+        blob_client = await get_storage_manager().get_async_blob_client(filename)
+        await blob_client.delete_blob()
+
+    async def delete_many_async(self, filenames):
+        # API Blob Batch : un aller-retour par lot de 256
+        container = await get_storage_manager().get_async_container()
+        failures = {}
+        for start in range(0, len(filenames), BLOB_BATCH_SIZE):
+            chunk = filenames[start:start + BLOB_BATCH_SIZE]
+            try:
+                responses = await container.delete_blobs(*chunk, raise_on_any_failure=False)
+                statuses = [response.status_code async for response in responses]
+            except Exception as e:
+                failures.update({name: str(e) for name in chunk})
+                continue
+            for name, status in zip(chunk, statuses):
+                if status not in (202, 404):
+                    failures[name] = f"HTTP {status}"
+        return failures
+
+    async def get_info_async(self, filename):
+        blob_client = await get_storage_manager().get_async_blob_client(filename)
+        try:
+            properties = await blob_client.get_blob_properties()
+        except ResourceNotFoundError:
+            return None
+        return BlobInfo(properties.size, properties.content_settings.content_type, properties.etag)
+
+    async def read_range_async(self, filename, offset, length):
+        # Une seule requête GET avec en-tête Range
+        blob_client = await get_storage_manager().get_async_blob_client(filename)
+        downloader = await blob_client.download_blob(offset=offset, length=length, max_concurrency=1)
+        return await downloader.readall()
+
+    def list_files(self):
+        for blob in get_storage_manager().container.list_blobs():
+            yield blob.name, blob.last_modified
+
+    def signed_url(self, filename, expiry):
+        if not ACCOUNT_NAME or not ACCOUNT_KEY:
+            return None
+        sas_token = generate_blob_sas(
+            account_name=ACCOUNT_NAME,
+            account_key=ACCOUNT_KEY,
+            container_name=CONTAINER_NAME,
+            blob_name=filename,
+            permission=BlobSasPermissions(read=True),
+            expiry=expiry
+        )
+        return f"https://{ACCOUNT_NAME}.blob.core.windows.net/{CONTAINER_NAME}/{filename}?{sas_token}"
+
+    def signed_upload_url(self, filename, expiry, max_size, content_type):
+        # Création seule (pas d'écrasement d'un fichier existant). Une SAS ne peut limiter ni la taille
+        # ni le type : ils sont vérifiés à la finalisation (POST /api/uploads/complete).
+        if not ACCOUNT_NAME or not ACCOUNT_KEY:
+            return None
+        sas_token = generate_blob_sas(
+            account_name=ACCOUNT_NAME,
+            account_key=ACCOUNT_KEY,
+            container_name=CONTAINER_NAME,
+            blob_name=filename,
+            permission=BlobSasPermissions(create=True),
+            expiry=expiry
+        )
+        return {
+            "method": "PUT",
+            "url": f"https://{ACCOUNT_NAME}.blob.core.windows.net/{CONTAINER_NAME}/{filename}?{sas_token}",
+            "headers": {"x-ms-blob-type": "BlockBlob", "x-ms-blob-content-type": content_type, "Content-Type": content_type},
+        }
+
+    async def start(self):
+        # Clients Blob créés à la première utilisation (StorageClientManager)
+        pass
+
+    async def aclose(self):
+        # Fermeture du pool de connexions Blob du worker
+        await get_storage_manager().aclose()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_storage_backend() -> StorageBackend:
+    """Backend du worker, choisi par STORAGE_BACKEND (créé au premier appel)"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if STORAGE_BACKEND == "azure":
+                    _backend = AzureBlobStorage()
+                elif STORAGE_BACKEND == "filesystem":
+                    from .local_storage import FilesystemStorage
+                    _backend = FilesystemStorage()
+                else:
+                    raise ValueError(f"STORAGE_BACKEND inconnu : {STORAGE_BACKEND} (azure ou filesystem)")
+    return _backend
+
+def set_storage_backend(backend: StorageBackend = None):
+    """Remplace le backend courant (tests, bancs de mesure) ; None revient à STORAGE_BACKEND"""
+    global _backend
+    _backend = backend
+
+
+# --- OPÉRATIONS (déléguées au backend) ---
+@timed_blob("upload")
+def upload_file_to_blob(file_obj, filename: str, content_type: str = None):
+    """
+    Envoie un fichier sur le Blob Storage.
+    file_obj peut être des bytes ou un objet fichier : dans ce cas il est lu bloc par bloc (streaming).
+    """
+    if isinstance(file_obj, (bytes, bytearray)):
+        get_storage_backend().upload_bytes(file_obj, filename, content_type)
+        return filename
+
+    upload_stream_to_blob(file_obj, filename, content_type=content_type)
+    return filename
+
+def upload_stream_to_blob(
+    stream,
+    filename: str,
+    content_type: str = None,
+    block_size: int = None,
+    max_concurrency: int = None,
+    max_size: int = None,
+) -> int:
+    """Upload en streaming, mémoire bornée. Retourne le nombre d'octets envoyés."""
+    return get_storage_backend().upload_stream(
+        stream, filename, content_type,
+        block_size or STORAGE_BLOCK_SIZE, max_concurrency or STORAGE_UPLOAD_CONCURRENCY, max_size or MAX_UPLOAD_SIZE,
     )
+
+@timed_blob("upload")
+async def upload_file_to_blob_async(file_obj, filename: str, content_type: str = None):
+    """Version asyncio de upload_file_to_blob, pour les routes async"""
+    if isinstance(file_obj, (bytes, bytearray)):
+        await get_storage_backend().upload_bytes_async(file_obj, filename, content_type)
+        return filename
+
+    await upload_stream_to_blob_async(file_obj, filename, content_type=content_type)
     return filename
 
+async def upload_stream_to_blob_async(
+    stream,
+    filename: str,
+    content_type: str = None,
+    block_size: int = None,
+    max_concurrency: int = None,
+    max_size: int = None,
+) -> int:
+    """Version asyncio de upload_stream_to_blob (accepte un UploadFile)"""
+    return await get_storage_backend().upload_stream_async(
+        stream, filename, content_type,
+        block_size or STORAGE_BLOCK_SIZE, max_concurrency or STORAGE_UPLOAD_CONCURRENCY, max_size or MAX_UPLOAD_SIZE,
+    )
+
+@timed_blob("delete")
 def delete_file_from_blob(filename: str):
-    """Supprime un fichier du conteneur Azure"""
+    """Supprime un fichier du stockage"""
     try:
-        blob_client = get_blob_client(filename)
-        blob_client.delete_blob()
+        get_storage_backend().delete(filename)
         return True
     except Exception as e:
         print(f"Erreur lors de la suppression du blob {filename}: {e}")
         return False
-    
-def generate_sas_url(filename: str):
-    """Génère une URL temporaire (1h) pour lire le fichier privé"""
-    if not ACCOUNT_NAME or not ACCOUNT_KEY:
-        return None
-        
-    sas_token = generate_blob_sas(
-        account_name=ACCOUNT_NAME,
-        account_key=ACCOUNT_KEY,
-        container_name=CONTAINER_NAME,
-        blob_name=filename,
-        permission=BlobSasPermissions(read=True),
-        expiry=datetime.now(timezone.utc) + timedelta(hours=1)
-    )
-    
-    return f"https://{ACCOUNT_NAME}.blob.core.windows.net/{CONTAINER_NAME}/{filename}?{sas_token}"
\ No newline at end of file
+
+@timed_blob("delete")
+async def delete_file_from_blob_async(filename: str):
+    """Version asyncio de delete_file_from_blob"""
+    try:
+        await get_storage_backend().delete_async(filename)
+        return True
+    except Exception as e:
+        print(f"Erreur lors de la suppression du blob {filename}: {e}")
+        return False
+
+@timed_blob("delete_batch")
+async def delete_blobs_batch(filenames: List[str]) -> Dict[str, str]:
+    """
+    Supprime des fichiers par lots (Azure : API Blob Batch, 256 par aller-retour).
+    Un fichier déjà absent compte comme supprimé. Retourne {nom: erreur} des échecs.
+    """
+    return await get_storage_backend().delete_many_async(filenames)
+
+@timed_blob("properties")
+async def get_blob_info_async(filename: str) -> Optional[BlobInfo]:
+    """Taille, type et ETag d'un fichier (None s'il n'existe pas)"""
+    return await get_storage_backend().get_info_async(filename)
+
+@timed_blob("download_range")
+async def download_blob_range_async(filename: str, offset: int, length: int) -> bytes:
+    """Lit `length` octets à partir de `offset`"""
+    return await get_storage_backend().read_range_async(filename, offset, length)
+
+def list_container_blobs() -> Iterator[Tuple[str, datetime]]:
+    """(nom, date de dernière modification) de chaque fichier du conteneur"""
+    return get_storage_backend().list_files()
+
+
+# --- UPLOAD ADRESSÉ PAR CONTENU (déduplication) ---
+def file_extension(filename: str) -> Optional[str]:
+    """Extension en minuscules ("pdf"), ignorée si elle ne ressemble pas à une extension"""
+    extension = filename.rsplit(".", 1)[-1].lower() if filename and "." in filename else ""
+    return extension if re.fullmatch(r"[a-z0-9]{1,10}", extension) else None
+
+def content_blob_name(digest: str, extension: str = None) -> str:
+    return f"{digest}.{extension}" if extension else digest
+
+def _hash_stream(stream, block_size: int, max_size: int) -> Tuple[str, int]:
+    # Lecture bloc par bloc (mémoire bornée) puis retour au début pour l'envoi
+    digest = hashlib.sha256()
+    total = 0
+    while True:
+        chunk = stream.read(block_size)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_size:
+            raise UploadTooLargeError(max_size)
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest(), total
+
+async def upload_deduplicated_async(file_obj, extension: str = None, content_type: str = None) -> str:
+    """
+    Upload adressé par contenu : le fichier est haché (SHA-256) puis stocké sous "<empreinte>.<extension>".
+    Si ce fichier est déjà dans le conteneur, rien n'est envoyé. Retourne le nom du fichier.
+    """
+    if isinstance(file_obj, (bytes, bytearray)):
+        if len(file_obj) > MAX_UPLOAD_SIZE:
+            raise UploadTooLargeError(MAX_UPLOAD_SIZE)
+        digest, size = hashlib.sha256(file_obj).hexdigest(), len(file_obj)
+    else:
+        # UploadFile : starlette a déjà reçu le corps dans un fichier temporaire, haché hors de la boucle
+        raw = getattr(file_obj, "file", file_obj)
+        digest, size = await asyncio.to_thread(_hash_stream, raw, STORAGE_BLOCK_SIZE, MAX_UPLOAD_SIZE)
+
+    filename = content_blob_name(digest, extension)
+    if await get_blob_info_async(filename) is not None:
+        blob_dedup_uploads.labels("duplicate").inc()
+        blob_dedup_bytes_saved.inc(size)
+        return filename
+
+    blob_dedup_uploads.labels("new").inc()
+    await upload_file_to_blob_async(file_obj, filename, content_type=content_type)
+    return filename
+
+
+# --- URL DE LECTURE ---
+def is_blob_name(content_url: str) -> bool:
+    """Un content_url sans schéma http(s) désigne un fichier de notre conteneur"""
+    return bool(content_url) and not str(content_url).lower().startswith(("http://", "https://"))
+
+def sas_bucket(now: datetime = None) -> int:
+    """Numéro de la tranche de temps courante (change quand les URL SAS tournent)"""
+    now = now or datetime.now(timezone.utc)
+    return int(now.timestamp()) // SAS_BUCKET_SECONDS
+
+@timed_blob("sign")
+def generate_sas_url(filename: str, now: datetime = None):
+    """
+    Génère une URL temporaire pour lire le fichier privé (URL SAS Azure, ou URL signée HMAC en local).
+    Identique pour toute la tranche de temps courante (mise en cache par nom de blob).
+    """
+    bucket = sas_bucket(now)
+    cached = sas_cache.get(filename)
+    if cached is not None and cached[0] == bucket:
+        return cached[1]
+
+    expiry = datetime.fromtimestamp(bucket * SAS_BUCKET_SECONDS + SAS_VALIDITY_SECONDS, tz=timezone.utc)
+    url = get_storage_backend().signed_url(filename, expiry)
+    if url is not None:
+        sas_cache.set(filename, (bucket, url))
+    return url
+
+@timed_blob("sign_upload")
+def generate_upload_url(filename: str, max_size: int, content_type: str, now: datetime = None) -> Optional[dict]:
+    """URL d'écriture seule et de courte durée pour un upload direct (jamais mise en cache)"""
+    now = now or datetime.now(timezone.utc)
+    expiry = now + timedelta(seconds=UPLOAD_URL_VALIDITY_SECONDS)
+    return get_storage_backend().signed_upload_url(filename, expiry, max_size, content_type)
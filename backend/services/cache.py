@@ -0,0 +1,87 @@
+import os
+import threading
+from collections import OrderedDict
+
+from .invalidation import invalidation_bus
+
+QUIZ_SNAPSHOT_CACHE_SIZE = int(os.getenv("QUIZ_SNAPSHOT_CACHE_SIZE", "512"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+
+
+class LRUCache:
+    """
+    Petit cache LRU en mémoire, thread-safe (un par worker).
+    Les entrées périmées par une écriture d'un autre worker sont évincées via services/invalidation.py.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Incrémentée à chaque invalidation : voir set(generation=...)
+        self.generation = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, generation: int = None):
+        """
+        generation : valeur de self.generation lue AVANT de charger `value`. Si une invalidation
+        est arrivée pendant le chargement, la valeur est peut-être déjà périmée : elle n'est pas gardée.
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self.generation += 1
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
+# --- CACHES DES QUIZ ---
+# Payload "élève" déjà sérialisé (bytes JSON, donc immuable) par quiz_id
+quiz_snapshots = LRUCache(maxsize=QUIZ_SNAPSHOT_CACHE_SIZE)
+# Clé de correction compilée (voir services/grading.py) par quiz_id
+quiz_answer_keys = LRUCache(maxsize=QUIZ_SNAPSHOT_CACHE_SIZE)
+
+# --- RÉPONSES DÉJÀ SÉRIALISÉES (routes de lecture chaudes, voir services/http_cache.py) ---
+# (route, id) -> (ETag, bytes JSON) : une version plus récente remplace l'entrée, pas d'invalidation à faire
+serialized_responses = LRUCache(maxsize=RESPONSE_CACHE_SIZE)
+
+# --- ABONNEMENTS AU BUS D'INVALIDATION (écritures des autres workers) ---
+invalidation_bus.subscribe("quiz", quiz_snapshots)
+invalidation_bus.subscribe("quiz", quiz_answer_keys)
+# Réponses déjà contrôlées par leur ETag : l'éviction libère seulement la place des entités supprimées
+invalidation_bus.subscribe("course", serialized_responses, keys=lambda course_id: [
+    ("course", course_id), ("bundle", course_id), ("lessons", course_id),
+])
+invalidation_bus.subscribe("lesson", serialized_responses, keys=lambda lesson_id: [("lesson", lesson_id)])
+
+def invalidate_quiz(*quiz_ids: int):
+    """À appeler après le commit dès qu'un quiz (ou ses questions/choix) est modifié ou supprimé, dans tous les workers"""
+    invalidation_bus.publish("quiz", *quiz_ids)
@@ -0,0 +1,260 @@
+"""
+Fichiers des leçons servis par l'API (GET /api/lessons/{id}/content), avec requêtes Range.
+
+Alternative aux URL SAS quand le compte de stockage n'est pas joignable par les navigateurs.
+Un fichier est lu par morceaux de CONTENT_CHUNK_SIZE octets : chaque morceau est téléchargé
+une seule fois puis gardé dans un cache LRU sur disque, borné à CONTENT_CACHE_MAX_BYTES.
+Se déplacer dans une vidéo populaire ne relit donc que les morceaux absents du cache,
+et la réponse part morceau par morceau (jamais le fichier entier en mémoire).
+
+Le dossier peut être partagé par les workers d'une machine : chaque worker n'applique la limite
+qu'aux morceaux qu'il connaît (prévoir CONTENT_CACHE_MAX_BYTES / nombre de workers).
+"""
+import os
+import asyncio
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from .blob_service import BlobInfo, download_blob_range_async, get_blob_info_async
+from .cache import LRUCache
+from .invalidation import invalidation_bus
+from .metrics import content_cache_bytes, content_cache_evictions, content_cache_requests
+
+# --- CONFIGURATION ---
+CONTENT_CHUNK_SIZE = int(os.getenv("CONTENT_CHUNK_SIZE", str(1024 * 1024)))
+CONTENT_CACHE_DIR = os.getenv("CONTENT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "elearning-content-cache"))
+# 0 désactive le cache disque (chaque morceau est relu sur le stockage)
+CONTENT_CACHE_MAX_BYTES = int(os.getenv("CONTENT_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+# Taille / type / ETag des fichiers, en mémoire (évite un HEAD sur le stockage à chaque requête Range)
+CONTENT_INFO_CACHE_SIZE = int(os.getenv("CONTENT_INFO_CACHE_SIZE", "4096"))
+
+
+class RangeNotSatisfiable(Exception):
+    """Plage demandée hors du fichier (réponse 416)"""
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    (début, fin incluse) de l'en-tête Range, ou None pour renvoyer le fichier entier :
+    en-tête absent, illisible ou à plusieurs plages (la RFC 9110 permet de l'ignorer).
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header[len("bytes="):].strip()
+    start, separator, end = spec.partition("-")
+    if "," in spec or not separator:
+        return None
+    try:
+        if not start:
+            # Suffixe : les n derniers octets
+            length = int(end)
+            if length <= 0 or size == 0:
+                raise RangeNotSatisfiable()
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = int(end) if end else None
+    except ValueError:
+        return None
+    if end is not None and start > end:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, size - 1 if end is None else min(end, size - 1)
+
+
+# --- CACHE DISQUE ---
+class ChunkCache:
+    """Cache LRU de morceaux de fichiers sur disque (un fichier par morceau), thread-safe"""
+
+    def __init__(self, directory: str = CONTENT_CACHE_DIR, max_bytes: int = CONTENT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # nom -> taille, du moins au plus récent
+        self._size = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(blob_name: str, etag: str, index: int) -> str:
+        # L'ETag dans la clé : un fichier réécrit sous le même nom ne sert jamais d'anciens morceaux
+        digest = hashlib.sha256(f"{blob_name}\0{etag}".encode()).hexdigest()[:40]
+        return f"{digest}-{index}"
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _ensure_loaded(self):
+        """Premier accès : reprend les morceaux déjà sur disque (redémarrage), par date de dernier accès"""
+        if self._loaded:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._size += size
+        self._loaded = True
+        # Limite abaissée depuis le dernier démarrage
+        self._remove_files(self._evict())
+
+    def _evict(self) -> list:
+        """Retire les morceaux les moins récemment utilisés ; retourne les fichiers à effacer"""
+        removed = []
+        while self._size > self.max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            self._size -= size
+            removed.append(name)
+        content_cache_bytes.set(self._size)
+        return removed
+
+    def _remove_files(self, names):
+        for name in names:
+            content_cache_evictions.inc()
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+
+    def get(self, key: str) -> Optional[bytes]:
+        if self.max_bytes <= 0:
+            return None
+        with self._lock:
+            self._ensure_loaded()
+            known = key in self._entries
+            if known:
+                self._entries.move_to_end(key)
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # ordre LRU conservé après un redémarrage
+        except FileNotFoundError:
+            if known:
+                # Effacé par un autre worker
+                with self._lock:
+                    self._size -= self._entries.pop(key, 0)
+            return None
+        if not known:
+            # Écrit par un autre worker : on le prend en compte dans notre limite
+            self._track(key, len(data))
+        return data
+
+    def _track(self, key: str, size: int):
+        with self._lock:
+            self._size += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            removed = self._evict()
+        self._remove_files(removed)
+
+    def put(self, key: str, data: bytes):
+        if self.max_bytes <= 0 or len(data) > self.max_bytes:
+            return
+        with self._lock:
+            self._ensure_loaded()
+        # Écriture atomique : un lecteur ne voit jamais de morceau incomplet
+        path = self._path(key)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, path)
+        self._track(key, len(data))
+
+    def clear(self):
+        with self._lock:
+            self._ensure_loaded()
+            removed = list(self._entries)
+            self._entries.clear()
+            self._size = 0
+            content_cache_bytes.set(0)
+        for name in removed:
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+
+
+# --- LECTURE PAR MORCEAUX ---
+class ContentProxy:
+    """Lit les fichiers du stockage par morceaux, via le cache disque"""
+
+    def __init__(self, cache: ChunkCache, chunk_size: int = CONTENT_CHUNK_SIZE):
+        self.cache = cache
+        self.chunk_size = chunk_size
+        self.infos = LRUCache(maxsize=CONTENT_INFO_CACHE_SIZE)
+        self._downloads: Dict[str, asyncio.Task] = {}
+
+    async def info(self, blob_name: str) -> Optional[BlobInfo]:
+        """Taille, type et ETag du fichier (None s'il n'existe pas)"""
+        info = self.infos.get(blob_name)
+        if info is None:
+            generation = self.infos.generation
+            info = await get_blob_info_async(blob_name)
+            if info is not None:
+                self.infos.set(blob_name, info, generation=generation)
+        return info
+
+    async def _download(self, key: str, blob_name: str, info: BlobInfo, index: int) -> bytes:
+        offset = index * self.chunk_size
+        data = await download_blob_range_async(blob_name, offset, min(self.chunk_size, info.size - offset))
+        await asyncio.to_thread(self.cache.put, key, data)
+        return data
+
+    def _download_done(self, key: str, task: asyncio.Task):
+        self._downloads.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # évite "exception was never retrieved" si tous les lecteurs sont partis
+
+    async def chunk(self, blob_name: str, info: BlobInfo, index: int) -> bytes:
+        key = self.cache.key(blob_name, info.etag, index)
+        data = await asyncio.to_thread(self.cache.get, key)
+        if data is not None:
+            content_cache_requests.labels("hit").inc()
+            return data
+
+        # Un seul téléchargement par morceau, même si plusieurs lecteurs le demandent en même temps ;
+        # il continue si le lecteur qui l'a lancé se déconnecte
+        task = self._downloads.get(key)
+        if task is None:
+            content_cache_requests.labels("miss").inc()
+            task = asyncio.ensure_future(self._download(key, blob_name, info, index))
+            task.add_done_callback(lambda done: self._download_done(key, done))
+            self._downloads[key] = task
+        else:
+            content_cache_requests.labels("wait").inc()
+        return await asyncio.shield(task)
+
+    async def stream(self, blob_name: str, info: BlobInfo, start: int, end: int) -> AsyncIterator[bytes]:
+        """Octets start..end (inclus) ; le morceau suivant est préparé pendant l'envoi du courant"""
+        if end < start:
+            return
+        first, last = start // self.chunk_size, end // self.chunk_size
+        upcoming = asyncio.ensure_future(self.chunk(blob_name, info, first))
+        try:
+            for index in range(first, last + 1):
+                data = await upcoming
+                upcoming = asyncio.ensure_future(self.chunk(blob_name, info, index + 1)) if index < last else None
+                low = start - index * self.chunk_size if index == first else 0
+                high = end - index * self.chunk_size + 1 if index == last else len(data)
+                yield data[low:high]
+        finally:
+            if upcoming is not None and not upcoming.done():
+                upcoming.cancel()
+
+
+content_cache = ChunkCache()
+content_proxy = ContentProxy(content_cache)
+# Fichier supprimé du stockage (puis peut-être renvoyé sous le même nom) : propriétés à relire
+invalidation_bus.subscribe("blob", content_proxy.infos)
@@ -0,0 +1,223 @@
+"""
+Extraction des métadonnées des fichiers des leçons, en arrière-plan (hors du chemin de la requête).
+
+Un nouveau fichier (première référence, voir blob_cleanup.add_blob_ref) reçoit une ligne
+"pending" dans la table lessonmetadata, dans la transaction de la route. Un worker de fond
+récupère le fichier depuis le stockage dans un fichier temporaire, puis l'analyse dans un
+ProcessPoolExecutor borné (METADATA_WORKERS processus) : type réel, taille, SHA-256,
+pages d'un PDF, durée et dimensions d'une vidéo (voir services/media_probe.py).
+Le résultat est servi par GET /api/lessons/{id} ("metadata").
+
+En cas d'échec la ligne est retentée avec un délai exponentiel, puis passe en "failed".
+"""
+import os
+import asyncio
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import bindparam, literal, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..models import Course, Lesson, LessonMetadata, LessonMetadataBase
+from .blob_service import STORAGE_BLOCK_SIZE, download_blob_range_async, get_blob_info_async
+from .media_probe import HEAD_SIZE, probe_file
+
+# --- CONFIGURATION ---
+METADATA_WORKERS = int(os.getenv("METADATA_WORKERS", "2"))
+METADATA_INTERVAL = float(os.getenv("METADATA_INTERVAL", "30"))
+METADATA_BATCH_SIZE = int(os.getenv("METADATA_BATCH_SIZE", "16"))
+# Au-delà, seul le début du fichier est récupéré (type et en-tête vidéo, sans empreinte ni pages)
+METADATA_MAX_BYTES = int(os.getenv("METADATA_MAX_BYTES", str(1024 * 1024 * 1024)))
+METADATA_MAX_ATTEMPTS = int(os.getenv("METADATA_MAX_ATTEMPTS", "5"))
+METADATA_BACKOFF_BASE = float(os.getenv("METADATA_BACKOFF_BASE", "30"))
+# Les lignes prises par un worker sont réservées le temps de l'extraction (évite les doublons entre workers)
+METADATA_LEASE = float(os.getenv("METADATA_LEASE", "600"))
+
+METADATA_FIELDS = list(LessonMetadataBase.model_fields)
+
+
+# --- MISE EN FILE (dans la transaction de la route) ---
+async def queue_metadata(session: AsyncSession, blob_name: str):
+    """Ligne "pending" pour ce fichier s'il n'en a pas déjà une ; le commit est fait par l'appelant"""
+    table = LessonMetadata.__table__
+    now = datetime.utcnow()
+    await session.exec(table.insert().from_select(
+        ["blob_name", "status", "attempts", "next_attempt_at", "updated_at"],
+        select(literal(blob_name), literal("pending"), literal(0), literal(now), literal(now))
+        .where(~select(table.c.blob_name).where(table.c.blob_name == blob_name).exists()),
+    ))
+
+
+def backoff_delay(attempts: int) -> float:
+    return min(METADATA_BACKOFF_BASE * 2 ** max(attempts - 1, 0), 3600)
+
+
+# --- EXTRACTION ---
+class MetadataExtractor:
+    """Tâche de fond du worker : traite les fichiers en attente toutes les METADATA_INTERVAL secondes, ou dès qu'on la réveille"""
+
+    def __init__(self, interval: float = METADATA_INTERVAL, batch_size: int = METADATA_BATCH_SIZE, workers: int = METADATA_WORKERS):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn : les processus ne copient pas l'état du serveur (boucle asyncio, pool de connexions)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def extract(self, blob_name: str) -> dict:
+        """Télécharge le fichier dans un fichier temporaire et l'analyse dans le pool de processus"""
+        info = await get_blob_info_async(blob_name)
+        if info is None:
+            raise FileNotFoundError(f"Fichier introuvable : {blob_name}")
+        complete = info.size <= METADATA_MAX_BYTES
+        length = info.size if complete else HEAD_SIZE
+
+        fd, path = tempfile.mkstemp(prefix="metadata-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                offset = 0
+                while offset < length:
+                    chunk = await download_blob_range_async(blob_name, offset, min(STORAGE_BLOCK_SIZE, length - offset))
+                    if not chunk:
+                        break
+                    await asyncio.to_thread(f.write, chunk)
+                    offset += len(chunk)
+            result = await asyncio.get_running_loop().run_in_executor(self._executor(), probe_file, path, complete)
+        finally:
+            os.remove(path)
+        result.setdefault("size", info.size)
+        return result
+
+    async def run_once(self, session_factory, now: datetime = None) -> Tuple[int, int]:
+        """Traite un lot de fichiers en attente. Retourne (réussis, échecs)."""
+        now = now or datetime.utcnow()
+
+        async with session_factory() as session:
+            due = (await session.exec(
+                select(LessonMetadata.blob_name, LessonMetadata.attempts)
+                .where(LessonMetadata.status == "pending", LessonMetadata.next_attempt_at <= now)
+                .order_by(LessonMetadata.next_attempt_at)
+                .limit(self.batch_size)
+            )).all()
+            if not due:
+                return 0, 0
+            await session.exec(
+                update(LessonMetadata)
+                .where(LessonMetadata.blob_name.in_([row.blob_name for row in due]))
+                .values(next_attempt_at=now + timedelta(seconds=METADATA_LEASE))
+            )
+            await session.commit()
+
+        # Au plus `workers` fichiers à la fois : disque temporaire et mémoire bornés
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def bounded(name):
+            async with semaphore:
+                return await self.extract(name)
+
+        outcomes = await asyncio.gather(*(bounded(row.blob_name) for row in due), return_exceptions=True)
+
+        done, retries = [], []
+        for row, outcome in zip(due, outcomes):
+            if isinstance(outcome, Exception):
+                attempts = row.attempts + 1
+                retries.append({
+                    "name": row.blob_name,
+                    "new_attempts": attempts,
+                    "new_status": "failed" if attempts >= METADATA_MAX_ATTEMPTS else "pending",
+                    "retry_at": now + timedelta(seconds=backoff_delay(attempts)),
+                    "error": (str(outcome) or type(outcome).__name__)[:1000],
+                })
+            else:
+                done.append({"name": row.blob_name, **{field: outcome.get(field) for field in METADATA_FIELDS}})
+
+        async with session_factory() as session:
+            table = LessonMetadata.__table__
+            if done:
+                await session.exec(
+                    update(table)
+                    .where(table.c.blob_name == bindparam("name"))
+                    .values(status="done", last_error=None, updated_at=now, **{field: bindparam(field) for field in METADATA_FIELDS}),
+                    params=done,
+                )
+                # Les leçons concernées changent de contenu : nouvel ETag pour leurs cours
+                await session.exec(
+                    update(Course)
+                    .where(Course.id.in_(
+                        select(Lesson.course_id).where(Lesson.content_url.in_([item["name"] for item in done]))
+                    ))
+                    .values(version=Course.version + 1)
+                )
+            if retries:
+                await session.exec(
+                    update(table)
+                    .where(table.c.blob_name == bindparam("name"))
+                    .values(
+                        status=bindparam("new_status"), attempts=bindparam("new_attempts"),
+                        next_attempt_at=bindparam("retry_at"), last_error=bindparam("error"), updated_at=now,
+                    ),
+                    params=retries,
+                )
+            await session.commit()
+
+        if retries:
+            print(f"Extraction des métadonnées de {len(retries)} fichier(s) en échec : {retries[0]['error']}")
+        return len(done), len(retries)
+
+    async def drain(self, session_factory) -> int:
+        """Traite tous les fichiers en attente (lot après lot)"""
+        total = 0
+        while True:
+            done, failed = await self.run_once(session_factory)
+            total += done
+            if done + failed < self.batch_size:
+                return total
+
+    # --- TÂCHE DE FOND ---
+    def wake(self):
+        """À appeler après le commit d'une route qui a ajouté un fichier"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self, session_factory):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(session_factory))
+
+    async def _run(self, session_factory):
+        while True:
+            try:
+                await self.drain(session_factory)
+            except Exception as e:
+                print(f"Extraction des métadonnées en échec : {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def stop(self):
+        # Les fichiers en cours d'analyse seront repris par un worker à la fin de leur réservation
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._wakeup = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+metadata_extractor = MetadataExtractor()
@@ -0,0 +1,183 @@
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..models import Quiz, QuizQuestion, QuizChoice
+from .cache import quiz_answer_keys
+
+# Seuil de réussite (50% des points)
+PASS_RATIO = 0.5
+
+
+# --- CLÉ DE CORRECTION COMPILÉE ---
+@dataclass(frozen=True)
+class AnswerKey:
+    """
+    Tout ce qu'il faut pour corriger un quiz sans requête SQL :
+    les points par question, les bons choix et le total.
+    """
+    quiz_id: int
+    title: str
+    total_points: int
+    points: Dict[int, int]                  # question_id -> points
+    correct: FrozenSet[Tuple[int, int]]     # couples (question_id, choice_id) corrects
+    # Version tableaux triés pour la correction vectorisée
+    question_ids: np.ndarray = field(repr=False, compare=False)
+    question_points: np.ndarray = field(repr=False, compare=False)
+    correct_choice_ids: np.ndarray = field(repr=False, compare=False)
+    correct_question_ids: np.ndarray = field(repr=False, compare=False)
+
+
+def answer_key_statement(quiz_id: int):
+    return (
+        select(Quiz.title, QuizQuestion.id, QuizQuestion.points, QuizChoice.id, QuizChoice.is_correct)
+        .outerjoin(QuizQuestion, QuizQuestion.quiz_id == Quiz.id)
+        .outerjoin(QuizChoice, QuizChoice.question_id == QuizQuestion.id)
+        .where(Quiz.id == quiz_id)
+    )
+
+
+def compile_answer_key(session: Session, quiz_id: int) -> Optional[AnswerKey]:
+    """Compile la clé de correction d'un quiz en une seule requête (session synchrone)"""
+    return build_answer_key(quiz_id, session.exec(answer_key_statement(quiz_id)).all())
+
+
+async def compile_answer_key_async(session: AsyncSession, quiz_id: int) -> Optional[AnswerKey]:
+    return build_answer_key(quiz_id, (await session.exec(answer_key_statement(quiz_id))).all())
+
+
+def build_answer_key(quiz_id: int, rows) -> Optional[AnswerKey]:
+    if not rows:
+        return None
+
+    points = {}
+    correct = set()
+    for _, q_id, q_points, c_id, c_correct in rows:
+        if q_id is None:
+            continue
+        points[q_id] = q_points
+        if c_id is not None and c_correct:
+            correct.add((q_id, c_id))
+
+    question_ids = np.array(sorted(points), dtype=np.int64)
+    question_points = np.array([points[q] for q in question_ids.tolist()], dtype=np.int64)
+    correct_sorted = sorted(correct, key=lambda pair: pair[1])
+    return AnswerKey(
+        quiz_id=quiz_id,
+        title=rows[0][0],
+        total_points=sum(points.values()),
+        points=points,
+        correct=frozenset(correct),
+        question_ids=question_ids,
+        question_points=question_points,
+        correct_choice_ids=np.array([c for _, c in correct_sorted], dtype=np.int64),
+        correct_question_ids=np.array([q for q, _ in correct_sorted], dtype=np.int64),
+    )
+
+
+async def get_answer_key(session: AsyncSession, quiz_id: int) -> Optional[AnswerKey]:
+    """Clé de correction depuis le cache du worker (compilée au premier appel)"""
+    key = quiz_answer_keys.get(quiz_id)
+    if key is None:
+        generation = quiz_answer_keys.generation
+        key = await compile_answer_key_async(session, quiz_id)
+        if key is not None:
+            quiz_answer_keys.set(quiz_id, key, generation=generation)
+    return key
+
+
+def is_passed(score: int, total_points: int) -> bool:
+    return (score / total_points) >= PASS_RATIO if total_points > 0 else False
+
+
+# --- CORRECTION D'UNE SOUMISSION ---
+def grade_submission(key: AnswerKey, answers: Iterable[Tuple[int, int]]) -> dict:
+    """answers : couples (question_id, choice_id). Les questions hors quiz sont ignorées."""
+    score = 0
+    details = []
+    for question_id, choice_id in answers:
+        question_points = key.points.get(question_id)
+        if question_points is None:
+            continue # Question n'appartient pas au quiz ou n'existe pas
+
+        is_correct = (question_id, choice_id) in key.correct
+        if is_correct:
+            score += question_points
+        details.append({
+            "question_id": question_id,
+            "is_correct": is_correct
+        })
+
+    return {
+        "quiz_title": key.title,
+        "score": score,
+        "total_points": key.total_points,
+        "passed": is_passed(score, key.total_points),
+        "details": details
+    }
+
+
+# --- CORRECTION VECTORISÉE (import de copies en masse) ---
+def _batch_hits(key: AnswerKey, submissions: List[List[Tuple[int, int]]]):
+    """
+    Réponses de toutes les soumissions à plat : (propriétaire, question_id, question du quiz ?, points, bonne réponse ?)
+    Retourne None s'il n'y a aucune réponse.
+    """
+    n = len(submissions)
+    counts = np.fromiter((len(s) for s in submissions), dtype=np.int64, count=n)
+    if n == 0 or counts.sum() == 0:
+        return None
+
+    flat = np.array([pair for s in submissions for pair in s], dtype=np.int64).reshape(-1, 2)
+    owner = np.repeat(np.arange(n), counts)
+    question_ids, choice_ids = flat[:, 0], flat[:, 1]
+
+    # Points de la question répondue (0 si hors quiz)
+    if key.question_ids.size:
+        q_pos = np.minimum(np.searchsorted(key.question_ids, question_ids), key.question_ids.size - 1)
+        in_quiz = key.question_ids[q_pos] == question_ids
+        answer_points = np.where(in_quiz, key.question_points[q_pos], 0)
+    else:
+        in_quiz = np.zeros(len(flat), dtype=bool)
+        answer_points = np.zeros(len(flat), dtype=np.int64)
+
+    # Le choix est-il un bon choix ET appartient-il à la question ?
+    if key.correct_choice_ids.size:
+        c_pos = np.minimum(np.searchsorted(key.correct_choice_ids, choice_ids), key.correct_choice_ids.size - 1)
+        hit = (key.correct_choice_ids[c_pos] == choice_ids) & (key.correct_question_ids[c_pos] == question_ids)
+    else:
+        hit = np.zeros(len(flat), dtype=bool)
+
+    return owner, question_ids, in_quiz, answer_points, hit
+
+
+def grade_batch(key: AnswerKey, submissions: List[List[Tuple[int, int]]]) -> np.ndarray:
+    """
+    Corrige N soumissions d'un coup avec NumPy.
+    Mêmes règles que grade_submission ; retourne le score de chaque soumission.
+    """
+    n = len(submissions)
+    hits = _batch_hits(key, submissions)
+    if hits is None:
+        return np.zeros(n, dtype=np.int64)
+    owner, _, _, answer_points, hit = hits
+    return np.bincount(owner, weights=answer_points * hit, minlength=n).astype(np.int64)
+
+
+def grade_batch_details(key: AnswerKey, submissions: List[List[Tuple[int, int]]]) -> Tuple[np.ndarray, List[List[Tuple[int, bool]]]]:
+    """Comme grade_batch, avec en plus le détail (question_id, correct) de chaque soumission"""
+    n = len(submissions)
+    hits = _batch_hits(key, submissions)
+    if hits is None:
+        return np.zeros(n, dtype=np.int64), [[] for _ in range(n)]
+    owner, question_ids, in_quiz, answer_points, hit = hits
+    scores = np.bincount(owner, weights=answer_points * hit, minlength=n).astype(np.int64)
+
+    # Les questions hors quiz sont ignorées, comme dans grade_submission
+    details = [[] for _ in range(n)]
+    for sub, question_id, correct in zip(owner[in_quiz].tolist(), question_ids[in_quiz].tolist(), hit[in_quiz].tolist()):
+        details[sub].append((question_id, correct))
+    return scores, details
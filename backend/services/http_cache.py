@@ -0,0 +1,101 @@
+import os
+import hashlib
+from typing import Hashable, Optional
+
+import orjson
+from fastapi import Request, Response
+from pydantic import BaseModel
+from sqlalchemy import update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..models import Course
+from .cache import serialized_responses
+
+# --- CACHE-CONTROL PAR FAMILLE DE ROUTES ---
+# "no-cache" = le client garde la réponse mais revalide à chaque fois (ETag -> 304)
+CACHE_CONTROL = {
+    "courses": os.getenv("CACHE_CONTROL_COURSES", "public, no-cache"),
+    "lessons": os.getenv("CACHE_CONTROL_LESSONS", "private, no-cache"),
+    "quiz": os.getenv("CACHE_CONTROL_QUIZ", "private, no-cache"),
+    # Fichiers des leçons : un nom de fichier ne change jamais de contenu (nom unique à l'upload)
+    "content": os.getenv("CACHE_CONTROL_CONTENT", "private, max-age=3600"),
+}
+
+
+def make_etag(*parts) -> str:
+    """ETag fort et opaque à partir des éléments qui déterminent le contenu"""
+    digest = hashlib.blake2b("|".join(str(p) for p in parts).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def course_etag(kind: str, key, created_at, version: int, *extra) -> str:
+    # created_at distingue un cours recréé avec un id réutilisé (SQLite)
+    return make_etag(kind, key, created_at.isoformat(), version, *extra)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match utilise la comparaison faible : on ignore le préfixe W/
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates
+
+
+def cache_headers(etag: str, family: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL[family]}
+
+
+def not_modified(etag: str, family: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, family))
+
+
+def set_cache_headers(response: Response, etag: str, family: str):
+    response.headers.update(cache_headers(etag, family))
+
+
+# --- SÉRIALISATION JSON (orjson) ---
+def _encode_default(value):
+    # Modèles SQLModel/Pydantic laissés dans un payload construit à la main
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Type non sérialisable en JSON : {type(value).__name__}")
+
+
+def dumps(content) -> bytes:
+    """JSON UTF-8 (dates ISO 8601, Enum par valeur), sans passer par jsonable_encoder"""
+    return orjson.dumps(content, default=_encode_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def json_response(body: bytes, etag: str, family: str) -> Response:
+    return Response(content=body, media_type="application/json", headers=cache_headers(etag, family))
+
+
+def cached_response(key: Hashable, etag: str, family: str) -> Optional[Response]:
+    """
+    Réponse déjà sérialisée pour cet ETag (donc cette version du cours), sans requête
+    ni sérialisation. None si absente ou périmée : la route construit alors le payload.
+    """
+    cached = serialized_responses.get(key)
+    if cached is None or cached[0] != etag:
+        return None
+    return json_response(cached[1], etag, family)
+
+
+def cache_response(key: Hashable, etag: str, content, family: str) -> Response:
+    """Sérialise le payload une fois, le garde pour les requêtes suivantes et le renvoie"""
+    body = dumps(content)
+    serialized_responses.set(key, (etag, body))
+    return json_response(body, etag, family)
+
+
+async def bump_course_version(session: AsyncSession, course_id: Optional[int]):
+    """
+    À appeler dans la transaction de toute écriture sur un cours ou son contenu
+    (leçons, quiz) : les ETag calculés depuis cette version changent au commit.
+    """
+    if course_id is None:
+        return
+    await session.exec(update(Course).where(Course.id == course_id).values(version=Course.version + 1))
@@ -0,0 +1,309 @@
+"""
+Bus d'invalidation des caches en mémoire entre les workers gunicorn.
+
+Chaque worker a ses propres caches (services/cache.py, propriétés des fichiers, URL SAS...).
+Une route qui modifie une entité publie, après le commit, un événement (type, id) :
+le worker l'applique tout de suite à ses caches, et le transport le diffuse aux autres
+workers, qui évincent les mêmes entrées dès que leur boucle d'événements reprend la main.
+
+Transports (CACHE_BUS_BACKEND) :
+- "unix" (défaut) : un socket Unix datagramme par worker dans CACHE_BUS_DIR, dossier préparé
+  par le hook on_starting de gunicorn.conf.py ; publier = envoyer le message à chaque socket
+  du dossier. Ni service externe, ni processus intermédiaire. Sans CACHE_BUS_DIR (uvicorn
+  seul, tests), les caches restent locaux.
+- "redis" : canal pub/sub d'un serveur Redis (ou compatible) à CACHE_BUS_REDIS_URL, pour des
+  workers répartis sur plusieurs machines (paquet redis requis).
+- "none" : caches locaux seulement.
+
+Un cache ne doit pas garder une valeur chargée avant une invalidation reçue pendant le
+chargement : voir LRUCache.generation.
+
+Les messages d'un worker sont numérotés : un worker qui constate un trou dans la numérotation
+(message perdu, socket plein) vide tous ses caches abonnés (resync) au lieu de servir des
+valeurs périmées. Les envois ne bloquent jamais la boucle d'événements.
+"""
+import os
+import time
+import uuid
+import socket
+import asyncio
+from collections import defaultdict
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import orjson
+
+from .metrics import cache_invalidation_delay, cache_invalidation_events
+
+# --- CONFIGURATION ---
+CACHE_BUS_BACKEND = os.getenv("CACHE_BUS_BACKEND", "unix")
+CACHE_BUS_DIR = os.getenv("CACHE_BUS_DIR")
+CACHE_BUS_REDIS_URL = os.getenv("CACHE_BUS_REDIS_URL", "redis://localhost:6379/0")
+CACHE_BUS_CHANNEL = os.getenv("CACHE_BUS_CHANNEL", "elearning:cache-invalidation")
+# Socket d'un autre worker plein (worker bloqué ou en cours d'arrêt) : dernier message renvoyé après ce délai
+CACHE_BUS_RETRY_DELAY = float(os.getenv("CACHE_BUS_RETRY_DELAY", "0.5"))
+
+# Événements par message : un datagramme reste sous MAX_MESSAGE_SIZE (noms de fichiers de 255 caractères au plus)
+EVENTS_PER_MESSAGE = 100
+MAX_MESSAGE_SIZE = 64 * 1024
+
+Event = Tuple[str, Hashable]
+
+
+def encode(origin: str, seq: int, events: List[Event]) -> bytes:
+    return orjson.dumps({"origin": origin, "seq": seq, "sent": time.time(), "events": events})
+
+
+def decode(data: bytes) -> Tuple[str, int, float, List[Event]]:
+    message = orjson.loads(data)
+    return message["origin"], message["seq"], message["sent"], [tuple(event) for event in message["events"]]
+
+
+# --- TRANSPORTS ---
+class UnixSocketTransport:
+    """Un socket datagramme par worker dans `directory` ; un message est envoyé à tous les autres"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path: Optional[str] = None
+        self._receiver: Optional[socket.socket] = None
+        self._sender: Optional[socket.socket] = None
+        # Socket plein -> dernier message non remis (le worker verra le trou de numérotation en le recevant)
+        self._lagging: Dict[str, bytes] = {}
+        self._retry: Optional[asyncio.TimerHandle] = None
+
+    async def start(self, deliver: Callable[[bytes], None], resync: Callable[[], None]):
+        os.makedirs(self.directory, exist_ok=True)
+        # Préfixé par le pid : gunicorn retire le socket d'un worker arrêté (child_exit)
+        self.path = os.path.join(self.directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock")
+        receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        receiver.bind(self.path)
+        receiver.setblocking(False)
+        self._receiver = receiver
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+        asyncio.get_running_loop().add_reader(receiver.fileno(), self._read, deliver)
+
+    def _read(self, deliver):
+        while True:
+            try:
+                data = self._receiver.recv(MAX_MESSAGE_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+            deliver(data)
+
+    def _send_to(self, path: str, message: bytes):
+        """Envoi non bloquant ; socket plein : message gardé pour un nouvel essai"""
+        try:
+            self._sender.sendto(message, path)
+            self._lagging.pop(path, None)
+        except BlockingIOError:
+            self._lagging[path] = message
+        except (ConnectionRefusedError, FileNotFoundError):
+            # Worker arrêté sans avoir retiré son socket
+            self._lagging.pop(path, None)
+            remove_quietly(path)
+        except OSError as e:
+            # Message perdu : le worker le détectera au suivant (trou de numérotation)
+            print(f"Invalidation non transmise à {os.path.basename(path)} : {e}")
+
+    def send(self, message: bytes):
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.name.endswith(".sock") and entry.path != self.path:
+                self._send_to(entry.path, message)
+        self._schedule_retry()
+
+    def _schedule_retry(self):
+        if self._lagging and self._retry is None and self._sender is not None:
+            self._retry = asyncio.get_running_loop().call_later(CACHE_BUS_RETRY_DELAY, self._resend)
+
+    def _resend(self):
+        self._retry = None
+        if self._sender is None:
+            return
+        for path, message in list(self._lagging.items()):
+            self._send_to(path, message)
+        self._schedule_retry()
+
+    async def stop(self):
+        if self._retry is not None:
+            self._retry.cancel()
+            self._retry = None
+        self._lagging.clear()
+        if self._receiver is not None:
+            asyncio.get_running_loop().remove_reader(self._receiver.fileno())
+            self._receiver.close()
+            self._sender.close()
+            remove_quietly(self.path)
+            self._receiver = self._sender = None
+
+
+class RedisTransport:
+    """Canal pub/sub Redis : tous les workers, sur toutes les machines, reçoivent chaque message"""
+
+    def __init__(self, url: str, channel: str):
+        self.url = url
+        self.channel = channel
+        self._client = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self, deliver: Callable[[bytes], None], resync: Callable[[], None]):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("CACHE_BUS_BACKEND=redis : installer le paquet redis (pip install redis)")
+        self._client = redis.from_url(self.url)
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._listen(deliver, resync)), asyncio.create_task(self._publish())]
+
+    async def _listen(self, deliver, resync):
+        first = True
+        while True:
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                if not first:
+                    # Des messages ont pu être perdus pendant la coupure : on repart de caches vides
+                    resync()
+                first = False
+                async for message in pubsub.listen():
+                    deliver(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Bus d'invalidation Redis indisponible : {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def _publish(self):
+        # Une seule tâche d'envoi : l'ordre des invalidations d'un worker est conservé
+        while True:
+            message = await self._queue.get()
+            try:
+                await self._client.publish(self.channel, message)
+            except Exception as e:
+                print(f"Invalidation non publiée sur Redis : {e}")
+
+    def send(self, message: bytes):
+        self._queue.put_nowait(message)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def make_transport():
+    if CACHE_BUS_BACKEND == "redis":
+        return RedisTransport(CACHE_BUS_REDIS_URL, CACHE_BUS_CHANNEL)
+    if CACHE_BUS_BACKEND == "unix" and CACHE_BUS_DIR:
+        return UnixSocketTransport(CACHE_BUS_DIR)
+    return None
+
+
+def remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def remove_worker_sockets(directory: str, pid: int):
+    """Hook child_exit de gunicorn : sockets d'un worker arrêté"""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if name.startswith(f"{pid}-") and name.endswith(".sock"):
+            remove_quietly(os.path.join(directory, name))
+
+
+# --- BUS ---
+class InvalidationBus:
+    """Relie les événements publiés par les routes aux caches qui s'y sont abonnés"""
+
+    def __init__(self):
+        # Identifie les messages de ce worker (Redis les renvoie aussi à l'émetteur)
+        self.origin = uuid.uuid4().hex
+        self._subscriptions: Dict[str, List[Tuple[object, Callable]]] = defaultdict(list)
+        self._transport = None
+        # Numéro du dernier message envoyé, et du dernier reçu de chaque autre worker
+        self._seq = 0
+        self._received: Dict[str, int] = {}
+
+    def subscribe(self, kind: str, cache, keys: Callable[[Hashable], Iterable[Hashable]] = None):
+        """
+        Évince de `cache` (LRUCache) les entrées d'une entité `kind` invalidée.
+        keys : clés du cache pour un id (par défaut, l'id lui-même).
+        """
+        self._subscriptions[kind].append((cache, keys or (lambda key: (key,))))
+
+    def apply(self, events: Iterable[Event]):
+        for kind, key in events:
+            for cache, keys in self._subscriptions.get(kind, ()):
+                for cache_key in keys(key):
+                    cache.invalidate(cache_key)
+
+    def resync(self):
+        """Messages peut-être perdus : tous les caches abonnés sont vidés"""
+        for subscriptions in self._subscriptions.values():
+            for cache, _ in subscriptions:
+                cache.clear()
+
+    def publish(self, kind: str, *keys: Hashable):
+        """À appeler après le commit : évince ici, puis dans les autres workers"""
+        events = [(kind, key) for key in keys]
+        if not events:
+            return
+        self.apply(events)
+        cache_invalidation_events.labels(source="local").inc(len(events))
+        if self._transport is not None:
+            for start in range(0, len(events), EVENTS_PER_MESSAGE):
+                self._seq += 1
+                self._transport.send(encode(self.origin, self._seq, events[start:start + EVENTS_PER_MESSAGE]))
+
+    def _deliver(self, data: bytes):
+        try:
+            origin, seq, sent, events = decode(data)
+        except (orjson.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+            # Message perdu pour de bon : on repart de caches vides
+            print(f"Message d'invalidation illisible : {e}")
+            self.resync()
+            return
+        if origin == self.origin:
+            return
+        # Numérotation à partir de 1 : un premier message d'un worker peut avoir été perdu aussi
+        last = self._received.get(origin, 0)
+        if seq > last + 1:
+            print(f"Invalidations perdues ({seq - last - 1} message(s)) : caches vidés")
+            self.resync()
+        self._received[origin] = max(last, seq)
+        self.apply(events)
+        cache_invalidation_events.labels(source="remote").inc(len(events))
+        cache_invalidation_delay.observe(max(time.time() - sent, 0))
+
+    async def start(self, transport=None):
+        """Au démarrage du worker (lifespan) ; sans transport configuré, les caches restent locaux"""
+        transport = transport or make_transport()
+        if transport is None or self._transport is not None:
+            return
+        await transport.start(self._deliver, self.resync)
+        self._transport = transport
+
+    async def stop(self):
+        if self._transport is not None:
+            await self._transport.stop()
+            self._transport = None
+
+
+invalidation_bus = InvalidationBus()
@@ -0,0 +1,349 @@
+"""
+Stockage sur disque local (STORAGE_BACKEND=filesystem) : installations sans Azure,
+développement hors ligne et bancs de mesure réalistes.
+
+- Écriture atomique : le fichier est écrit dans STORAGE_LOCAL_ROOT/.tmp puis renommé (os.replace),
+  un lecteur ne voit jamais de fichier incomplet.
+- Lecture par URL signée (HMAC-SHA256 du nom et de l'expiration), l'équivalent des URL SAS ;
+  upload direct par URL d'écriture signée (taille max et type compris dans la signature).
+- Ces URL sont servies par un petit serveur aiohttp démarré par chaque worker : web.FileResponse
+  envoie le fichier avec os.sendfile (zéro copie, le contenu ne passe pas par Python) et gère Range.
+  Uvicorn (ASGI) ne sait pas faire de sendfile, d'où ce serveur à part (STORAGE_LOCAL_PORT).
+"""
+import os
+import re
+import hmac
+import socket
+import asyncio
+import hashlib
+import secrets
+import mimetypes
+import tempfile
+from datetime import datetime, timezone
+from typing import Optional
+from urllib.parse import quote, urlencode
+
+from aiohttp import web
+
+from .blob_service import BlobInfo, StorageBackend, UploadTooLargeError, _read_async
+
+# --- CONFIGURATION ---
+STORAGE_LOCAL_ROOT = os.getenv("STORAGE_LOCAL_ROOT", os.path.join("data", "storage"))
+# Secret commun à tous les workers (sinon une URL signée par un worker est refusée par les autres)
+STORAGE_URL_SECRET = os.getenv("STORAGE_URL_SECRET")
+# Serveur de fichiers (0 = pas de serveur, ex: fichiers servis par nginx depuis STORAGE_LOCAL_ROOT)
+STORAGE_LOCAL_HOST = os.getenv("STORAGE_LOCAL_HOST", "0.0.0.0")
+STORAGE_LOCAL_PORT = int(os.getenv("STORAGE_LOCAL_PORT", "8001"))
+# Adresse du serveur de fichiers vue par les navigateurs
+STORAGE_LOCAL_PUBLIC_URL = os.getenv("STORAGE_LOCAL_PUBLIC_URL", f"http://localhost:{STORAGE_LOCAL_PORT}/files")
+# Origine autorisée à lire et envoyer des fichiers depuis le navigateur (frontend)
+STORAGE_LOCAL_CORS_ORIGIN = os.getenv("STORAGE_LOCAL_CORS_ORIGIN", "*")
+# fsync avant le renommage : le fichier survit à une coupure de courant
+STORAGE_LOCAL_FSYNC = os.getenv("STORAGE_LOCAL_FSYNC", "true").lower() in ("1", "true", "yes")
+
+FILES_PREFIX = "/files/"
+TEMP_DIR = ".tmp"
+
+# Segments séparés par "/", commençant par une lettre ou un chiffre : ni "..", ni chemin absolu, ni .tmp
+_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]*(/[A-Za-z0-9][A-Za-z0-9._-]*)*")
+
+
+class _AtomicFile:
+    """Fichier temporaire renommé vers sa destination à la validation"""
+
+    def __init__(self, path: str, temp_dir: str, max_size: int):
+        fd, self.temporary = tempfile.mkstemp(dir=temp_dir)
+        self.file = os.fdopen(fd, "wb")
+        self.path = path
+        self.max_size = max_size
+        self.size = 0
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise UploadTooLargeError(self.max_size)
+        self.file.write(data)
+
+    def commit(self, overwrite: bool = True) -> int:
+        """Publie le fichier ; overwrite=False lève FileExistsError si la destination existe déjà"""
+        self.file.flush()
+        if STORAGE_LOCAL_FSYNC:
+            os.fsync(self.file.fileno())
+        self.file.close()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if overwrite:
+            os.replace(self.temporary, self.path)
+        else:
+            # Lien physique : atomique, et refusé si le fichier existe (pas de course entre deux écrivains)
+            try:
+                os.link(self.temporary, self.path)
+            finally:
+                os.remove(self.temporary)
+        return self.size
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.remove(self.temporary)
+        except FileNotFoundError:
+            pass
+
+
+class FilesystemStorage(StorageBackend):
+    """Fichiers sous `root`, URL signées servies par le serveur de fichiers du worker"""
+
+    def __init__(self, root: str = None, secret: bytes = None, public_url: str = None):
+        self.root = os.path.abspath(root or STORAGE_LOCAL_ROOT)
+        if secret is None:
+            if STORAGE_URL_SECRET:
+                secret = STORAGE_URL_SECRET.encode()
+            else:
+                print("ATTENTION : STORAGE_URL_SECRET absent, secret aléatoire (URL signées valables dans ce worker seulement)")
+                secret = secrets.token_bytes(32)
+        self.secret = secret
+        self.public_url = (public_url or STORAGE_LOCAL_PUBLIC_URL).rstrip("/")
+        self.temp_dir = os.path.join(self.root, TEMP_DIR)
+        os.makedirs(self.temp_dir, exist_ok=True)
+        self._runner: Optional[web.AppRunner] = None
+
+    def path(self, filename: str) -> str:
+        """Chemin sur disque d'un nom de fichier ; ValueError si le nom sort du dossier"""
+        if not filename or not _NAME.fullmatch(filename):
+            raise ValueError(f"Nom de fichier invalide : {filename!r}")
+        return os.path.join(self.root, *filename.split("/"))
+
+    # --- ÉCRITURE ---
+    def _open(self, filename: str, max_size: int) -> _AtomicFile:
+        return _AtomicFile(self.path(filename), self.temp_dir, max_size)
+
+    def upload_bytes(self, data, filename, content_type=None):
+        # Le type est déduit de l'extension à la lecture (mimetypes), comme le fait le serveur de fichiers
+        target = self._open(filename, len(data))
+        try:
+            target.write(data)
+        except BaseException:
+            target.abort()
+            raise
+        target.commit()
+
+    async def upload_bytes_async(self, data, filename, content_type=None):
+        await asyncio.to_thread(self.upload_bytes, data, filename, content_type)
+
+    def upload_stream(self, stream, filename, content_type, block_size, max_concurrency, max_size):
+        target = self._open(filename, max_size)
+        try:
+            while chunk := stream.read(block_size):
+                target.write(chunk)
+        except BaseException:
+            target.abort()
+            raise
+        return target.commit()
+
+    async def upload_stream_async(self, stream, filename, content_type, block_size, max_concurrency, max_size):
+        raw = getattr(stream, "file", None)
+        if raw is not None:
+            # UploadFile : le corps est déjà dans un fichier temporaire, copié entièrement hors de la boucle
+            return await asyncio.to_thread(self.upload_stream, raw, filename, content_type, block_size, max_concurrency, max_size)
+        target = await asyncio.to_thread(self._open, filename, max_size)
+        try:
+            while chunk := await _read_async(stream, block_size):
+                await asyncio.to_thread(target.write, chunk)
+        except BaseException:
+            target.abort()
+            raise
+        return await asyncio.to_thread(target.commit)
+
+    # --- SUPPRESSION ---
+    def delete(self, filename):
+        os.remove(self.path(filename))
+
+    async def delete_async(self, filename):
+        await asyncio.to_thread(self.delete, filename)
+
+    def _delete_many(self, filenames):
+        failures = {}
+        for name in filenames:
+            try:
+                self.delete(name)
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                failures[name] = str(e)
+        return failures
+
+    async def delete_many_async(self, filenames):
+        return await asyncio.to_thread(self._delete_many, filenames)
+
+    # --- LECTURE ---
+    def _info(self, filename: str) -> Optional[BlobInfo]:
+        try:
+            stat = os.stat(self.path(filename))
+        except (FileNotFoundError, ValueError):
+            return None
+        content_type, _ = mimetypes.guess_type(filename)
+        # Change à chaque réécriture (date en nanosecondes + taille), comme l'ETag d'Azure
+        return BlobInfo(stat.st_size, content_type, f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"')
+
+    async def get_info_async(self, filename):
+        return await asyncio.to_thread(self._info, filename)
+
+    def _read_range(self, filename: str, offset: int, length: int) -> bytes:
+        fd = os.open(self.path(filename), os.O_RDONLY)
+        try:
+            return os.pread(fd, length, offset)
+        finally:
+            os.close(fd)
+
+    async def read_range_async(self, filename, offset, length):
+        return await asyncio.to_thread(self._read_range, filename, offset, length)
+
+    def list_files(self):
+        for directory, subdirectories, files in os.walk(self.root):
+            if directory == self.root:
+                subdirectories[:] = [d for d in subdirectories if d != TEMP_DIR]
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    modified = os.stat(path).st_mtime
+                except FileNotFoundError:
+                    continue
+                relative = os.path.relpath(path, self.root).replace(os.sep, "/")
+                yield relative, datetime.fromtimestamp(modified, tz=timezone.utc)
+
+    # --- URL SIGNÉES ---
+    def _signature(self, filename: str, expires: int) -> str:
+        return hmac.new(self.secret, f"{filename}\n{expires}".encode(), hashlib.sha256).hexdigest()
+
+    def signed_url(self, filename, expiry):
+        expires = int(expiry.timestamp())
+        return f"{self.public_url}/{quote(filename)}?exp={expires}&sig={self._signature(filename, expires)}"
+
+    def verify(self, filename: str, expires, signature, now: datetime = None) -> bool:
+        """Signature valide et non expirée"""
+        try:
+            expires = int(expires)
+        except (TypeError, ValueError):
+            return False
+        now = now or datetime.now(timezone.utc)
+        if expires < now.timestamp():
+            return False
+        return hmac.compare_digest(self._signature(filename, expires), signature or "")
+
+    def _upload_signature(self, filename: str, expires: int, max_size: int, content_type: str) -> str:
+        message = f"PUT\n{filename}\n{expires}\n{max_size}\n{content_type}"
+        return hmac.new(self.secret, message.encode(), hashlib.sha256).hexdigest()
+
+    def signed_upload_url(self, filename, expiry, max_size, content_type):
+        # Taille max et type font partie de la signature : le serveur de fichiers les impose
+        expires = int(expiry.timestamp())
+        query = urlencode({
+            "exp": expires, "max": max_size, "type": content_type,
+            "sig": self._upload_signature(filename, expires, max_size, content_type),
+        })
+        return {"method": "PUT", "url": f"{self.public_url}/{quote(filename)}?{query}", "headers": {"Content-Type": content_type}}
+
+    def verify_upload(self, filename: str, query, now: datetime = None) -> Optional[int]:
+        """Taille max autorisée si l'URL d'écriture est valide et non expirée, sinon None"""
+        try:
+            expires, max_size = int(query.get("exp")), int(query.get("max"))
+        except (TypeError, ValueError):
+            return None
+        now = now or datetime.now(timezone.utc)
+        if expires < now.timestamp():
+            return None
+        expected = self._upload_signature(filename, expires, max_size, query.get("type", ""))
+        return max_size if hmac.compare_digest(expected, query.get("sig") or "") else None
+
+    # --- SERVEUR DE FICHIERS ---
+    async def _serve(self, request: web.Request) -> web.StreamResponse:
+        name = request.match_info["name"]
+        expires, signature = request.query.get("exp"), request.query.get("sig")
+        if not self.verify(name, expires, signature):
+            raise web.HTTPForbidden(text="URL invalide ou expirée")
+        try:
+            path = self.path(name)
+        except ValueError:
+            raise web.HTTPNotFound()
+        if not os.path.isfile(path):
+            raise web.HTTPNotFound()
+        # L'URL est valable jusqu'à exp : le navigateur peut garder le fichier jusque-là
+        max_age = max(int(expires) - int(datetime.now(timezone.utc).timestamp()), 0)
+        return web.FileResponse(path, headers={"Cache-Control": f"private, max-age={max_age}"})
+
+    async def _receive(self, request: web.Request) -> web.StreamResponse:
+        """Upload direct (PUT sur une URL d'écriture) : taille et type imposés, jamais d'écrasement"""
+        name = request.match_info["name"]
+        max_size = self.verify_upload(name, request.query)
+        if max_size is None:
+            raise web.HTTPForbidden(text="URL invalide ou expirée")
+        if request.content_length is not None and request.content_length > max_size:
+            raise web.HTTPRequestEntityTooLarge(max_size=max_size, actual_size=request.content_length)
+        if request.headers.get("Content-Type", "") != request.query.get("type", ""):
+            raise web.HTTPUnsupportedMediaType(text="Content-Type différent de celui de l'URL")
+        try:
+            path = self.path(name)
+        except ValueError:
+            raise web.HTTPNotFound()
+        if os.path.exists(path):
+            raise web.HTTPConflict(text="Fichier déjà envoyé")
+
+        target = await asyncio.to_thread(self._open, name, max_size)
+        try:
+            async for chunk in request.content.iter_chunked(1024 * 1024):
+                await asyncio.to_thread(target.write, chunk)
+        except UploadTooLargeError:
+            target.abort()
+            raise web.HTTPRequestEntityTooLarge(max_size=max_size, actual_size=target.size)
+        except BaseException:
+            target.abort()
+            raise
+        try:
+            await asyncio.to_thread(target.commit, False)
+        except FileExistsError:
+            raise web.HTTPConflict(text="Fichier déjà envoyé")
+        return web.Response(status=201)
+
+    @web.middleware
+    async def _cors(self, request: web.Request, handler):
+        # Le navigateur lit et envoie les fichiers depuis le frontend (autre origine)
+        if request.method == "OPTIONS":
+            response = web.Response(status=204)
+            response.headers["Access-Control-Allow-Methods"] = "GET, PUT"
+            response.headers["Access-Control-Allow-Headers"] = "Content-Type, Range"
+            response.headers["Access-Control-Max-Age"] = "3600"
+        else:
+            try:
+                response = await handler(request)
+            except web.HTTPException as e:
+                e.headers["Access-Control-Allow-Origin"] = STORAGE_LOCAL_CORS_ORIGIN
+                raise
+        response.headers["Access-Control-Allow-Origin"] = STORAGE_LOCAL_CORS_ORIGIN
+        return response
+
+    def create_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._cors], client_max_size=0)
+        app.router.add_get(FILES_PREFIX + "{name:.+}", self._serve)
+        app.router.add_put(FILES_PREFIX + "{name:.+}", self._receive)
+        return app
+
+    async def start(self, host: str = None, port: int = None):
+        port = STORAGE_LOCAL_PORT if port is None else port
+        if not port or self._runner is not None:
+            return
+        runner = web.AppRunner(self.create_app(), access_log=None)
+        await runner.setup()
+        # Tous les workers écoutent le même port (SO_REUSEPORT) : le noyau répartit les connexions
+        site = web.TCPSite(runner, host or STORAGE_LOCAL_HOST, port, reuse_port=hasattr(socket, "SO_REUSEPORT"))
+        try:
+            await site.start()
+        except OSError as e:
+            print(f"Serveur de fichiers non démarré sur le port {port} : {e}")
+            await runner.cleanup()
+            return
+        self._runner = runner
+        print(f"--- Serveur de fichiers : {self.root} sur le port {port} ---")
+
+    async def aclose(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
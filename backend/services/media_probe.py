@@ -0,0 +1,251 @@
+"""
+Analyse d'un fichier de leçon sur disque : type réel (octets magiques), taille, SHA-256,
+pages et longueur du texte d'un PDF, durée et dimensions d'une vidéo (MP4/MOV, AVI).
+
+Bibliothèque standard seulement : ces fonctions tournent dans les processus du pool
+d'extraction (voir services/file_metadata.py), qui n'importent rien d'autre.
+"""
+import re
+import zlib
+import codecs
+import struct
+import hashlib
+import itertools
+from typing import Optional
+
+HEAD_SIZE = 64 * 1024
+# Boîte moov d'un MP4 (index des pistes) : lue en mémoire jusqu'à cette taille
+MAX_MOOV_SIZE = 64 * 1024 * 1024
+# PDF lu en mémoire pour compter pages et texte jusqu'à cette taille (au-delà : type, taille, empreinte)
+MAX_PDF_SIZE = 64 * 1024 * 1024
+# Flux compressés d'un PDF (fichier envoyé par un utilisateur, bombe de décompression possible) :
+# octets décompressés gardés par flux, et au total pour le fichier
+MAX_PDF_STREAM_SIZE = 16 * 1024 * 1024
+MAX_PDF_INFLATED_SIZE = 128 * 1024 * 1024
+
+
+# --- TYPE RÉEL ---
+def sniff_mime(head: bytes) -> Optional[str]:
+    """Type MIME d'après les premiers octets (None si inconnu)"""
+    if b"%PDF-" in head[:1024]:
+        return "application/pdf"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand == b"qt  ":
+            return "video/quicktime"
+        if brand in (b"M4A ", b"M4B "):
+            return "audio/mp4"
+        return "video/mp4"
+    if head[:4] == b"RIFF":
+        return {b"AVI ": "video/x-msvideo", b"WAVE": "audio/wav", b"WEBP": "image/webp"}.get(head[8:12])
+    if head[:4] == b"\x1aE\xdf\xa3":
+        return "video/webm" if b"webm" in head[:64] else "video/x-matroska"
+    if head[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if head[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if head[:4] == b"GIF8":
+        return "image/gif"
+    if head[:3] == b"ID3" or head[:2] in (b"\xff\xfb", b"\xff\xf3", b"\xff\xf2"):
+        return "audio/mpeg"
+    if head[:4] == b"PK\x03\x04":
+        # Office Open XML : le premier dossier de l'archive donne l'application
+        for folder, mime in ((b"word/", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+                             (b"ppt/", "application/vnd.openxmlformats-officedocument.presentationml.presentation"),
+                             (b"xl/", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")):
+            if folder in head:
+                return mime
+        return "application/zip"
+    if head[:8] == b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1":
+        return "application/x-ole-storage"  # anciens formats Office (.doc, .ppt, .xls)
+    if head and b"\0" not in head:
+        try:
+            # final=False : un caractère multi-octets coupé en fin de tête reste du texte
+            codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        except UnicodeDecodeError:
+            return None
+        return "text/plain"
+    return None
+
+
+# --- PDF ---
+_STREAM = re.compile(rb"<<((?:(?!>>\s*stream).){0,4096}?)>>\s*stream\r?\n", re.S)
+_PAGES_DICT = re.compile(rb"<<((?:(?!<<|>>).)*?/Type\s*/Pages\b(?:(?!<<|>>).)*?)>>", re.S)
+_PAGE = re.compile(rb"/Type\s*/Page\b(?!s)")
+_COUNT = re.compile(rb"/Count\s+(\d+)")
+_TEXT_BLOCK = re.compile(rb"BT\b(.*?)\bET\b", re.S)
+_LITERAL = re.compile(rb"\((?:\\.|[^\\)])*\)", re.S)
+_HEX = re.compile(rb"<([0-9A-Fa-f\s]*)>")
+_ESCAPE = re.compile(rb"\\([0-7]{1,3}|.)", re.S)
+
+
+def _pdf_streams(data: bytes, stream_limit: int = MAX_PDF_STREAM_SIZE, total_limit: int = MAX_PDF_INFLATED_SIZE):
+    """
+    Contenu décompressé des flux FlateDecode (pages, flux d'objets PDF 1.5), un par un.
+    Chaque flux est tronqué à stream_limit octets ; l'itération s'arrête après total_limit octets.
+    """
+    remaining = total_limit
+    for match in _STREAM.finditer(data):
+        if remaining <= 0:
+            return
+        if b"/FlateDecode" not in match.group(1):
+            continue
+        end = data.find(b"endstream", match.end())
+        try:
+            content = zlib.decompressobj().decompress(
+                memoryview(data)[match.end():end if end != -1 else len(data)], min(stream_limit, remaining)
+            )
+        except zlib.error:
+            continue
+        remaining -= len(content)
+        yield content
+
+
+def _text_length(content: bytes) -> int:
+    """Nombre approximatif de caractères affichés par les opérateurs de texte (Tj, TJ, ', \")"""
+    total = 0
+    for block in _TEXT_BLOCK.finditer(content):
+        text = block.group(1)
+        for literal in _LITERAL.finditer(text):
+            total += len(_ESCAPE.sub(b"x", literal.group(0)[1:-1]))
+        for hexa in _HEX.finditer(text):
+            # Polices composites : deux octets par glyphe le plus souvent
+            digits = len(re.sub(rb"\s", b"", hexa.group(1)))
+            total += digits // 4 if digits % 4 == 0 else digits // 2
+    return total
+
+
+def probe_pdf(data: bytes) -> dict:
+    # Racine de l'arbre des pages : le plus grand /Count ; à défaut, les feuilles /Type /Page.
+    # Les flux sont analysés un par un : un seul est décompressé en mémoire à la fois.
+    max_count = leaves = text_length = 0
+    for source in itertools.chain((data,), _pdf_streams(data)):
+        for pages in _PAGES_DICT.finditer(source):
+            for count in _COUNT.findall(pages.group(1)):
+                max_count = max(max_count, int(count))
+        leaves += len(_PAGE.findall(source))
+        text_length += _text_length(source)
+    return {"page_count": max_count or leaves, "text_length": text_length}
+
+
+# --- VIDÉO ---
+def _boxes(data: bytes, start: int = 0, end: int = None):
+    """(type, début du contenu, fin) des boîtes ISO BMFF de data[start:end]"""
+    end = len(data) if end is None else end
+    position = start
+    while position + 8 <= end:
+        size, kind = struct.unpack(">I4s", data[position:position + 8])
+        header = 8
+        if size == 1 and position + 16 <= end:
+            size = struct.unpack(">Q", data[position + 8:position + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - position
+        if size < header:
+            return
+        yield kind, position + header, min(position + size, end)
+        position += size
+
+
+def _read_moov(f) -> Optional[bytes]:
+    """Boîte moov (au début ou à la fin du fichier), sans lire les données des pistes"""
+    position = 0
+    while True:
+        f.seek(position)
+        header = f.read(16)
+        if len(header) < 8:
+            return None
+        size, kind = struct.unpack(">I4s", header[:8])
+        header_size = 8
+        if size == 1:
+            if len(header) < 16:
+                return None
+            size = struct.unpack(">Q", header[8:16])[0]
+            header_size = 16
+        if kind == b"moov":
+            if size == 0 or size > MAX_MOOV_SIZE:
+                size = MAX_MOOV_SIZE
+            f.seek(position + header_size)
+            return f.read(size - header_size)
+        if size < header_size:
+            return None
+        position += size
+
+
+def probe_iso_bmff(f) -> dict:
+    """MP4 / MOV : durée (mvhd) et dimensions de la piste vidéo (tkhd)"""
+    f.seek(0)
+    head = f.read(16)
+    result = {"container": "quicktime" if head[8:12] == b"qt  " else "mp4"}
+    moov = _read_moov(f)
+    if moov is None:
+        return result
+    for kind, start, end in _boxes(moov):
+        if kind == b"mvhd":
+            version = moov[start]
+            if version == 1:
+                timescale, duration = struct.unpack(">IQ", moov[start + 20:start + 32])
+            else:
+                timescale, duration = struct.unpack(">II", moov[start + 12:start + 20])
+            if timescale:
+                result["duration_seconds"] = round(duration / timescale, 3)
+        elif kind == b"trak":
+            width = height = handler = None
+            for child, child_start, child_end in _boxes(moov, start, end):
+                if child == b"tkhd":
+                    # Largeur et hauteur en virgule fixe 16.16, à la fin de la boîte
+                    width, height = struct.unpack(">II", moov[child_end - 8:child_end])
+                elif child == b"mdia":
+                    for grandchild, grandchild_start, _ in _boxes(moov, child_start, child_end):
+                        if grandchild == b"hdlr":
+                            handler = moov[grandchild_start + 8:grandchild_start + 12]
+            if handler == b"vide" and width:
+                result["width"], result["height"] = width >> 16, height >> 16
+    return result
+
+
+def probe_avi(head: bytes) -> dict:
+    """AVI : en-tête principal avih (durée = images x durée d'une image)"""
+    result = {"container": "avi"}
+    position = head.find(b"avih")
+    if position == -1 or position + 48 > len(head):
+        return result
+    micro_per_frame, _, _, _, total_frames, _, _, _, width, height = struct.unpack("<10I", head[position + 8:position + 48])
+    result["duration_seconds"] = round(micro_per_frame * total_frames / 1_000_000, 3)
+    result["width"], result["height"] = width, height
+    return result
+
+
+# --- POINT D'ENTRÉE (processus du pool) ---
+def probe_file(path: str, complete: bool = True) -> dict:
+    """
+    Métadonnées du fichier. complete=False : seul le début du fichier a été récupéré
+    (fichier trop gros), on se limite au type et à ce que l'en-tête permet de lire.
+    """
+    with open(path, "rb") as f:
+        head = f.read(HEAD_SIZE)
+        mime_type = sniff_mime(head)
+        result = {"mime_type": mime_type}
+        if complete:
+            f.seek(0)
+            digest = hashlib.sha256()
+            size = 0
+            while chunk := f.read(1024 * 1024):
+                digest.update(chunk)
+                size += len(chunk)
+            result["sha256"], result["size"] = digest.hexdigest(), size
+
+        try:
+            if mime_type == "application/pdf" and complete and size <= MAX_PDF_SIZE:
+                f.seek(0)
+                result.update(probe_pdf(f.read()))
+            elif mime_type in ("video/mp4", "video/quicktime", "audio/mp4"):
+                result.update(probe_iso_bmff(f))
+            elif mime_type == "video/x-msvideo":
+                result.update(probe_avi(head))
+            elif mime_type in ("video/webm", "video/x-matroska"):
+                result["container"] = "webm" if mime_type == "video/webm" else "matroska"
+        except (struct.error, IndexError, ValueError):
+            # Fichier tronqué ou mal formé : on garde le type, la taille et l'empreinte
+            pass
+    return result
@@ -0,0 +1,155 @@
+import os
+import time
+import inspect
+import functools
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# --- CONFIGURATION ---
+# Avec gunicorn, chaque worker écrit ses valeurs dans ce dossier ; /metrics agrège tous les workers.
+# Lu directement par prometheus_client : doit être défini AVANT le démarrage des workers.
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+# --- MÉTRIQUES ---
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Durée des requêtes HTTP par route",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+http_request_sql_queries = Histogram(
+    "http_request_sql_queries", "Nombre de requêtes SQL par requête HTTP",
+    ["method", "route"], buckets=QUERY_COUNT_BUCKETS,
+)
+http_request_sql_seconds = Histogram(
+    "http_request_sql_seconds", "Temps SQL cumulé par requête HTTP",
+    ["method", "route"], buckets=LATENCY_BUCKETS,
+)
+sql_query_duration = Histogram(
+    "sql_query_duration_seconds", "Durée de chaque requête SQL",
+    ["operation"], buckets=LATENCY_BUCKETS,
+)
+sql_query_errors = Counter("sql_query_errors_total", "Requêtes SQL en erreur", ["operation"])
+query_budget_exceeded = Counter(
+    "query_budget_exceeded_total", "Requêtes HTTP au-delà de leur budget de requêtes SQL", ["label"]
+)
+blob_operation_duration = Histogram(
+    "blob_operation_duration_seconds", "Durée des appels au Blob Storage",
+    ["operation", "outcome"], buckets=LATENCY_BUCKETS,
+)
+blob_dedup_uploads = Counter(
+    "blob_dedup_uploads_total", "Uploads adressés par contenu (new : envoyé, duplicate : déjà stocké)", ["result"]
+)
+blob_dedup_bytes_saved = Counter("blob_dedup_bytes_saved_total", "Octets non envoyés au stockage (fichier déjà présent)")
+
+# Cache disque des morceaux de fichiers servis par /lessons/{id}/content
+content_cache_requests = Counter(
+    "content_cache_requests_total", "Morceaux de fichiers demandés au cache disque (hit, miss, wait)", ["result"]
+)
+content_cache_evictions = Counter("content_cache_evictions_total", "Morceaux retirés du cache disque (limite de taille)")
+content_cache_bytes = Gauge("content_cache_bytes", "Taille du cache disque des fichiers", multiprocess_mode="livesum")
+
+# Bus d'invalidation des caches entre workers (services/invalidation.py)
+cache_invalidation_events = Counter(
+    "cache_invalidation_events_total", "Invalidations appliquées aux caches du worker (local : publiées ici, remote : reçues)", ["source"]
+)
+cache_invalidation_delay = Histogram(
+    "cache_invalidation_delay_seconds", "Délai entre la publication d'une invalidation et son application dans un autre worker",
+    buckets=LATENCY_BUCKETS,
+)
+
+
+# --- STATISTIQUES SQL DE LA REQUÊTE EN COURS ---
+class RequestStats:
+    __slots__ = ("queries", "sql_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+
+_current_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_sql_stats", default=None)
+
+
+def start_request_stats() -> RequestStats:
+    stats = RequestStats()
+    _current_stats.set(stats)
+    return stats
+
+
+def _operation(statement: str) -> str:
+    word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return word if word in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+
+# Écouteurs sur la classe Engine : couvrent tous les moteurs (synchrone, asynchrone, tests)
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    sql_query_duration.labels(_operation(statement)).observe(elapsed)
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_seconds += elapsed
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    starts = context.connection.info.get("query_start_time") if context.connection is not None else None
+    if starts:
+        starts.pop()
+    sql_query_errors.labels(_operation(context.statement or "")).inc()
+
+
+# --- BLOB STORAGE ---
+def timed_blob(operation: str):
+    """Mesure un appel au Blob Storage (fonction synchrone ou coroutine)"""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                outcome = "error"
+                try:
+                    result = await fn(*args, **kwargs)
+                    outcome = "error" if result is False else "ok"
+                    return result
+                finally:
+                    blob_operation_duration.labels(operation, outcome).observe(time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                result = fn(*args, **kwargs)
+                outcome = "error" if result is False else "ok"
+                return result
+            finally:
+                blob_operation_duration.labels(operation, outcome).observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+# --- EXPOSITION ---
+def render_metrics():
+    """Texte Prometheus : agrégé sur tous les workers en mode multiprocess"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=PROMETHEUS_MULTIPROC_DIR)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,81 @@
+"""
+Ordre des leçons par valeurs espacées (1024, 2048, 3072...).
+
+Déplacer une leçon revient à lui donner une valeur entre ses deux nouvelles voisines :
+une seule ligne modifiée. Les autres valeurs ne sont réécrites (renumérotation complète)
+que lorsqu'il n'y a plus de place entre deux voisines.
+"""
+import os
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+ORDER_GAP = int(os.getenv("LESSON_ORDER_GAP", "1024"))
+
+
+def next_order(max_order: Optional[int]) -> int:
+    """Valeur d'une leçon ajoutée en fin de cours"""
+    return ORDER_GAP if max_order is None else max_order + ORDER_GAP
+
+
+def _kept_positions(values: List[int]) -> set:
+    """Positions d'une plus longue sous-suite strictement croissante : ces leçons gardent leur valeur"""
+    tails: List[int] = []        # plus petite valeur finale d'une sous-suite de chaque longueur
+    tail_positions: List[int] = []
+    previous: List[int] = [-1] * len(values)
+    for position, value in enumerate(values):
+        length = bisect_left(tails, value)
+        if length == len(tails):
+            tails.append(value)
+            tail_positions.append(position)
+        else:
+            tails[length] = value
+            tail_positions[length] = position
+        previous[position] = tail_positions[length - 1] if length else -1
+
+    kept = set()
+    position = tail_positions[-1] if tail_positions else -1
+    while position != -1:
+        kept.add(position)
+        position = previous[position]
+    return kept
+
+
+def plan_reorder(current: Dict[int, int], new_ids: List[int]) -> Tuple[Dict[int, int], bool]:
+    """
+    current : {lesson_id: order actuel}, new_ids : les mêmes ids dans le nouvel ordre.
+    Retourne ({lesson_id: nouvel order} pour les seules lignes à modifier, renumérotation complète ?).
+    """
+    values = [current[lesson_id] for lesson_id in new_ids]
+    kept = _kept_positions(values)
+
+    changes = {}
+    position = 0
+    while position < len(new_ids):
+        if position in kept:
+            position += 1
+            continue
+        # Suite de leçons déplacées, placées entre deux voisines conservées
+        end = position
+        while end < len(new_ids) and end not in kept:
+            end += 1
+        count = end - position
+        low = values[position - 1] if position > 0 else None
+        high = values[end] if end < len(new_ids) else None
+        if low is None and high is None:
+            slots = [ORDER_GAP * (i + 1) for i in range(count)]
+        elif low is None:
+            slots = [high - ORDER_GAP * (count - i) for i in range(count)]
+        elif high is None:
+            slots = [low + ORDER_GAP * (i + 1) for i in range(count)]
+        elif high - low > count:
+            step = (high - low) / (count + 1)
+            slots = [low + int(step * (i + 1)) for i in range(count)]
+        else:
+            # Plus de place : on repart de valeurs régulièrement espacées
+            renumbered = {lesson_id: ORDER_GAP * (i + 1) for i, lesson_id in enumerate(new_ids)}
+            return {k: v for k, v in renumbered.items() if current[k] != v}, True
+        for lesson_id, value in zip(new_ids[position:end], slots):
+            changes[lesson_id] = value
+        position = end
+
+    return {k: v for k, v in changes.items() if current[k] != v}, False
@@ -0,0 +1,91 @@
+"""
+Budget de requêtes SQL par route : garde-fou contre le retour des N+1.
+
+    @router.get("/courses/{course_id}/lessons")
+    @max_queries(2)
+    async def list_lessons_for_course(...): ...
+
+    with query_budget(3, "import"):
+        ...
+
+Chaque requête SQL exécutée dans le bloc (même contexte asyncio) est comptée.
+Au-delà du budget : QUERY_BUDGET_MODE=raise lève QueryBudgetExceeded (tests),
+warn (défaut) l'affiche et incrémente query_budget_exceeded_total, off ne fait rien.
+"""
+import os
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .metrics import query_budget_exceeded
+
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "warn")
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """Un bloc a exécuté plus de requêtes SQL que son budget"""
+
+
+class QueryBudget:
+    __slots__ = ("limit", "label", "count")
+
+    def __init__(self, limit: int, label: str):
+        self.limit = limit
+        self.label = label
+        self.count = 0
+
+    def check(self):
+        if self.count <= self.limit or QUERY_BUDGET_MODE == "off":
+            return
+        message = f"{self.label} : {self.count} requêtes SQL pour un budget de {self.limit}"
+        if QUERY_BUDGET_MODE == "raise":
+            raise QueryBudgetExceeded(message)
+        query_budget_exceeded.labels(self.label).inc()
+        print(f"Budget SQL dépassé - {message}")
+
+
+_active: ContextVar[Tuple[QueryBudget, ...]] = ContextVar("query_budgets", default=())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    for budget in _active.get():
+        budget.count += 1
+
+
+@contextmanager
+def query_budget(limit: int, label: str = "bloc"):
+    """Compte les requêtes du bloc ; vérifié à la sortie normale (pas en cas d'exception)"""
+    budget = QueryBudget(limit, label)
+    token = _active.set(_active.get() + (budget,))
+    try:
+        yield budget
+    finally:
+        _active.reset(token)
+    budget.check()
+
+
+@contextmanager
+def unbudgeted():
+    """Travail ponctuel hors budget (ex: premier chargement de l'index de recherche)"""
+    token = _active.set(())
+    try:
+        yield
+    finally:
+        _active.reset(token)
+
+
+def max_queries(limit: int):
+    """Décorateur de route (à placer sous @router.xxx) : budget déclaré, lisible via endpoint.query_budget"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with query_budget(limit, fn.__name__):
+                return await fn(*args, **kwargs)
+        wrapper.query_budget = limit
+        return wrapper
+    return decorator
@@ -0,0 +1,412 @@
+import os
+import re
+import math
+import heapq
+import bisect
+import tempfile
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import orjson
+from sqlmodel import Session, select
+
+from ..models import Course, Lesson
+from .invalidation import invalidation_bus
+
+# --- CONFIGURATION ---
+# Dossier privé de l'application (créé en 0700), pas le /tmp partagé : un autre utilisateur
+# pourrait y déposer le fichier à l'avance
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", os.path.join(
+    os.getenv("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "elearning", "search-index.json"
+))
+SNAPSHOT_VERSION = 3
+
+# Paramètres BM25 classiques
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Un mot du titre compte comme plusieurs mots du corps
+TITLE_WEIGHT = 3
+# Recherche par préfixe : longueur minimale et nombre max de termes développés
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_EXPANSIONS = 10
+PREFIX_PENALTY = 0.7
+
+STOP_WORDS = frozenset("""
+le la les l un une des du de d et ou en a au aux ce ces cet cette pour par sur dans avec sans est sont qui que
+quoi dont il elle ils elles on nous vous je tu se sa son ses leur leurs ne pas plus y
+the an of and or to in for on with is are be this that it as at by from
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def fold(text: str) -> str:
+    """Minuscules + suppression des accents ("Élève" -> "eleve")"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return [t for t in _TOKEN_RE.findall(fold(text)) if t not in STOP_WORDS]
+
+
+DocKey = Tuple[str, int]  # ("course" | "lesson", id)
+
+
+KINDS = {"course": 0, "lesson": 1}
+
+
+def _check_owner(st: os.stat_result, path: str):
+    """Le snapshot et son dossier : à l'utilisateur du serveur, non modifiables par les autres"""
+    if hasattr(os, "getuid") and (st.st_uid != os.getuid() or st.st_mode & 0o022):
+        raise PermissionError(f"{path} : doit appartenir à l'utilisateur du serveur, sans droit d'écriture pour les autres")
+
+
+def _private_directory(path: str) -> str:
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    _check_owner(os.stat(directory), directory)
+    return directory
+
+
+class SearchIndex:
+    """
+    Index inversé en mémoire (un par worker), classement BM25.
+    Mis à jour document par document : pas de reconstruction complète. Les écritures de
+    tous les workers arrivent par le bus d'invalidation (services/invalidation.py) : les
+    documents concernés sont relus depuis la BDD avant la recherche suivante (refresh).
+
+    Chaque document occupe un "slot" entier ; les listes de postings sont gardées
+    en dict (mise à jour incrémentale) et converties à la demande en tableaux NumPy
+    pour le calcul des scores (mis en cache jusqu'à la prochaine modification du terme).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # Documents à relire depuis la BDD (alimenté par le bus, depuis la boucle d'événements)
+        self._dirty_lock = threading.Lock()
+        self.dirty: Set[DocKey] = set()
+        self._reset()
+
+    def _reset(self):
+        self.postings: Dict[str, Dict[int, int]] = {}   # terme -> {slot: tf pondéré}
+        self.terms: List[str] = []                      # vocabulaire trié (recherche par préfixe)
+        self.doc_terms: Dict[DocKey, Dict[str, int]] = {}
+        self.doc_meta: Dict[DocKey, dict] = {}
+        self.slots: Dict[DocKey, int] = {}
+        self.slot_keys: List[Optional[DocKey]] = []     # slot -> document
+        self.free_slots: List[int] = []
+        self.lengths = np.zeros(1024, dtype=np.float64)
+        self.kinds = np.full(1024, -1, dtype=np.int8)
+        self.size = 0                                   # nombre de slots utilisés
+        self.total_len = 0
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        # Version de chaque cours lors de la dernière indexation complète du cours et de ses leçons :
+        # au chargement d'un snapshot, un cours dont la version a changé est ré-indexé (voir reconcile)
+        self.course_versions: Dict[int, int] = {}
+        self.ready = False
+
+    def __len__(self):
+        return len(self.doc_meta)
+
+    # --- MISE À JOUR INCRÉMENTALE ---
+    def add(self, kind: str, doc_id: int, title: str, body: List[Optional[str]], **meta):
+        tf = Counter()
+        for token in tokenize(title):
+            tf[token] += TITLE_WEIGHT
+        for text in body:
+            tf.update(tokenize(text))
+        with self._lock:
+            self._add((kind, doc_id), tf, {"type": kind, "id": doc_id, "title": title, **meta})
+
+    def _add(self, key: DocKey, tf: Counter, meta: dict):
+        self._remove(key)
+        slot = self._allocate_slot()
+        for term, count in tf.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = {}
+                bisect.insort(self.terms, term)
+            posting[slot] = count
+            self._arrays.pop(term, None)
+        length = sum(tf.values())
+        self.slots[key] = slot
+        self.slot_keys[slot] = key
+        self.lengths[slot] = length
+        self.kinds[slot] = KINDS[key[0]]
+        self.total_len += length
+        self.doc_terms[key] = tf
+        self.doc_meta[key] = meta
+
+    def _allocate_slot(self) -> int:
+        if self.free_slots:
+            return self.free_slots.pop()
+        if self.size == len(self.lengths):
+            self.lengths = np.concatenate([self.lengths, np.zeros_like(self.lengths)])
+            self.kinds = np.concatenate([self.kinds, np.full_like(self.kinds, -1)])
+        self.size += 1
+        self.slot_keys.append(None)
+        return self.size - 1
+
+    def remove(self, kind: str, doc_id: int):
+        with self._lock:
+            self._remove((kind, doc_id))
+
+    def _remove(self, key: DocKey):
+        tf = self.doc_terms.pop(key, None)
+        if tf is None:
+            return
+        slot = self.slots.pop(key)
+        for term in tf:
+            posting = self.postings[term]
+            posting.pop(slot, None)
+            self._arrays.pop(term, None)
+            if not posting:
+                del self.postings[term]
+                i = bisect.bisect_left(self.terms, term)
+                if i < len(self.terms) and self.terms[i] == term:
+                    del self.terms[i]
+        self.total_len -= int(self.lengths[slot])
+        self.lengths[slot] = 0
+        self.kinds[slot] = -1
+        self.slot_keys[slot] = None
+        self.free_slots.append(slot)
+        del self.doc_meta[key]
+
+    def add_course(self, course: Course):
+        self.add("course", course.id, course.title, [course.description], slug=course.slug, course_id=course.id)
+
+    def add_lesson(self, lesson: Lesson):
+        self.add("lesson", lesson.id, lesson.title, [lesson.description, lesson.content_text], course_id=lesson.course_id)
+
+    # --- RECHERCHE ---
+    def _expand(self, token: str) -> List[Tuple[str, float]]:
+        """Terme exact + termes commençant par le token (les plus fréquents d'abord)"""
+        expansions = []
+        if token in self.postings:
+            expansions.append((token, 1.0))
+        if len(token) >= MIN_PREFIX_LENGTH:
+            start = bisect.bisect_left(self.terms, token)
+            end = bisect.bisect_left(self.terms, token + "\uffff")
+            candidates = [t for t in self.terms[start:end] if t != token]
+            if len(candidates) > MAX_PREFIX_EXPANSIONS:
+                candidates = heapq.nlargest(MAX_PREFIX_EXPANSIONS, candidates, key=lambda t: len(self.postings[t]))
+            expansions.extend((t, PREFIX_PENALTY) for t in candidates)
+        return expansions
+
+    def _posting_arrays(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            posting = self.postings[term]
+            arrays = (
+                np.fromiter(posting.keys(), dtype=np.int64, count=len(posting)),
+                np.fromiter(posting.values(), dtype=np.float64, count=len(posting)),
+            )
+            self._arrays[term] = arrays
+        return arrays
+
+    def search(self, query: str, limit: int = 20, kind: Optional[str] = None) -> List[dict]:
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        with self._lock:
+            n_docs = len(self.doc_meta)
+            if n_docs == 0:
+                return []
+            avgdl = self.total_len / n_docs
+            norm = BM25_K1 * (1 - BM25_B)
+            slope = BM25_K1 * BM25_B / avgdl
+
+            # Seul le dernier mot est complété (saisie en cours) ; les autres sont exacts
+            terms = {}
+            for position, token in enumerate(tokens):
+                expansions = self._expand(token) if position == len(tokens) - 1 else [(token, 1.0)]
+                for term, weight in expansions:
+                    if term in self.postings:
+                        terms[term] = max(weight, terms.get(term, 0.0))
+            if not terms:
+                return []
+
+            scores = np.zeros(self.size, dtype=np.float64)
+            for term, weight in terms.items():
+                slots, tfs = self._posting_arrays(term)
+                df = len(slots)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                scores[slots] += (weight * idf * (BM25_K1 + 1)) * tfs / (tfs + norm + slope * self.lengths[slots])
+
+            if kind:
+                scores[self.kinds[:self.size] != KINDS[kind]] = 0
+            matched = np.flatnonzero(scores)
+            if len(matched) > limit:
+                matched = matched[np.argpartition(-scores[matched], limit - 1)[:limit]]
+            matched = matched[np.argsort(-scores[matched], kind="stable")]
+
+            return [
+                {**self.doc_meta[self.slot_keys[slot]], "score": round(float(scores[slot]), 4)}
+                for slot in matched.tolist()
+            ]
+
+    # --- SNAPSHOT DISQUE ---
+    def save(self, path: str = None) -> bool:
+        """
+        Écriture atomique (fichier temporaire puis rename), en JSON (orjson) : un snapshot
+        modifié par un tiers fausse au pire les résultats, il n'exécute pas de code (pickle).
+        """
+        path = path or SEARCH_INDEX_PATH
+        with self._lock:
+            state = {
+                "version": SNAPSHOT_VERSION,
+                # [type, id, {terme: tf}, méta] : les clés (type, id) ne sont pas des clés JSON
+                "documents": [[kind, doc_id, tf, self.doc_meta[(kind, doc_id)]] for (kind, doc_id), tf in self.doc_terms.items()],
+                "course_versions": self.course_versions,
+            }
+            data = orjson.dumps(state, option=orjson.OPT_NON_STR_KEYS)
+        try:
+            directory = _private_directory(path)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".search-index-")
+        except OSError as e:
+            print(f"Snapshot de l'index de recherche non écrit : {e}")
+            return False
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return True
+
+    def load(self, path: str = None) -> bool:
+        path = path or SEARCH_INDEX_PATH
+        try:
+            _private_directory(path)
+            with open(path, "rb") as f:
+                _check_owner(os.fstat(f.fileno()), path)
+                state = orjson.loads(f.read())
+            if state.get("version") != SNAPSHOT_VERSION:
+                return False
+            documents = {(kind, doc_id): (tf, meta) for kind, doc_id, tf, meta in state["documents"]}
+            course_versions = {int(course_id): version for course_id, version in state["course_versions"].items()}
+            if any(kind not in KINDS for kind, _ in documents):
+                return False
+        except FileNotFoundError:
+            return False
+        except PermissionError as e:
+            print(f"Snapshot de l'index de recherche ignoré : {e}")
+            return False
+        except (OSError, orjson.JSONDecodeError, AttributeError, KeyError, TypeError, ValueError):
+            return False
+
+        with self._lock:
+            self._reset()
+            postings = self.postings
+            for key, (tf, meta) in documents.items():
+                slot = self._allocate_slot()
+                for term, count in tf.items():
+                    posting = postings.get(term)
+                    if posting is None:
+                        posting = postings[term] = {}
+                    posting[slot] = count
+                length = sum(tf.values())
+                self.slots[key] = slot
+                self.slot_keys[slot] = key
+                self.lengths[slot] = length
+                self.kinds[slot] = KINDS[key[0]]
+                self.total_len += length
+                self.doc_terms[key] = tf
+                self.doc_meta[key] = meta
+            self.terms = sorted(postings)
+            self.course_versions = course_versions
+        return True
+
+    # --- SYNCHRONISATION AVEC LA BDD ---
+    def _reindex(self, session: Session, kind: str, ids: Iterable[int], batch_size: int = 1000):
+        """Relit ces documents : ajoutés ou mis à jour s'ils existent, retirés sinon"""
+        model, add = (Course, self.add_course) if kind == "course" else (Lesson, self.add_lesson)
+        ids = list(ids)
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start:start + batch_size]
+            found = set()
+            for row in session.exec(select(model).where(model.id.in_(chunk))).all():
+                add(row)
+                found.add(row.id)
+            for doc_id in chunk:
+                if doc_id not in found:
+                    self.remove(kind, doc_id)
+
+    def reconcile(self, session: Session, batch_size: int = 1000):
+        """
+        Aligne l'index (snapshot chargé ou index vide) sur la BDD : documents supprimés retirés,
+        cours dont la version a changé depuis leur indexation ré-indexés avec leurs leçons,
+        documents absents ajoutés. Le snapshot peut venir de n'importe quel worker.
+        """
+        # Versions lues AVANT le contenu : une écriture entre-temps sera reprise au prochain chargement
+        versions = dict(session.exec(select(Course.id, Course.version)).all())
+        lesson_courses = dict(session.exec(select(Lesson.id, Lesson.course_id)).all())
+        with self._lock:
+            for kind, doc_id in list(self.doc_meta):
+                if doc_id not in (versions if kind == "course" else lesson_courses):
+                    self._remove((kind, doc_id))
+            stale = {course_id for course_id, version in versions.items() if self.course_versions.get(course_id) != version}
+            self._reindex(session, "course", [
+                course_id for course_id in versions if course_id in stale or ("course", course_id) not in self.doc_meta
+            ], batch_size)
+            self._reindex(session, "lesson", [
+                lesson_id for lesson_id, course_id in lesson_courses.items()
+                if course_id in stale or ("lesson", lesson_id) not in self.doc_meta
+            ], batch_size)
+            self.course_versions = {course_id: versions[course_id] for course_id in versions}
+
+    def invalidate(self, key: DocKey):
+        """Bus d'invalidation : document créé, modifié ou supprimé par un worker, relu avant la prochaine recherche"""
+        with self._dirty_lock:
+            self.dirty.add(key)
+
+    def clear(self):
+        """Bus d'invalidation : des messages ont pu être perdus, réconciliation complète avant la prochaine recherche"""
+        self.ready = False
+
+    def refresh(self, session: Session):
+        """Relit les documents invalidés depuis la BDD"""
+        with self._dirty_lock:
+            dirty, self.dirty = self.dirty, set()
+        if not dirty:
+            return
+        with self._lock:
+            for kind in KINDS:
+                self._reindex(session, kind, sorted(doc_id for key_kind, doc_id in dirty if key_kind == kind))
+
+    # --- CHARGEMENT INITIAL ---
+    def build(self, session: Session, batch_size: int = 1000):
+        """Indexation complète depuis la BDD (uniquement si aucun snapshot n'existe)"""
+        with self._lock:
+            self._reset()
+            self.reconcile(session, batch_size)
+
+    def ensure_ready(self, session: Session, path: str = None):
+        if self.ready:
+            return
+        with self._lock:
+            if self.ready:
+                return
+            # La réconciliation relit tout : les invalidations reçues jusqu'ici sont couvertes
+            with self._dirty_lock:
+                self.dirty.clear()
+            if self.load(path):
+                self.reconcile(session)
+            else:
+                self.build(session)
+                self.save(path)
+            self.ready = True
+
+
+search_index = SearchIndex()
+# Écritures de n'importe quel worker : documents relus avant la prochaine recherche
+invalidation_bus.subscribe("course", search_index, keys=lambda course_id: [("course", course_id)])
+invalidation_bus.subscribe("lesson", search_index, keys=lambda lesson_id: [("lesson", lesson_id)])
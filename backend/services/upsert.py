@@ -0,0 +1,68 @@
+"""
+INSERT ou mise à jour en une instruction (upsert), atomique entre workers.
+
+Un SELECT des lignes existantes suivi d'un INSERT des nouvelles ne l'est pas : deux workers
+qui écrivent la première ligne d'une même clé insèrent tous les deux, et l'un des deux
+échoue sur la clé primaire. L'instruction dépend de la base :
+- SQLite, PostgreSQL : INSERT ... ON CONFLICT (clés) DO UPDATE / DO NOTHING
+- SQL Server : MERGE ... WITH (HOLDLOCK) (verrou sur la clé, même absente)
+"""
+from typing import Callable, List, Sequence
+
+from sqlalchemy import Table, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+
+def _merge(table: Table, dialect, columns: Sequence[str], keys: Sequence[str], counters: Sequence[str],
+           only_if: Callable = None, returning: Sequence[str] = ()):
+    """Instruction MERGE (SQL Server), paramètres nommés comme les colonnes"""
+    target = table.alias("target")
+    quote = dialect.identifier_preparer.quote
+    source = ", ".join(f":{c} AS {quote(c)}" for c in columns)
+    on = " AND ".join(f"target.{quote(k)} = source.{quote(k)}" for k in keys)
+    sql = f"MERGE {quote(table.name)} WITH (HOLDLOCK) AS target USING (SELECT {source}) AS source ON {on}"
+    if counters:
+        condition = ""
+        if only_if is not None:
+            condition = " AND " + str(only_if(target).compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+        updates = ", ".join(f"{quote(c)} = target.{quote(c)} + source.{quote(c)}" for c in counters)
+        sql += f" WHEN MATCHED{condition} THEN UPDATE SET {updates}"
+    names = ", ".join(quote(c) for c in columns)
+    sql += f" WHEN NOT MATCHED THEN INSERT ({names}) VALUES ({', '.join(f'source.{quote(c)}' for c in columns)})"
+    if returning:
+        sql += " OUTPUT " + ", ".join(f"inserted.{quote(c)}" for c in returning)
+    return text(sql + ";")
+
+
+async def upsert_counters(session: AsyncSession, table: Table, rows: List[dict], keys: Sequence[str],
+                          counters: Sequence[str] = (), only_if: Callable = None, returning: Sequence[str] = ()):
+    """
+    Insère les lignes ; pour une clé déjà présente, compteur = compteur + valeur de la ligne
+    (sans compteurs : la ligne existante est laissée telle quelle). En lot (executemany).
+    only_if(table) : condition sur la ligne existante pour la mettre à jour (ex: refcount >= 0).
+    returning : colonnes renvoyées (une ligne seulement) ; None si la ligne existante n'a pas été modifiée.
+    """
+    if not rows:
+        return None
+    dialect = session.get_bind().dialect
+    columns = list(rows[0])
+    if dialect.name == "mssql":
+        statement = _merge(table, dialect, columns, keys, counters, only_if, returning)
+    else:
+        insert = (postgresql if dialect.name == "postgresql" else sqlite).insert
+        statement = insert(table)
+        if counters:
+            statement = statement.on_conflict_do_update(
+                index_elements=list(keys),
+                set_={c: table.c[c] + statement.excluded[c] for c in counters},
+                where=only_if(table) if only_if is not None else None,
+            )
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=list(keys))
+        if returning:
+            statement = statement.returning(*[table.c[c] for c in returning])
+    if returning:
+        return (await session.exec(statement, params=rows[0])).first()
+    await session.exec(statement, params=rows)
+    return None
@@ -0,0 +1,271 @@
+"""
+Bouchon local "façon Azurite" pour les tests du stockage Blob.
+
+Implémente le strict minimum de l'API REST Blob utilisé par le SDK Azure
+(Put Blob, Put Block, Put Block List, Get/Head Blob, Delete Blob, Blob Batch
+pour les suppressions, List Blobs) et compte
+les connexions TCP acceptées pour vérifier la réutilisation du pool HTTP.
+L'authentification n'est pas vérifiée.
+"""
+import re
+import time
+import threading
+import xml.etree.ElementTree as ET
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+
+ACCOUNT_NAME = "devstoreaccount1"
+# Clé publique et documentée de l'émulateur Azurite
+ACCOUNT_KEY = "Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw=="
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, *args, discard_content=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.bytes_received = 0
+        self.batches = 0
+        self.discard_content = discard_content
+        self.blobs = {}   # (container, blob) -> {"data": bytes, "content_type": str, "size": int}
+        self.blocks = {}  # (container, blob) -> {block_id: bytes | int}
+
+    def get_request(self):
+        request = super().get_request()
+        with self.lock:
+            self.connections += 1
+        return request
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    # --- UTILITAIRES ---
+    def _target(self):
+        parts = urlsplit(self.path)
+        segments = [unquote(s) for s in parts.path.split("/") if s]
+        # /<account>/<container>/<blob...>
+        container = segments[1] if len(segments) > 1 else None
+        blob = "/".join(segments[2:]) if len(segments) > 2 else None
+        return container, blob, parse_qs(parts.query)
+
+    def _read_body(self, keep=None):
+        keep = not self.server.discard_content if keep is None else keep
+        length = int(self.headers.get("Content-Length") or 0)
+        remaining = length
+        chunks = []
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            if keep:
+                chunks.append(chunk)
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.bytes_received += length
+        return b"".join(chunks), length
+
+    def _reply(self, status, headers=None, body=b""):
+        self.send_response(status)
+        self.send_header("x-ms-request-id", "stub")
+        self.send_header("x-ms-version", "2023-11-03")
+        self.send_header("Date", formatdate(usegmt=True))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _not_found(self):
+        body = b'<?xml version="1.0" encoding="utf-8"?><Error><Code>BlobNotFound</Code><Message>The specified blob does not exist.</Message></Error>'
+        self._reply(404, {"x-ms-error-code": "BlobNotFound", "Content-Type": "application/xml"}, body if self.command != "HEAD" else b"")
+
+    def _written(self):
+        self._reply(201, {
+            "ETag": '"0x8D000000000000"',
+            "Last-Modified": formatdate(usegmt=True),
+            "x-ms-request-server-encrypted": "true",
+        })
+
+    # --- VERBES HTTP ---
+    def do_PUT(self):
+        container, blob, query = self._target()
+        comp = query.get("comp", [None])[0]
+        data, length = self._read_body(keep=True if comp == "blocklist" else None)
+        key = (container, blob)
+        with self.server.lock:
+            if comp == "block":
+                block_id = query["blockid"][0]
+                self.server.blocks.setdefault(key, {})[block_id] = data if not self.server.discard_content else length
+            elif comp == "blocklist":
+                staged = self.server.blocks.pop(key, {})
+                ids = [el.text for el in ET.fromstring(data) if el.text] if data else []
+                parts = [staged.get(i, b"") for i in ids]
+                if self.server.discard_content:
+                    size = sum(p if isinstance(p, int) else len(p) for p in parts)
+                    content = b""
+                else:
+                    content = b"".join(parts)
+                    size = len(content)
+                self.server.blobs[key] = {
+                    "data": content,
+                    "size": size,
+                    "modified": time.time(),
+                    "content_type": self.headers.get("x-ms-blob-content-type", "application/octet-stream"),
+                }
+            else:
+                self.server.blobs[key] = {
+                    "data": data,
+                    "size": length,
+                    "modified": time.time(),
+                    "content_type": self.headers.get("x-ms-blob-content-type")
+                    or self.headers.get("Content-Type", "application/octet-stream"),
+                }
+        self._written()
+
+    def do_DELETE(self):
+        container, blob, _ = self._target()
+        self._read_body()
+        with self.server.lock:
+            found = self.server.blobs.pop((container, blob), None)
+        if found is None:
+            return self._not_found()
+        self._reply(202, {"x-ms-delete-type-permanent": "true"})
+
+    def do_POST(self):
+        container, _, query = self._target()
+        if query.get("comp", [None])[0] != "batch":
+            return self._reply(400)
+        data, _ = self._read_body(keep=True)
+
+        # Chaque sous-requête est un "DELETE /<conteneur>/<blob> HTTP/1.1" ; on répond dans le même ordre
+        parts = []
+        for content_id, path in re.findall(rb"Content-ID: (\d+).*?DELETE ([^ ]+) HTTP/1.1", data, re.S):
+            segments = [unquote(seg) for seg in urlsplit(path.decode()).path.split("/") if seg]
+            if segments and segments[0] == ACCOUNT_NAME:
+                segments = segments[1:]
+            with self.server.lock:
+                found = self.server.blobs.pop((segments[0], "/".join(segments[1:])), None)
+            status = "202 Accepted" if found is not None else "404 The specified blob does not exist."
+            error = "" if found is not None else "x-ms-error-code: BlobNotFound\r\n"
+            parts.append(
+                f"--batchresponse_stub\r\nContent-Type: application/http\r\nContent-ID: {content_id.decode()}\r\n\r\n"
+                f"HTTP/1.1 {status}\r\n{error}x-ms-request-id: stub\r\nx-ms-version: 2023-11-03\r\nContent-Length: 0\r\n\r\n"
+            )
+        with self.server.lock:
+            self.server.batches += 1
+        body = ("".join(parts) + "--batchresponse_stub--\r\n").encode()
+        self._reply(202, {"Content-Type": "multipart/mixed; boundary=batchresponse_stub"}, body)
+
+    def _list(self, container):
+        with self.server.lock:
+            self.server.requests += 1
+            entries = sorted((blob, entry) for (c, blob), entry in self.server.blobs.items() if c == container)
+        items = "".join(
+            f"<Blob><Name>{blob}</Name><Properties>"
+            f"<Last-Modified>{formatdate(entry['modified'], usegmt=True)}</Last-Modified>"
+            f"<Etag>0x8D000000000000</Etag><Content-Length>{entry['size']}</Content-Length>"
+            f"<BlobType>BlockBlob</BlobType></Properties></Blob>"
+            for blob, entry in entries
+        )
+        body = (
+            f'<?xml version="1.0" encoding="utf-8"?><EnumerationResults ContainerName="{container}">'
+            f"<Blobs>{items}</Blobs><NextMarker /></EnumerationResults>"
+        ).encode()
+        self._reply(200, {"Content-Type": "application/xml"}, body)
+
+    def do_HEAD(self):
+        self._get(head=True)
+
+    def do_GET(self):
+        self._get(head=False)
+
+    def _get(self, head):
+        container, blob, query = self._target()
+        if blob is None and query.get("comp", [None])[0] == "list":
+            return self._list(container)
+        with self.server.lock:
+            self.server.requests += 1
+            entry = self.server.blobs.get((container, blob))
+        if entry is None:
+            return self._not_found()
+        data, size = entry["data"], entry["size"]
+        headers = {
+            "Content-Type": entry["content_type"],
+            "ETag": '"0x8D000000000000"',
+            "Last-Modified": formatdate(usegmt=True),
+            "x-ms-blob-type": "BlockBlob",
+            "Accept-Ranges": "bytes",
+        }
+        range_header = self.headers.get("x-ms-range") or self.headers.get("Range")
+        if range_header and not head:
+            start, _, end = range_header.split("=", 1)[1].partition("-")
+            start = int(start)
+            end = min(int(end) if end else size - 1, size - 1)
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            return self._reply(206, headers, data[start:end + 1])
+        if head:
+            self.send_response(200)
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.send_header("x-ms-request-id", "stub")
+            self.send_header("Content-Length", str(size))
+            self.end_headers()
+            return
+        self._reply(200, headers, data)
+
+
+class AzuriteStub:
+    """Serveur Blob local, démarré dans un thread (utilisable comme context manager)."""
+
+    def __init__(self, container="content", discard_content=False):
+        self.container = container
+        self.server = _StubServer(("127.0.0.1", 0), _Handler, discard_content=discard_content)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/{ACCOUNT_NAME}"
+
+    @property
+    def connection_string(self):
+        return (
+            f"DefaultEndpointsProtocol=http;AccountName={ACCOUNT_NAME};"
+            f"AccountKey={ACCOUNT_KEY};BlobEndpoint={self.endpoint};"
+        )
+
+    @property
+    def connections(self):
+        return self.server.connections
+
+    @property
+    def batches(self):
+        return self.server.batches
+
+    @property
+    def blobs(self):
+        return {blob: entry for (container, blob), entry in self.server.blobs.items() if container == self.container}
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -1,30 +1,54 @@
+import asyncio
+import hashlib
+from contextlib import contextmanager
 from fastapi.testclient import TestClient
-from sqlmodel import Session, SQLModel, create_engine, select
+from sqlalchemy import delete, event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel.pool import StaticPool
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 from ..routes import courses
+from ..routes.quiz import QuestionPayload, bulk_insert_questions
 
 from backend.main import app
-from ..database import get_session
-from ..models import Course, Quiz, QuizQuestion, QuizChoice
+from ..database import get_async_session
+from ..models import Course, Quiz
 
-# Config de la db de test
-engine = create_engine(
-    "sqlite://", 
+# Config de la db de test (même chemin asynchrone que la prod, pilote aiosqlite)
+async_engine = create_async_engine(
+    "sqlite+aiosqlite://", 
     connect_args={"check_same_thread": False}, 
     poolclass=StaticPool
 )
+# Moteur synchrone sous-jacent : sert aux écouteurs d'événements
+engine = async_engine.sync_engine
 
 def create_test_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    async def create_all():
+        async with async_engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+    asyncio.run(create_all())
 
-def get_test_session():
-    with Session(engine) as session:
+async def get_test_session():
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
         yield session
 
-# Override de la dépendance get_session pour utiliser get_test_session et utiliser la db de test
-app.dependency_overrides[get_session] = get_test_session
+# Override de la dépendance get_async_session pour utiliser get_test_session et utiliser la db de test
+app.dependency_overrides[get_async_session] = get_test_session
+
+@contextmanager
+def count_queries():
+    """Compte les requêtes SQL envoyées à la db de test"""
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
 
 @pytest.fixture(name="client")
 def client_fixture():
@@ -51,22 +75,20 @@ def test_lesson_creation_with_mocked_upload(client: TestClient):
     }
 
 
-    with patch.object(courses, "upload_file_to_blob") as mock_upload:
-        # Valeur aléatoire, un UUID sera généré par l'API
-        mock_upload.return_value = "peu_importe.pdf" 
+    from ..services import blob_service
 
+    with patch.object(blob_service, "upload_file_to_blob_async") as mock_upload, \
+         patch.object(blob_service, "get_blob_info_async", return_value=None):
         response = client.post("/api/lessons", data=data, files=files)
 
         assert response.status_code == 200
         json_data = response.json()
         
-        # Récupération du nom du fichier généré
+        # Le nom du fichier est l'empreinte SHA-256 du contenu
         generated_filename = json_data["content_url"]
-        
-        assert generated_filename.endswith(".pdf")
-        assert len(generated_filename) > 20 
+        assert generated_filename == hashlib.sha256(file_content).hexdigest() + ".pdf"
 
-        # CRUCIAL : On vérifie que le mock a été appelé avec ce nom généré précis
+        # CRUCIAL : On vérifie que le mock a été appelé avec ce nom précis
         # args[0] = file_content, args[1] = filename
         args, _ = mock_upload.call_args
         assert args[1] == generated_filename
@@ -116,26 +138,699 @@ def test_full_quiz_flow(client: TestClient):
     assert result["passed"] is True
     assert result["quiz_title"] == "Quiz Python Base"
 
-# Test de la suppression de cours avec nettoyage des ressources Azure
+# Test de la suppression de cours : les fichiers partent dans l'outbox, supprimés ensuite en arrière-plan
 def test_delete_course_cleans_resources(client: TestClient):
+    from datetime import datetime, timedelta
+    from ..models import BlobDeletion
+    from ..services.blob_cleanup import BlobCleanupWorker, backoff_delay
+
+    def session_factory():
+        return AsyncSession(async_engine, expire_on_commit=False)
+
+    async def outbox():
+        async with session_factory() as session:
+            return (await session.exec(select(BlobDeletion).where(BlobDeletion.blob_name == blob_name))).all()
 
     create_resp = client.post("/api/courses", json={"title": "Cours à supprimer", "slug": "delete-me"})
     course_id = create_resp.json()["id"]
 
-    with patch.object(courses, "upload_file_to_blob") as mock_upload:
+    with patch.object(courses, "upload_deduplicated_async") as mock_upload:
         mock_upload.return_value = "todelete.pdf"
         files = {"file": ("todelete.pdf", b"data", "application/pdf")}
         client.post("/api/lessons", 
                     data={"course_id": course_id, "title": "L", "content_type": "pdf"}, 
                     files=files)
+    blob_name = client.get(f"/api/courses/{course_id}/lessons").json()[0]["content_url"]
 
-    with patch.object(courses, "delete_file_from_blob") as mock_delete:
-        # On simule que la suppression Azure a marché
-        mock_delete.return_value = True 
-        
-        response = client.delete(f"/api/courses/{course_id}")
+    # La route répond sans appeler Azure
+    response = client.delete(f"/api/courses/{course_id}")
+    assert response.status_code == 200
+    assert client.get(f"/api/courses/{course_id}").status_code == 404
+    assert [row.attempts for row in asyncio.run(outbox())] == [0]
+
+    # Premier essai en échec : la ligne reste, avec un délai avant le suivant
+    worker = BlobCleanupWorker()
+    calls = []
+    async def failing(names):
+        calls.append(names)
+        return {name: "HTTP 503" for name in names}
+    async def working(names):
+        calls.append(names)
+        return {}
+
+    now = datetime.utcnow()
+    assert asyncio.run(worker.run_once(session_factory, failing, now=now)) == (0, 1)
+    (row,) = asyncio.run(outbox())
+    assert (row.attempts, row.last_error) == (1, "HTTP 503")
+    assert row.next_attempt_at == now + timedelta(seconds=backoff_delay(1))
+    assert backoff_delay(3) == 4 * backoff_delay(1)
+
+    # Pas encore échue : rien n'est retenté
+    assert asyncio.run(worker.run_once(session_factory, working, now=now)) == (0, 0)
+    later = now + timedelta(seconds=backoff_delay(1))
+    assert asyncio.run(worker.run_once(session_factory, working, now=later)) == (1, 0)
+    assert asyncio.run(outbox()) == []
+    assert calls == [[blob_name], [blob_name]]
+
+# Cours sans leçon ni quiz : la suppression répond 200 (invalidations publiées pour des listes vides)
+def test_delete_course_without_lessons(client: TestClient):
+    course_id = client.post("/api/courses", json={"title": "Cours vide", "slug": "cours-vide"}).json()["id"]
+    assert client.delete(f"/api/courses/{course_id}").status_code == 200
+    assert client.get(f"/api/courses/{course_id}").status_code == 404
+
+# Test de l'upload via la route async, contre le bouchon Blob local
+def test_upload_route_uses_pooled_async_client(client: TestClient):
+    from ..services import blob_service
+    from .azurite_stub import AzuriteStub
+
+    with AzuriteStub() as stub:
+        blob_service.set_storage_manager(blob_service.StorageClientManager(connection_string=stub.connection_string))
+        try:
+            response = client.post("/api/upload", files={"file": ("support.pdf", b"%PDF-1.4", "application/pdf")})
+        finally:
+            blob_service.set_storage_manager(None)
+
+    assert response.status_code == 200
+    filename = response.json()["filename"]
+    assert filename.endswith(".pdf")
+    assert stub.blobs[filename]["size"] == len(b"%PDF-1.4")
+
+
+# Test du rejet des fichiers trop volumineux
+def test_upload_rejects_oversized_file(client: TestClient):
+    from ..routes import storage
+
+    with patch.object(storage, "MAX_UPLOAD_SIZE", 10), patch.object(storage, "upload_deduplicated_async") as mock_upload:
+        response = client.post("/api/upload", files={"file": ("gros.mp4", b"x" * 100, "video/mp4")})
+
+    assert response.status_code == 413
+    mock_upload.assert_not_called()
+
+
+def _quiz_payload(course_id: int, nb_questions: int, title: str = "Quiz"):
+    return {
+        "title": title,
+        "course_id": course_id,
+        "questions": [
+            {
+                "text": f"Question {i}",
+                "points": 1,
+                "choices": [
+                    {"text": "Faux", "is_correct": False},
+                    {"text": "Vrai", "is_correct": True},
+                    {"text": "Autre", "is_correct": False},
+                ]
+            }
+            for i in range(nb_questions)
+        ]
+    }
+
+# Le payload élève se charge en une requête, puis sort du snapshot sans toucher la BDD
+def test_student_quiz_payload_single_query_and_snapshot(client: TestClient):
+    course_id = client.post("/api/courses", json={"title": "Quiz N+1", "slug": "quiz-n-plus-1"}).json()["id"]
+    quiz_id = client.post(f"/api/courses/{course_id}/quiz", json=_quiz_payload(course_id, 40)).json()["id"]
+
+    with count_queries() as statements:
+        first = client.get(f"/api/quiz/{quiz_id}")
+    assert first.status_code == 200
+    assert len(first.json()["questions"]) == 40
+    assert all("is_correct" not in c for q in first.json()["questions"] for c in q["choices"])
+    assert len(statements) == 1
+
+    with count_queries() as statements:
+        second = client.get(f"/api/quiz/{quiz_id}")
+    assert second.json() == first.json()
+    assert statements == []
+
+    with count_queries() as statements:
+        editor = client.get(f"/api/quiz/{quiz_id}/full")
+    assert len(editor.json()["questions"][0]["choices"]) == 3
+    assert "is_correct" in editor.json()["questions"][0]["choices"][0]
+    assert len(statements) == 1
+
+    # Le PUT invalide le snapshot
+    client.put(f"/api/courses/{course_id}/quiz", json=_quiz_payload(course_id, 2, title="Quiz v2"))
+    new_quiz_id = client.get(f"/api/courses/{course_id}/quiz").json()[0]["id"]
+    replaced = client.get(f"/api/quiz/{new_quiz_id}").json()
+    assert replaced["title"] == "Quiz v2"
+    assert len(replaced["questions"]) == 2
+
+    # Le DELETE aussi
+    assert client.delete(f"/api/quiz/{new_quiz_id}").status_code == 200
+    assert client.get(f"/api/quiz/{new_quiz_id}").status_code == 404
+
+# Correction via la clé compilée : 1 requête pour compiler, puis plus aucune
+def test_submit_uses_cached_answer_key_and_batch(client: TestClient):
+    course_id = client.post("/api/courses", json={"title": "Quiz Batch", "slug": "quiz-batch"}).json()["id"]
+    quiz_id = client.post(f"/api/courses/{course_id}/quiz", json=_quiz_payload(course_id, 10)).json()["id"]
+    questions = client.get(f"/api/quiz/{quiz_id}/full").json()["questions"]
+    good = [{"question_id": q["id"], "choice_id": q["choices"][1]["id"]} for q in questions]
+    bad = [{"question_id": q["id"], "choice_id": q["choices"][0]["id"]} for q in questions]
+
+    with count_queries() as statements:
+        first = client.post(f"/api/quiz/{quiz_id}/submit", json=good)
+    assert first.json()["score"] == 10
+    assert len(statements) == 1
+
+    with count_queries() as statements:
+        second = client.post(f"/api/quiz/{quiz_id}/submit", json=bad[:6] + good[6:])
+    assert second.json()["score"] == 4
+    assert second.json()["passed"] is False
+    assert statements == []
+
+    batch = [
+        {"reference": "A", "answers": good},
+        {"reference": "B", "answers": bad},
+        {"reference": "C", "answers": good[:5] + bad[5:]},
+    ]
+    response = client.post(f"/api/quiz/{quiz_id}/submit/batch", json=batch)
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [(r["reference"], r["score"], r["passed"]) for r in results] == [("A", 10, True), ("B", 0, False), ("C", 5, True)]
+    assert client.post("/api/quiz/999999/submit/batch", json=batch).status_code == 404
+
+# Création et mise à jour : nombre de requêtes SQL constant, quelle que soit la taille du quiz
+def test_quiz_writes_use_fixed_number_of_statements(client: TestClient):
+    counts = {}
+    for size in (3, 30):
+        course_id = client.post("/api/courses", json={"title": f"Quiz bulk {size}", "slug": f"quiz-bulk-{size}"}).json()["id"]
+
+        with count_queries() as created:
+            quiz_id = client.post(f"/api/courses/{course_id}/quiz", json=_quiz_payload(course_id, size)).json()["id"]
+
+        before = client.get(f"/api/quiz/{quiz_id}/full").json()
+        payload = _quiz_payload(course_id, size)
+        payload["questions"][0]["text"] = "Question corrigée"      # correction d'une faute
+        payload["questions"][1]["choices"].pop()                   # suppression d'un choix
+        payload["questions"].append(payload["questions"][2])       # ajout d'une question
+
+        with count_queries() as updated:
+            response = client.put(f"/api/courses/{course_id}/quiz", json=payload)
         assert response.status_code == 200
+        assert response.json()["id"] == quiz_id
 
-        assert client.get(f"/api/courses/{course_id}").status_code == 404
-        
-        mock_delete.assert_called()
\ No newline at end of file
+        after = client.get(f"/api/quiz/{quiz_id}/full").json()
+        assert len(after["questions"]) == size + 1
+        assert after["questions"][0]["text"] == "Question corrigée"
+        # Les ids des questions et des choix conservés sont stables
+        assert [q["id"] for q in after["questions"][:size]] == [q["id"] for q in before["questions"]]
+        assert [c["id"] for c in after["questions"][1]["choices"]] == [c["id"] for c in before["questions"][1]["choices"][:2]]
+        assert after["questions"][0]["choices"] == before["questions"][0]["choices"]
+
+        counts[size] = (len(created), len(updated))
+
+    assert counts[3] == counts[30]
+
+# Ids des questions renvoyés par l'INSERT : pas de relecture, chaque question garde ses propres choix
+def test_bulk_insert_questions_uses_returned_ids(client: TestClient):
+    course_id = client.post("/api/courses", json={"title": "Quiz returning", "slug": "quiz-returning"}).json()["id"]
+    quiz_id = client.post(f"/api/courses/{course_id}/quiz", json=_quiz_payload(course_id, 0)).json()["id"]
+    questions = [
+        QuestionPayload(text=f"Question {i}", points=1, choices=[{"text": f"Réponse {i}.{c}", "is_correct": c == i % 2} for c in range(2)])
+        for i in range(5)
+    ]
+
+    async def insert():
+        async with AsyncSession(async_engine) as session:
+            with count_queries() as statements:
+                await bulk_insert_questions(session, quiz_id, questions)
+            await session.commit()
+            return statements
+
+    statements = asyncio.run(insert())
+    assert len(statements) == 2
+    assert not any(s.lstrip().upper().startswith("SELECT") for s in statements)
+    quiz = client.get(f"/api/quiz/{quiz_id}/full").json()
+    assert [[c["text"] for c in q["choices"]] for q in quiz["questions"]] == [
+        [f"Réponse {i}.0", f"Réponse {i}.1"] for i in range(5)
+    ]
+    assert [[c["is_correct"] for c in q["choices"]] for q in quiz["questions"]] == [[i % 2 == 0, i % 2 == 1] for i in range(5)]
+
+# Pagination par curseur, filtres et projection du catalogue
+def test_list_courses_keyset_pagination_filters_and_fields(client: TestClient):
+    for i in range(7):
+        client.post("/api/courses", json={
+            "title": f"Pagination {i}",
+            "slug": f"pagination-{i}",
+            "category": "Cloud" if i % 2 else "Design",
+            "level": "Expert" if i < 3 else "Beginner",
+            "description": "Longue description",
+        })
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 3, "title_prefix": "Pagination"}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/api/courses", params=params).json()
+        seen += [c["slug"] for c in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == [f"pagination-{i}" for i in range(7)]
+
+    cloud = client.get("/api/courses", params={"category": "Cloud", "title_prefix": "Pagination"}).json()["items"]
+    assert [c["slug"] for c in cloud] == ["pagination-1", "pagination-3", "pagination-5"]
+    expert = client.get("/api/courses", params={"level": "Expert", "title_prefix": "Pagination"}).json()["items"]
+    assert len(expert) == 3
+
+    sparse = client.get("/api/courses", params={"fields": "id,title", "title_prefix": "Pagination", "limit": 1}).json()
+    assert set(sparse["items"][0]) == {"id", "title"}
+    assert sparse["next_cursor"]
+
+    assert client.get("/api/courses", params={"fields": "id,secret"}).status_code == 422
+    assert client.get("/api/courses", params={"cursor": "pas-un-curseur"}).status_code == 400
+    assert client.get("/api/courses", params={"title_prefix": "100%"}).json()["items"] == []
+
+# Recherche plein texte : index tenu à jour par les routes de création/modification/suppression
+def test_search_index_follows_writes(client: TestClient, tmp_path):
+    from ..services import search_index as search_module
+
+    # Indexation hors de la boucle d'événements (thread du pool : pas de boucle en cours)
+    reconcile = search_module.search_index.reconcile
+    on_event_loop = []
+
+    def reconcile_in_thread(session, *args):
+        try:
+            asyncio.get_running_loop()
+            on_event_loop.append(True)
+        except RuntimeError:
+            on_event_loop.append(False)
+        return reconcile(session, *args)
+
+    with patch.object(search_module, "SEARCH_INDEX_PATH", str(tmp_path / "index.json")), \
+            patch.object(search_module.search_index, "reconcile", reconcile_in_thread):
+        search_module.search_index.ready = False
+        course_id = client.post("/api/courses", json={
+            "title": "Réseaux et Élasticité",
+            "slug": "reseaux-elasticite",
+            "description": "Équilibrage de charge",
+        }).json()["id"]
+        lesson_id = client.post("/api/lessons", data={
+            "course_id": course_id, "title": "Les sous-réseaux", "content_type": "text",
+            "content_text": "Adresses IPv4 et masques",
+        }).json()["id"]
+
+        results = client.get("/api/search", params={"q": "elasticite"}).json()["results"]
+        assert results[0]["type"] == "course" and results[0]["id"] == course_id
+        assert (tmp_path / "index.json").exists()
+        assert on_event_loop == [False]
+
+        lesson_hits = client.get("/api/search", params={"q": "masq", "type": "lesson"}).json()["results"]
+        assert [r["id"] for r in lesson_hits] == [lesson_id]
+
+        client.put(f"/api/lessons/{lesson_id}", json={
+            "title": "Les sous-réseaux", "content_type": "text", "content_text": "Routage IPv6", "course_id": course_id,
+        })
+        assert client.get("/api/search", params={"q": "masques"}).json()["results"] == []
+        assert client.get("/api/search", params={"q": "ipv6"}).json()["results"][0]["id"] == lesson_id
+
+        client.delete(f"/api/courses/{course_id}")
+        assert client.get("/api/search", params={"q": "routage elasticite"}).json()["results"] == []
+
+# Signature groupée des fichiers d'un cours, URLs stables dans la tranche de temps
+def test_bulk_sign_course_files(client: TestClient):
+    from ..services import blob_service
+
+    course_id = client.post("/api/courses", json={"title": "Signature", "slug": "signature"}).json()["id"]
+    with patch.object(courses, "upload_deduplicated_async", side_effect=["signature-a.pdf", "signature-b.pdf"]):
+        for name in ("a.pdf", "b.pdf"):
+            client.post("/api/lessons", data={"course_id": course_id, "title": name, "content_type": "pdf"},
+                        files={"file": (name, b"%PDF", "application/pdf")})
+    client.post("/api/lessons", data={"course_id": course_id, "title": "Lien", "content_type": "link",
+                                      "content_url": "https://example.com/page"})
+
+    with patch.object(blob_service, "ACCOUNT_NAME", "compte"), patch.object(blob_service, "ACCOUNT_KEY", "Y2xlZg=="):
+        signed = client.post("/api/storage/sign", json={"course_id": course_id}).json()["files"]
+        assert len(signed) == 2
+        assert all(f["content_url_signed"].startswith("https://compte.blob.core.windows.net/") for f in signed)
+
+        detail = client.get(f"/api/lessons/{signed[0]['lesson_id']}").json()
+        assert detail["content_url_signed"] == signed[0]["content_url_signed"]
+
+    assert client.post("/api/storage/sign", json={"course_id": 999999}).status_code == 404
+
+# Routes de lecture chaudes : JSON sérialisé une fois par version du cours, puis servi sans requête de contenu
+def test_hot_reads_serve_cached_json_until_course_changes(client: TestClient):
+    course_id = client.post("/api/courses", json={"title": "JSON en cache", "slug": "json-en-cache"}).json()["id"]
+    lesson_id = client.post("/api/lessons", data={"course_id": course_id, "title": "Leçon é", "content_text": "x"}).json()["id"]
+    client.post(f"/api/courses/{course_id}/quiz", json=_quiz_payload(course_id, 3))
+
+    urls = [f"/api/courses/{course_id}", f"/api/courses/{course_id}/full",
+            f"/api/courses/{course_id}/lessons", f"/api/lessons/{lesson_id}"]
+    first = {url: client.get(url) for url in urls}
+    bundle = first[f"/api/courses/{course_id}/full"].json()
+    assert bundle["lessons"][0] == {"id": lesson_id, "title": "Leçon é", "description": None, "content_type": "text",
+                                    "order": 1024, "course_id": course_id}
+    assert bundle["quizzes"][0]["question_count"] == 3
+    assert first[f"/api/courses/{course_id}"].json()["created_at"] == bundle["created_at"]
+
+    for url in urls:
+        with count_queries() as statements:
+            again = client.get(url)
+        assert again.content == first[url].content
+        assert again.headers["etag"] == first[url].headers["etag"]
+        assert again.headers["content-type"] == "application/json"
+        # Seule la requête de version (ETag) reste
+        assert len(statements) == 1, url
+
+    client.put(f"/api/lessons/{lesson_id}", json={"title": "Renommée", "course_id": course_id})
+    assert client.get(f"/api/courses/{course_id}/full").json()["lessons"][0]["title"] == "Renommée"
+    assert client.get(f"/api/courses/{course_id}/lessons").json()[0]["title"] == "Renommée"
+    assert client.get(f"/api/lessons/{lesson_id}").json()["title"] == "Renommée"
+
+# ETag + 304 : une seule requête légère, et toute écriture sur le cours change l'ETag
+def test_conditional_get_with_course_versions(client: TestClient):
+    course_id = client.post("/api/courses", json={"title": "ETag", "slug": "etag"}).json()["id"]
+    lesson_id = client.post("/api/lessons", data={"course_id": course_id, "title": "Intro", "content_text": "x"}).json()["id"]
+    quiz_id = client.post(f"/api/courses/{course_id}/quiz", json=_quiz_payload(course_id, 3)).json()["id"]
+
+    urls = [f"/api/courses/{course_id}", "/api/courses/etag", f"/api/courses/{course_id}/lessons",
+            f"/api/lessons/{lesson_id}", f"/api/quiz/{quiz_id}", f"/api/quiz/{quiz_id}/full"]
+    etags = {}
+    for url in urls:
+        first = client.get(url)
+        assert first.status_code == 200
+        assert "no-cache" in first.headers["cache-control"]
+        etags[url] = first.headers["etag"]
+
+        with count_queries() as statements:
+            again = client.get(url, headers={"If-None-Match": etags[url]})
+        assert again.status_code == 304
+        assert again.content == b""
+        assert again.headers["etag"] == etags[url]
+        assert len(statements) <= 1
+
+    # Le payload élève en cache répond 304 sans aucune requête
+    with count_queries() as statements:
+        assert client.get(f"/api/quiz/{quiz_id}", headers={"If-None-Match": etags[f"/api/quiz/{quiz_id}"]}).status_code == 304
+    assert statements == []
+    assert client.get(f"/api/courses/{course_id}", headers={"If-None-Match": '"autre"'}).status_code == 200
+
+    # Une modification de leçon fait changer les ETag du cours
+    # (le snapshot élève du quiz, inchangé, reste valide dans ce worker)
+    client.put(f"/api/lessons/{lesson_id}", json={"title": "Intro v2", "course_id": course_id})
+    for url in urls:
+        if url == f"/api/quiz/{quiz_id}":
+            continue
+        response = client.get(url, headers={"If-None-Match": etags[url]})
+        assert response.status_code == 200, url
+        assert response.headers["etag"] != etags[url]
+    assert client.get(f"/api/lessons/{lesson_id}").json()["title"] == "Intro v2"
+
+    # Une modification du quiz invalide aussi le snapshot élève
+    client.put(f"/api/courses/{course_id}/quiz", json=_quiz_payload(course_id, 2, title="Quiz v2"))
+    student = client.get(f"/api/quiz/{quiz_id}", headers={"If-None-Match": etags[f"/api/quiz/{quiz_id}"]})
+    assert student.status_code == 200
+    assert student.json()["title"] == "Quiz v2"
+
+# La page du cours en un appel : 3 requêtes quel que soit le nombre de leçons
+def test_course_bundle_single_round_trip(client: TestClient):
+    course_id = client.post("/api/courses", json={"title": "Bundle", "slug": "bundle"}).json()["id"]
+    for order in (2, 1, 3):
+        client.post("/api/lessons", data={"course_id": course_id, "title": f"Leçon {order}", "order": order,
+                                          "content_text": "texte lourd " * 100})
+    quiz_id = client.post(f"/api/courses/{course_id}/quiz", json=_quiz_payload(course_id, 4)).json()["id"]
+
+    with count_queries() as statements:
+        response = client.get("/api/courses/bundle/full")
+    assert response.status_code == 200
+    assert len(statements) == 3
+
+    bundle = response.json()
+    assert bundle["id"] == course_id
+    assert [lesson["order"] for lesson in bundle["lessons"]] == [1, 2, 3]
+    assert all("content_text" not in lesson for lesson in bundle["lessons"])
+    assert bundle["quizzes"] == [{"id": quiz_id, "title": "Quiz", "description": None, "order": 0, "question_count": 4}]
+
+    with count_queries() as statements:
+        cached = client.get(f"/api/courses/{course_id}/full", headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
+    assert len(statements) == 1
+
+    assert client.get("/api/courses/inconnu/full").status_code == 404
+
+# /metrics : latence par modèle de route et nombre de requêtes SQL de chaque requête HTTP
+def test_metrics_count_sql_queries_per_route(client: TestClient):
+    from prometheus_client.parser import text_string_to_metric_families
+
+    def sample(name, **labels):
+        for family in text_string_to_metric_families(client.get("/metrics").text):
+            for s in family.samples:
+                if s.name == name and all(s.labels.get(k) == v for k, v in labels.items()):
+                    return s.value
+        return 0.0
+
+    route = {"method": "GET", "route": "/api/courses/{slug_or_id}/full"}
+    course_id = client.post("/api/courses", json={"title": "Métriques", "slug": "metriques"}).json()["id"]
+    queries_before = sample("http_request_sql_queries_sum", **route)
+    count_before = sample("http_request_duration_seconds_count", status="200", **route)
+
+    assert client.get(f"/api/courses/{course_id}/full").status_code == 200
+
+    assert sample("http_request_sql_queries_sum", **route) - queries_before == 3
+    assert sample("http_request_duration_seconds_count", status="200", **route) - count_before == 1
+    assert sample("sql_query_duration_seconds_count", operation="SELECT") > 0
+    # Les chemins inconnus sont regroupés (cardinalité bornée)
+    client.get("/pas/une/route/123")
+    assert sample("http_request_duration_seconds_count", method="GET", route="unmatched", status="404") >= 1
+
+# Tentatives écrites par lots (write-behind) et statistiques incrémentales
+def test_quiz_attempts_write_behind_and_stats(client: TestClient):
+    from ..models import QuizAttempt, QuizStats
+    from ..services.attempts import attempt_buffer
+
+    def session_factory():
+        return AsyncSession(async_engine, expire_on_commit=False)
+
+    async def count_rows(model, quiz_id):
+        async with session_factory() as session:
+            return len((await session.exec(select(model).where(model.quiz_id == quiz_id))).all())
+
+    asyncio.run(attempt_buffer.drain(session_factory)) # File laissée par les autres tests
+    course_id = client.post("/api/courses", json={"title": "Stats", "slug": "quiz-stats"}).json()["id"]
+    quiz_id = client.post(f"/api/courses/{course_id}/quiz", json=_quiz_payload(course_id, 4)).json()["id"]
+    questions = client.get(f"/api/quiz/{quiz_id}/full").json()["questions"]
+    good = [{"question_id": q["id"], "choice_id": q["choices"][1]["id"]} for q in questions]
+    bad = [{"question_id": q["id"], "choice_id": q["choices"][0]["id"]} for q in questions]
+
+    with patch.object(attempt_buffer, "max_size", 4):
+        client.post(f"/api/quiz/{quiz_id}/submit", json=good)
+        with count_queries() as statements:
+            client.post(f"/api/quiz/{quiz_id}/submit", json=bad)
+        # Sous le seuil : aucune écriture, mais les stats du worker tiennent compte de la file
+        assert statements == []
+        assert asyncio.run(count_rows(QuizAttempt, quiz_id)) == 0
+        with count_queries() as statements:
+            stats = client.get(f"/api/quiz/{quiz_id}/stats").json()
+        assert len(statements) == 2
+        assert (stats["attempts"], stats["passed"], stats["pass_rate"]) == (2, 1, 0.5)
+
+        # Seuil atteint par l'import : tout le lot est écrit en une transaction
+        batch = [{"reference": "A", "answers": good[:3] + bad[3:]}, {"reference": "B", "answers": bad[:1]}]
+        client.post(f"/api/quiz/{quiz_id}/submit/batch", json=batch)
+        assert len(attempt_buffer) == 0
+        assert asyncio.run(count_rows(QuizAttempt, quiz_id)) == 4
+
+    stats = client.get(f"/api/quiz/{quiz_id}/stats").json()
+    assert (stats["attempts"], stats["passed"], stats["average_score"]) == (4, 2, 7 / 4)
+    assert [(q["answered"], q["correct"]) for q in stats["questions"]] == [(4, 2), (3, 2), (3, 2), (3, 1)]
+    assert stats["questions"][0]["correct_rate"] == 0.5
+
+    # Arrêt du worker : la file est vidée, les agrégats existants sont incrémentés
+    client.post(f"/api/quiz/{quiz_id}/submit", json=good)
+    assert asyncio.run(attempt_buffer.drain(session_factory)) == 1
+    assert client.get(f"/api/quiz/{quiz_id}/stats").json()["attempts"] == 5
+
+    # Suppression du quiz : historique et agrégats partent avec lui
+    assert client.delete(f"/api/quiz/{quiz_id}").status_code == 200
+    assert asyncio.run(count_rows(QuizAttempt, quiz_id)) == 0
+    assert asyncio.run(count_rows(QuizStats, quiz_id)) == 0
+    assert client.get(f"/api/quiz/{quiz_id}/stats").status_code == 404
+
+# Quiz supprimé par un autre worker : ses tentatives en file ne font pas abandonner celles des autres quiz
+def test_attempts_of_deleted_quiz_do_not_poison_the_batch():
+    from ..models import QuizAttempt, QuizStats
+    from ..services.attempts import AttemptBuffer, attempt_row
+    from ..services.invalidation import InvalidationBus
+
+    fk_engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    event.listen(fk_engine.sync_engine, "connect", lambda conn, record: conn.execute("PRAGMA foreign_keys=ON"))
+
+    def session_factory():
+        return AsyncSession(fk_engine, expire_on_commit=False)
+
+    async def scenario():
+        async with fk_engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        async with session_factory() as session:
+            session.add(Course(id=1, title="Cours", slug="cours"))
+            session.add_all([Quiz(id=1, title="Gardé", course_id=1), Quiz(id=2, title="Supprimé", course_id=1)])
+            await session.commit()
+
+        # Deux workers : la suppression publiée par l'un vide la file de l'autre
+        bus = InvalidationBus()
+        first, second = AttemptBuffer(), AttemptBuffer()
+        bus.subscribe("quiz_deleted", first)
+        bus.subscribe("quiz_deleted", second)
+        for buffer in (first, second):
+            buffer.add([attempt_row(quiz_id, 1, 1, True, [(10, True)]) for quiz_id in (1, 2)])
+        bus.publish("quiz_deleted", 2)
+        assert [len(first), len(second)] == [1, 1]
+
+        # Suppression non reçue (message perdu) : l'écriture échoue une fois, puis seules ses tentatives partent
+        third = AttemptBuffer()
+        third.add([attempt_row(quiz_id, 1, 1, True, [(10, True)]) for quiz_id in (1, 2, 1)])
+        async with session_factory() as session:
+            await session.exec(delete(Quiz).where(Quiz.id == 2))
+            await session.commit()
+            assert await third.flush(session) == 0
+            assert [row["quiz_id"] for row in third._pending] == [1, 1]
+            assert await third.flush(session) == 2
+            assert await first.flush(session) == 1
+            stats = await session.get(QuizStats, 1)
+            attempts = (await session.exec(select(QuizAttempt.quiz_id))).all()
+        await fk_engine.dispose()
+        return stats.attempts, attempts
+
+    assert asyncio.run(scenario()) == (3, [1, 1, 1])
+
+# Ordre espacé des leçons et réordonnancement en un appel
+def test_reorder_lessons_rewrites_only_moved_rows(client: TestClient):
+    course_id = client.post("/api/courses", json={"title": "Ordre", "slug": "ordre-lecons"}).json()["id"]
+    ids = [
+        client.post("/api/lessons", data={"course_id": course_id, "title": f"L{i}", "content_text": "x"}).json()["id"]
+        for i in range(6)
+    ]
+    lessons = client.get(f"/api/courses/{course_id}/lessons").json()
+    assert [lesson["id"] for lesson in lessons] == ids
+    assert len({lesson["order"] for lesson in lessons}) == 6
+
+    new_order = [ids[-1]] + ids[:-1]
+    with count_queries() as statements:
+        response = client.patch(f"/api/courses/{course_id}/lessons/order", json={"lesson_ids": new_order})
+    assert response.status_code == 200
+    assert (response.json()["updated"], response.json()["renumbered"]) == (1, False)
+    updates = [s for s in statements if s.lstrip().upper().startswith("UPDATE LESSON")]
+    assert len(updates) == 1
+    assert [lesson["id"] for lesson in client.get(f"/api/courses/{course_id}/lessons").json()] == new_order
+    assert [lesson["id"] for lesson in client.get(f"/api/courses/{course_id}/full").json()["lessons"]] == new_order
+
+    # Liste incomplète ou leçon d'un autre cours : refusé
+    assert client.patch(f"/api/courses/{course_id}/lessons/order", json={"lesson_ids": ids[:-1]}).status_code == 422
+    assert client.patch(f"/api/courses/{course_id}/lessons/order", json={"lesson_ids": ids[:-1] + [999999]}).status_code == 422
+    assert client.patch("/api/courses/999999/lessons/order", json={"lesson_ids": []}).status_code == 404
+
+# Fichier servi par l'API avec requêtes Range ; les morceaux lus sont gardés dans le cache disque
+def test_lesson_content_range_requests_use_chunk_cache(client: TestClient, tmp_path):
+    from ..services import blob_service
+    from ..services.content_proxy import ChunkCache, ContentProxy
+    from .azurite_stub import AzuriteStub
+
+    data = bytes(range(256)) * 40  # 10 240 octets, 10 morceaux de 1 Ko
+    proxy = ContentProxy(ChunkCache(str(tmp_path), max_bytes=4096), chunk_size=1024)
+    course_id = client.post("/api/courses", json={"title": "Vidéo", "slug": "video-range"}).json()["id"]
+    lesson_id = client.post("/api/lessons", data={
+        "course_id": course_id, "title": "Vidéo", "content_type": "video", "content_url": "video.mp4",
+    }).json()["id"]
+    text_id = client.post("/api/lessons", data={"course_id": course_id, "title": "Texte", "content_text": "x"}).json()["id"]
+
+    with AzuriteStub() as stub, patch.object(courses, "content_proxy", proxy):
+        blob_service.set_storage_manager(blob_service.StorageClientManager(connection_string=stub.connection_string, retry_total=0))
+        try:
+            blob_service.upload_file_to_blob(data, "video.mp4", content_type="video/mp4")
+            url = f"/api/lessons/{lesson_id}/content"
+
+            response = client.get(url, headers={"Range": "bytes=1000-2999"})
+            assert response.status_code == 206
+            assert response.content == data[1000:3000]
+            assert response.headers["content-range"] == "bytes 1000-2999/10240"
+            assert response.headers["content-type"] == "video/mp4"
+            assert len(proxy.cache) == 3
+
+            # Même plage : servie par le cache, sans appel au stockage
+            requests_before = stub.server.requests
+            assert client.get(url, headers={"Range": "bytes=1000-2999"}).content == data[1000:3000]
+            assert stub.server.requests == requests_before
+
+            assert client.get(url, headers={"Range": "bytes=-100"}).content == data[-100:]
+            unsatisfiable = client.get(url, headers={"Range": "bytes=20000-"})
+            assert unsatisfiable.status_code == 416
+            assert unsatisfiable.headers["content-range"] == "bytes */10240"
+
+            # Sans Range : fichier entier, le cache reste sous sa limite
+            full = client.get(url)
+            assert full.status_code == 200
+            assert full.content == data
+            assert full.headers["accept-ranges"] == "bytes"
+            assert proxy.cache.size <= 4096
+
+            # If-Range périmé : fichier entier ; If-None-Match : 304
+            assert client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"ancien"'}).status_code == 200
+            assert client.get(url, headers={"If-None-Match": full.headers["etag"]}).status_code == 304
+        finally:
+            blob_service.set_storage_manager(None)
+
+    assert client.get(f"/api/lessons/{text_id}/content").status_code == 404
+    assert client.get("/api/lessons/999999/content").status_code == 404
+
+# Upload adressé par contenu : un fichier identique n'est pas renvoyé, ni supprimé tant qu'une leçon l'utilise
+def test_identical_uploads_are_stored_once_and_reference_counted(client: TestClient):
+    from ..models import BlobDeletion, BlobRef
+    from ..services import blob_service
+    from ..services.blob_cleanup import BlobCleanupWorker
+    from .azurite_stub import AzuriteStub
+
+    def session_factory():
+        return AsyncSession(async_engine, expire_on_commit=False)
+
+    async def state(name):
+        async with session_factory() as session:
+            ref = await session.get(BlobRef, name)
+            queued = (await session.exec(select(BlobDeletion).where(BlobDeletion.blob_name == name))).all()
+            return (ref.refcount if ref else 0), len(queued)
+
+    content = b"%PDF-1.4 support commun " * 1000
+    name = hashlib.sha256(content).hexdigest() + ".pdf"
+    with AzuriteStub() as stub:
+        blob_service.set_storage_manager(blob_service.StorageClientManager(connection_string=stub.connection_string, retry_total=0))
+        try:
+            first = client.post("/api/upload", files={"file": ("support.pdf", content, "application/pdf")})
+            assert first.json()["filename"] == name
+            received = stub.server.bytes_received
+            assert received >= len(content)
+
+            # Même contenu, autre nom de fichier : zéro octet envoyé au stockage
+            second = client.post("/api/upload", files={"file": ("copie.pdf", content, "application/pdf")})
+            assert second.json()["filename"] == name
+            assert stub.server.bytes_received == received
+
+            course_ids = []
+            for i in range(2):
+                course_id = client.post("/api/courses", json={"title": f"Partage {i}", "slug": f"partage-{i}"}).json()["id"]
+                lesson = client.post("/api/lessons", data={"course_id": course_id, "title": "Support", "content_type": "pdf"},
+                                     files={"file": ("support.pdf", content, "application/pdf")}).json()
+                assert lesson["content_url"] == name
+                course_ids.append(course_id)
+            assert stub.server.bytes_received == received
+            assert asyncio.run(state(name)) == (2, 0)
+            assert client.delete(f"/api/upload/{name}").status_code == 409
+
+            # Le fichier sert encore au second cours : pas de suppression
+            client.delete(f"/api/courses/{course_ids[0]}")
+            assert asyncio.run(state(name)) == (1, 0)
+
+            client.delete(f"/api/courses/{course_ids[1]}")
+            assert asyncio.run(state(name)) == (0, 1)
+
+            async def drain():
+                try:
+                    return await BlobCleanupWorker().drain(session_factory)
+                finally:
+                    await blob_service.get_storage_manager().aclose()
+
+            assert asyncio.run(drain()) == 1
+            assert name not in stub.blobs
+        finally:
+            blob_service.set_storage_manager(None)
@@ -0,0 +1,185 @@
+import os
+import time
+import asyncio
+import threading
+import pytest
+
+from ..services import blob_service
+from ..services.blob_service import StorageClientManager
+from .azurite_stub import AzuriteStub
+
+
+@pytest.fixture(name="stub")
+def stub_fixture():
+    with AzuriteStub() as stub:
+        manager = StorageClientManager(connection_string=stub.connection_string, retry_total=0)
+        blob_service.set_storage_manager(manager)
+        yield stub
+        blob_service.set_storage_manager(None)
+
+
+# Plusieurs uploads/suppressions doivent passer par une seule connexion HTTP
+def test_sync_client_reuses_connection(stub: AzuriteStub):
+    for i in range(10):
+        blob_service.upload_file_to_blob(b"contenu", f"fichier-{i}.pdf", content_type="application/pdf")
+    assert blob_service.delete_file_from_blob("fichier-0.pdf") is True
+
+    assert set(stub.blobs) == {f"fichier-{i}.pdf" for i in range(1, 10)}
+    assert stub.blobs["fichier-1.pdf"]["content_type"] == "application/pdf"
+    assert stub.connections == 1
+
+
+def test_async_client_reuses_connection(stub: AzuriteStub):
+    async def scenario():
+        for i in range(10):
+            await blob_service.upload_file_to_blob_async(b"video", f"video-{i}.mp4")
+        deleted = await blob_service.delete_file_from_blob_async("video-0.mp4")
+        await blob_service.get_storage_manager().aclose()
+        return deleted
+
+    assert asyncio.run(scenario()) is True
+    assert len(stub.blobs) == 9
+    assert stub.connections == 1
+
+
+def test_delete_missing_blob_returns_false(stub: AzuriteStub):
+    from prometheus_client import REGISTRY
+
+    def failed_deletes():
+        return REGISTRY.get_sample_value(
+            "blob_operation_duration_seconds_count", {"operation": "delete", "outcome": "error"}
+        ) or 0
+
+    before = failed_deletes()
+    assert blob_service.delete_file_from_blob("inexistant.pdf") is False
+    # L'échec est chronométré et compté comme erreur
+    assert failed_deletes() == before + 1
+
+
+class _SyntheticFile:
+    """Fichier virtuel de `size` octets, généré à la volée (jamais entièrement en mémoire)"""
+
+    def __init__(self, size: int):
+        self.remaining = size
+        self.pattern = bytes(range(256)) * 4096  # 1 Mo
+
+    def read(self, n: int = -1) -> bytes:
+        n = self.remaining if n is None or n < 0 else min(n, self.remaining)
+        self.remaining -= n
+        full, rest = divmod(n, len(self.pattern))
+        return self.pattern * full + self.pattern[:rest]
+
+
+def _rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def test_streaming_upload_commits_blocks(stub: AzuriteStub):
+    data = _SyntheticFile(10 * 1024 * 1024 + 123)
+    sent = blob_service.upload_stream_to_blob(data, "gros.mp4", content_type="video/mp4", block_size=1024 * 1024)
+
+    assert sent == 10 * 1024 * 1024 + 123
+    assert stub.blobs["gros.mp4"]["size"] == sent
+    assert stub.blobs["gros.mp4"]["content_type"] == "video/mp4"
+
+
+def test_streaming_upload_rejects_oversized_file(stub: AzuriteStub):
+    with pytest.raises(blob_service.UploadTooLargeError):
+        blob_service.upload_stream_to_blob(_SyntheticFile(5 * 1024 * 1024), "trop-gros.mp4", block_size=1024 * 1024, max_size=3 * 1024 * 1024)
+    assert "trop-gros.mp4" not in stub.blobs
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="mesure RSS via /proc uniquement")
+def test_streaming_upload_memory_is_bounded():
+    size = int(os.getenv("UPLOAD_RSS_TEST_SIZE", str(300 * 1024 * 1024)))
+    block_size, concurrency = 4 * 1024 * 1024, 4
+
+    with AzuriteStub(discard_content=True) as stub:
+        blob_service.set_storage_manager(StorageClientManager(connection_string=stub.connection_string, retry_total=0))
+        try:
+            baseline = _rss_bytes()
+            peak = baseline
+            stop = threading.Event()
+
+            def sample():
+                nonlocal peak
+                while not stop.is_set():
+                    peak = max(peak, _rss_bytes())
+                    time.sleep(0.01)
+
+            sampler = threading.Thread(target=sample)
+            sampler.start()
+            try:
+                sent = blob_service.upload_stream_to_blob(
+                    _SyntheticFile(size), "video.mp4", block_size=block_size, max_concurrency=concurrency
+                )
+            finally:
+                stop.set()
+                sampler.join()
+        finally:
+            blob_service.set_storage_manager(None)
+
+        assert sent == size
+        assert stub.blobs["video.mp4"]["size"] == size
+
+    # Quelques copies par bloc en vol (SDK + socket), indépendamment de la taille du fichier
+    assert peak - baseline < block_size * (concurrency + 1) * 4
+
+
+def test_sas_urls_are_cached_per_time_bucket():
+    from datetime import datetime, timedelta, timezone
+    from unittest.mock import patch
+    from urllib.parse import parse_qs, urlsplit
+
+    blob_service.sas_cache.clear()
+    start = datetime(2026, 1, 1, 12, 0, 5, tzinfo=timezone.utc)
+    with patch.object(blob_service, "ACCOUNT_NAME", "compte"), \
+         patch.object(blob_service, "ACCOUNT_KEY", "Y2xlZg=="), \
+         patch.object(blob_service, "SAS_BUCKET_SECONDS", 600), \
+         patch.object(blob_service, "SAS_VALIDITY_SECONDS", 3600), \
+         patch.object(blob_service, "generate_blob_sas", wraps=blob_service.generate_blob_sas) as signer:
+        first = blob_service.generate_sas_url("cours.pdf", now=start)
+        # Même tranche : URL identique, sans nouvelle signature
+        assert blob_service.generate_sas_url("cours.pdf", now=start + timedelta(minutes=9)) == first
+        assert signer.call_count == 1
+
+        # Tranche suivante : rotation
+        rotated = blob_service.generate_sas_url("cours.pdf", now=start + timedelta(minutes=10))
+        assert rotated != first
+        assert signer.call_count == 2
+
+    # L'URL expire une heure après le début de sa tranche : il reste toujours >= 50 min à l'émission
+    expiry = parse_qs(urlsplit(first).query)["se"][0]
+    assert expiry == "2026-01-01T13:00:00Z"
+    blob_service.sas_cache.clear()
+
+
+# Suppression par lots (API Blob Batch) et repérage des orphelins
+def test_batch_delete_and_orphan_listing(stub: AzuriteStub):
+    from datetime import datetime, timedelta, timezone
+    from ..services.blob_cleanup import find_orphans
+
+    for i in range(300):
+        blob_service.upload_file_to_blob(b"x", f"fichier-{i}.pdf")
+
+    listing = list(blob_service.list_container_blobs())
+    assert len(listing) == 300
+    referenced = {f"fichier-{i}.pdf" for i in range(10)}
+    pending = {"fichier-10.pdf"}
+    orphans = find_orphans(listing, referenced, pending, timedelta(0))
+    assert len(orphans) == 289 and "fichier-10.pdf" not in orphans
+    # Fichiers récents : peut-être un upload dont la leçon n'est pas encore créée
+    assert find_orphans(listing, referenced, pending, timedelta(hours=1)) == []
+    old = datetime.now(timezone.utc) + timedelta(hours=2)
+    assert len(find_orphans(listing, referenced, pending, timedelta(hours=1), now=old)) == 289
+
+    async def scenario():
+        failures = await blob_service.delete_blobs_batch(orphans + ["deja-supprime.pdf"])
+        await blob_service.get_storage_manager().aclose()
+        return failures
+
+    # Un fichier déjà absent n'est pas un échec ; 290 suppressions = 2 appels
+    assert asyncio.run(scenario()) == {}
+    assert stub.batches == 2
+    assert set(stub.blobs) == referenced | pending
@@ -0,0 +1,59 @@
+import os
+import pytest
+
+from ..services.content_proxy import ChunkCache, RangeNotSatisfiable, parse_range
+
+
+def test_parse_range():
+    assert parse_range(None, 1000) is None
+    assert parse_range("bytes=0-99", 1000) == (0, 99)
+    assert parse_range("bytes=900-", 1000) == (900, 999)
+    assert parse_range("bytes=900-5000", 1000) == (900, 999)
+    assert parse_range("bytes=-100", 1000) == (900, 999)
+    assert parse_range("bytes=-5000", 1000) == (0, 999)
+    # Illisible ou plusieurs plages : fichier entier
+    assert parse_range("bytes=abc", 1000) is None
+    assert parse_range("bytes=0-10,20-30", 1000) is None
+    assert parse_range("items=0-10", 1000) is None
+    assert parse_range("bytes=50-10", 1000) is None
+    for header in ("bytes=1000-", "bytes=-0"):
+        with pytest.raises(RangeNotSatisfiable):
+            parse_range(header, 1000)
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=-10", 0)
+
+
+def test_chunk_cache_evicts_least_recently_used(tmp_path):
+    cache = ChunkCache(str(tmp_path), max_bytes=300)
+    keys = [ChunkCache.key("video.mp4", '"etag"', i) for i in range(4)]
+    for key in keys[:3]:
+        cache.put(key, b"x" * 100)
+    assert cache.get(keys[0]) == b"x" * 100      # keys[0] redevient le plus récent
+
+    cache.put(keys[3], b"y" * 100)
+    assert cache.get(keys[1]) is None
+    assert sorted(os.listdir(tmp_path)) == sorted([keys[0], keys[2], keys[3]])
+    assert cache.size == 300
+
+    # Un morceau plus gros que tout le cache n'est pas gardé
+    cache.put(ChunkCache.key("gros.mp4", '"etag"', 0), b"z" * 301)
+    assert len(cache) == 3
+    # Autre ETag (fichier réécrit) : autre clé
+    assert ChunkCache.key("video.mp4", '"autre"', 0) != keys[0]
+
+
+def test_chunk_cache_reloads_from_disk(tmp_path):
+    cache = ChunkCache(str(tmp_path), max_bytes=1000)
+    for i in range(5):
+        cache.put(f"morceau-{i}", bytes([i]) * 100)
+
+    # Redémarrage avec une limite plus basse : les plus anciens sont retirés
+    restarted = ChunkCache(str(tmp_path), max_bytes=250)
+    assert restarted.get("morceau-4") == bytes([4]) * 100
+    assert restarted.size == 200
+    assert sorted(os.listdir(tmp_path)) == ["morceau-3", "morceau-4"]
+
+    # Morceau écrit par un autre worker sur le même dossier : lu et compté
+    ChunkCache(str(tmp_path), max_bytes=1000).put("morceau-9", b"9" * 50)
+    assert restarted.get("morceau-9") == b"9" * 50
+    assert restarted.size == 250
@@ -0,0 +1,158 @@
+import os
+import asyncio
+from datetime import datetime, timedelta
+
+import aiohttp
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..models import BlobDeletion, BlobRef, PendingUpload
+from ..services import blob_service
+from ..services.blob_cleanup import BlobCleanupWorker, expire_pending_uploads
+from ..services.local_storage import FilesystemStorage
+from .test_api import async_engine, client_fixture  # noqa: F401
+
+
+@pytest.fixture(name="storage")
+def storage_fixture(tmp_path):
+    from ..benchmarks.bench_async import free_port
+
+    port = free_port()
+    storage = FilesystemStorage(root=str(tmp_path / "stockage"), secret=b"secret-de-test", public_url=f"http://127.0.0.1:{port}/files")
+    storage.port = port
+    blob_service.set_storage_backend(storage)
+    yield storage
+    blob_service.set_storage_backend(None)
+
+
+def put_files(storage: FilesystemStorage, uploads):
+    """Envoie chaque (upload, contenu, en-têtes modifiés) au serveur de fichiers ; retourne les statuts HTTP"""
+    async def scenario():
+        await storage.start(host="127.0.0.1", port=storage.port)
+        try:
+            statuses = []
+            async with aiohttp.ClientSession() as http:
+                for upload, content, headers in uploads:
+                    async with http.request(upload["method"], upload["url"], data=content,
+                                            headers={**upload["headers"], **headers}) as response:
+                        statuses.append(response.status)
+            return statuses
+        finally:
+            await storage.aclose()
+
+    return asyncio.run(scenario())
+
+
+# Le fichier va directement au stockage ; l'API vérifie l'envoi puis crée la leçon
+def test_direct_upload_creates_lesson(client: TestClient, storage: FilesystemStorage):
+    course_id = client.post("/api/courses", json={"title": "Cours direct", "slug": "cours-direct"}).json()["id"]
+    content = b"%PDF-1.4 " + b"x" * 5000
+
+    def initiate(size=len(content), filename="support.pdf"):
+        response = client.post("/api/uploads/initiate", json={
+            "course_id": course_id, "filename": filename, "size": size, "mime_type": "application/pdf",
+        })
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    upload, short, other = initiate(), initiate(size=100), initiate()
+    assert upload["filename"].endswith(".pdf")
+    forged = {**upload, "url": upload["url"].replace("max=", "max=9")}
+    statuses = put_files(storage, [
+        (forged, content, {}),                            # taille max modifiée : signature invalide
+        (short, content, {}),                             # plus gros qu'annoncé
+        (other, content, {"Content-Type": "text/html"}),  # autre type que celui signé
+        (upload, content, {}),
+        (upload, b"remplacement", {}),                    # URL rejouée : pas d'écrasement
+    ])
+    assert statuses == [403, 413, 415, 201, 409]
+    assert os.listdir(storage.temp_dir) == []
+
+    # Finalisation avant l'envoi : le fichier n'est pas encore là
+    assert client.post("/api/uploads/complete", json={"upload_id": other["upload_id"], "title": "Trop tôt"}).status_code == 409
+
+    response = client.post("/api/uploads/complete", json={"upload_id": upload["upload_id"], "title": "Support direct"})
+    assert response.status_code == 200, response.text
+    lesson = response.json()
+    assert (lesson["content_type"], lesson["content_url"], lesson["course_id"]) == ("pdf", upload["filename"], course_id)
+    assert client.get(f"/api/lessons/{lesson['id']}/content").content == content
+    # Une seule finalisation
+    assert client.post("/api/uploads/complete", json={"upload_id": upload["upload_id"], "title": "Doublon"}).status_code == 404
+
+    # Fichier d'une autre taille que celle annoncée : upload annulé, fichier envoyé à l'outbox
+    mismatch = initiate(size=len(content) + 1)
+    assert put_files(storage, [(mismatch, content, {})]) == [201]
+    response = client.post("/api/uploads/complete", json={"upload_id": mismatch["upload_id"], "title": "Tronqué"})
+    assert response.status_code == 422
+
+    assert client.post("/api/uploads/initiate", json={
+        "course_id": course_id, "filename": "énorme.mp4", "size": blob_service.MAX_UPLOAD_SIZE + 1,
+    }).status_code == 413
+    assert client.post("/api/uploads/initiate", json={"course_id": 999999, "filename": "a.pdf", "size": 1}).status_code == 404
+
+    async def rows():
+        async with AsyncSession(async_engine) as session:
+            refs = (await session.exec(select(BlobRef.blob_name, BlobRef.refcount))).all()
+            deletions = (await session.exec(select(BlobDeletion.blob_name))).all()
+            return refs, deletions
+
+    refs, deletions = asyncio.run(rows())
+    assert (upload["filename"], 1) in refs
+    assert mismatch["filename"] in deletions
+
+
+# Uploads jamais finalisés : la ligne disparaît et le fichier éventuel part dans l'outbox
+def test_abandoned_direct_uploads_expire(client: TestClient, storage: FilesystemStorage):
+    course_id = client.post("/api/courses", json={"title": "Cours abandon", "slug": "cours-abandon"}).json()["id"]
+    upload = client.post("/api/uploads/initiate", json={"course_id": course_id, "filename": "abandon.mp4", "size": 10}).json()
+
+    async def expire(now):
+        async with AsyncSession(async_engine) as session:
+            expired = await expire_pending_uploads(session, now=now)
+            await session.commit()
+            pending = (await session.exec(select(PendingUpload.id))).all()
+            deletions = (await session.exec(select(BlobDeletion.blob_name))).all()
+            return expired, pending, deletions
+
+    # URL encore valable (ou tout juste expirée) : l'upload est conservé
+    expired, pending, _ = asyncio.run(expire(datetime.utcnow()))
+    assert expired == 0 and upload["upload_id"] in pending
+
+    expired, pending, deletions = asyncio.run(expire(datetime.utcnow() + timedelta(days=1)))
+    assert expired >= 1
+    assert upload["upload_id"] not in pending
+    assert upload["filename"] in deletions
+    assert client.post("/api/uploads/complete", json={"upload_id": upload["upload_id"], "title": "Trop tard"}).status_code == 404
+
+
+# Upload identique pendant que le worker supprime le fichier : refusé (409), puis renvoyé ; jamais de leçon sans fichier
+def test_identical_upload_during_blob_deletion(client: TestClient, storage: FilesystemStorage):
+    content = b"%PDF-1.4 " + b"y" * 3000
+
+    def create_lesson(course_id):
+        return client.post("/api/lessons", data={"course_id": course_id, "title": "Support", "content_type": "pdf"},
+                           files={"file": ("support.pdf", content, "application/pdf")})
+
+    deleted_course = client.post("/api/courses", json={"title": "Cours supprimé", "slug": "cours-supprime"}).json()["id"]
+    course_id = client.post("/api/courses", json={"title": "Cours suivant", "slug": "cours-suivant"}).json()["id"]
+    name = create_lesson(deleted_course).json()["content_url"]
+    client.delete(f"/api/courses/{deleted_course}")
+
+    during = []
+
+    async def deleter(names):
+        # Suppression réservée : le fichier est encore là quand l'upload identique arrive
+        during.append(await asyncio.to_thread(create_lesson, course_id))
+        return await storage.delete_many_async(names)
+
+    deleted, failed = asyncio.run(BlobCleanupWorker().run_once(lambda: AsyncSession(async_engine, expire_on_commit=False), deleter))
+    assert deleted >= 1 and failed == 0
+    assert during[0].status_code == 409
+    assert not os.path.exists(storage.path(name))
+
+    lesson = create_lesson(course_id)
+    assert lesson.status_code == 200, lesson.text
+    assert lesson.json()["content_url"] == name
+    assert os.path.exists(storage.path(name))
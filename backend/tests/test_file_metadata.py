@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import struct
+import zlib
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..services import blob_service
+from ..services.file_metadata import MetadataExtractor
+from ..services.local_storage import FilesystemStorage
+from ..services import media_probe
+from ..services.media_probe import probe_file, probe_pdf, sniff_mime
+from .test_api import async_engine, client_fixture  # noqa: F401
+
+
+def make_pdf(pages: int, text: bytes) -> bytes:
+    """PDF minimal : arbre de pages, un flux de contenu compressé (FlateDecode) par page"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(pages)).encode()
+    objects.append(b"<< /Type /Pages /Kids [" + kids + b"] /Count " + str(pages).encode() + b" >>")
+    for i in range(pages):
+        content = zlib.compress(b"BT /F1 12 Tf 72 712 Td (" + text + b") Tj ET")
+        objects.append(b"<< /Type /Page /Parent 2 0 R /Contents " + str(4 + 2 * i).encode() + b" 0 R >>")
+        objects.append(b"<< /Length " + str(len(content)).encode() + b" /Filter /FlateDecode >>\nstream\n" + content + b"\nendstream")
+    body = b"%PDF-1.4\n"
+    for number, obj in enumerate(objects, start=1):
+        body += f"{number} 0 obj\n".encode() + obj + b"\nendobj\n"
+    return body + b"trailer\n<< /Root 1 0 R >>\n%%EOF\n"
+
+
+def box(kind: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), kind) + payload
+
+
+def make_mp4(duration_ms: int, width: int, height: int) -> bytes:
+    """MP4 minimal, index (moov) en fin de fichier : une piste son puis une piste vidéo"""
+    mvhd = box(b"mvhd", bytes(4) + struct.pack(">IIII", 0, 0, 1000, duration_ms) + bytes(80))
+
+    def trak(handler: bytes, w: int, h: int) -> bytes:
+        tkhd = box(b"tkhd", bytes(76) + struct.pack(">II", w << 16, h << 16))
+        hdlr = box(b"hdlr", bytes(8) + handler + bytes(12) + b"\0")
+        return box(b"trak", tkhd + box(b"mdia", hdlr))
+
+    moov = box(b"moov", mvhd + trak(b"soun", 0, 0) + trak(b"vide", width, height))
+    return box(b"ftyp", b"isom" + bytes(4) + b"isomavc1") + box(b"mdat", bytes(4096)) + moov
+
+
+# Bombe de décompression : mémoire bornée par flux et au total, gros PDF non analysé
+def test_pdf_probe_bounds_decompressed_size(tmp_path, monkeypatch):
+    bomb = zlib.compress(bytes(64 * 1024 * 1024), 9)
+    stream = b"<< /Length " + str(len(bomb)).encode() + b" /Filter /FlateDecode >>\nstream\n" + bomb + b"\nendstream\n"
+    pdf = make_pdf(1, b"Texte") + stream * 4
+
+    sizes = [len(content) for content in media_probe._pdf_streams(pdf, stream_limit=1 << 20, total_limit=3 << 20)]
+    assert sizes[0] < 1024 and sizes[1:] == [1 << 20, 1 << 20, (3 << 20) - sizes[0] - (2 << 20)]
+    assert probe_pdf(pdf) == {"page_count": 1, "text_length": len("Texte")}
+
+    monkeypatch.setattr(media_probe, "MAX_PDF_SIZE", len(pdf) - 1)
+    (tmp_path / "gros.pdf").write_bytes(pdf)
+    assert "page_count" not in probe_file(str(tmp_path / "gros.pdf"))
+
+
+def test_probe_detects_real_type_and_reads_pdf_and_video(tmp_path):
+    assert sniff_mime(b"%PDF-1.7\n") == "application/pdf"
+    assert sniff_mime(b"\x00\x00\x00\x14ftypqt  ") == "video/quicktime"
+    assert sniff_mime(b"RIFF\x00\x00\x00\x00AVI LIST") == "video/x-msvideo"
+    assert sniff_mime(b"\x1aE\xdf\xa3\x9fB\x86\x81\x01B\xf7\x81\x01B\xf2\x81\x04B\xf3\x81\x08B\x82\x84webm") == "video/webm"
+    assert sniff_mime(b"PK\x03\x04" + bytes(26) + b"word/document.xml") == (
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    )
+    assert sniff_mime("Leçon en texte brut".encode()) == "text/plain"
+    assert sniff_mime(b"\x00\x01\x02\xff\xfe") is None
+
+    pdf = make_pdf(3, b"Bonjour \\(monde\\)")
+    (tmp_path / "cours.bin").write_bytes(pdf)
+    result = probe_file(str(tmp_path / "cours.bin"))
+    assert result == {
+        "mime_type": "application/pdf",
+        "sha256": hashlib.sha256(pdf).hexdigest(),
+        "size": len(pdf),
+        "page_count": 3,
+        "text_length": 3 * len("Bonjour (monde)"),
+    }
+
+    (tmp_path / "video.mp4").write_bytes(make_mp4(125_500, 1280, 720))
+    assert probe_file(str(tmp_path / "video.mp4")) == {
+        "mime_type": "video/mp4",
+        "sha256": hashlib.sha256(make_mp4(125_500, 1280, 720)).hexdigest(),
+        "size": len(make_mp4(125_500, 1280, 720)),
+        "container": "mp4",
+        "duration_seconds": 125.5,
+        "width": 1280,
+        "height": 720,
+    }
+
+    # Fichier tronqué dans la piste vidéo : ce qui a pu être lu est gardé, les dimensions sont absentes
+    (tmp_path / "tronque.mp4").write_bytes(make_mp4(1000, 640, 360)[:-60])
+    assert probe_file(str(tmp_path / "tronque.mp4"), complete=False) == {
+        "mime_type": "video/mp4", "container": "mp4", "duration_seconds": 1.0,
+    }
+
+
+@pytest.fixture(name="storage")
+def storage_fixture(tmp_path):
+    storage = FilesystemStorage(root=str(tmp_path / "stockage"), secret=b"secret-de-test")
+    blob_service.set_storage_backend(storage)
+    yield storage
+    blob_service.set_storage_backend(None)
+
+
+# Après l'upload, les métadonnées sont extraites en arrière-plan puis servies avec la leçon
+def test_metadata_extracted_in_process_pool_after_upload(client: TestClient, storage: FilesystemStorage):
+    def session_factory():
+        return AsyncSession(async_engine, expire_on_commit=False)
+
+    course_id = client.post("/api/courses", json={"title": "Cours métadonnées", "slug": "cours-metadonnees"}).json()["id"]
+    pdf = make_pdf(12, b"Introduction")
+    # Extension trompeuse : le type réel vient des octets magiques
+    lesson = client.post(
+        "/api/lessons",
+        data={"course_id": course_id, "title": "Support", "content_type": "pdf"},
+        files={"file": ("support.bin", pdf, "application/octet-stream")},
+    ).json()
+    video = client.post(
+        "/api/lessons",
+        data={"course_id": course_id, "title": "Vidéo", "content_type": "video"},
+        files={"file": ("cours.mp4", make_mp4(2_100_000, 1920, 1080), "video/mp4")},
+    ).json()
+
+    first = client.get(f"/api/lessons/{lesson['id']}")
+    assert first.json()["metadata"]["status"] == "pending"
+
+    extractor = MetadataExtractor(batch_size=1000, workers=2)
+    try:
+        asyncio.run(extractor.run_once(session_factory))
+    finally:
+        asyncio.run(extractor.stop())
+
+    # Nouvel ETag : le client ne garde pas la version "pending"
+    response = client.get(f"/api/lessons/{lesson['id']}", headers={"If-None-Match": first.headers["etag"]})
+    assert response.status_code == 200
+    metadata = response.json()["metadata"]
+    assert metadata["status"] == "done"
+    assert (metadata["mime_type"], metadata["page_count"], metadata["size"]) == ("application/pdf", 12, len(pdf))
+    assert metadata["sha256"] == hashlib.sha256(pdf).hexdigest()
+    assert lesson["content_url"].startswith(metadata["sha256"])
+
+    metadata = client.get(f"/api/lessons/{video['id']}").json()["metadata"]
+    assert (metadata["duration_seconds"], metadata["width"], metadata["height"]) == (2100.0, 1920, 1080)
+
+    # Leçon texte : pas de fichier, pas de métadonnées
+    text = client.post("/api/lessons", data={"course_id": course_id, "title": "Texte", "content_text": "Bonjour"}).json()
+    assert client.get(f"/api/lessons/{text['id']}").json()["metadata"] is None
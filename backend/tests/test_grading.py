@@ -0,0 +1,60 @@
+import random
+
+from ..services.grading import AnswerKey, grade_batch, grade_batch_details, grade_submission
+import numpy as np
+
+
+def _key():
+    # 3 questions : q10 (2 pts, bon choix 101), q20 (1 pt, bon choix 201), q30 (3 pts, bons choix 301 et 302)
+    points = {10: 2, 20: 1, 30: 3}
+    correct = {(10, 101), (20, 201), (30, 301), (30, 302)}
+    correct_sorted = sorted(correct, key=lambda pair: pair[1])
+    return AnswerKey(
+        quiz_id=1,
+        title="Quiz",
+        total_points=6,
+        points=points,
+        correct=frozenset(correct),
+        question_ids=np.array([10, 20, 30]),
+        question_points=np.array([2, 1, 3]),
+        correct_choice_ids=np.array([c for _, c in correct_sorted]),
+        correct_question_ids=np.array([q for q, _ in correct_sorted]),
+    )
+
+
+def test_grade_submission_rules():
+    result = grade_submission(_key(), [(10, 101), (20, 202), (30, 201), (99, 101)])
+    assert result["score"] == 2
+    assert result["passed"] is False
+    # La question 99 n'appartient pas au quiz, le choix 201 n'appartient pas à la question 30
+    assert result["details"] == [
+        {"question_id": 10, "is_correct": True},
+        {"question_id": 20, "is_correct": False},
+        {"question_id": 30, "is_correct": False},
+    ]
+
+
+def test_vectorized_grader_matches_scalar_grader():
+    key = _key()
+    rng = random.Random(42)
+    question_pool = [10, 20, 30, 99]
+    choice_pool = [101, 102, 201, 202, 301, 302, 303, 999]
+    submissions = [
+        [(rng.choice(question_pool), rng.choice(choice_pool)) for _ in range(rng.randint(0, 6))]
+        for _ in range(2000)
+    ]
+
+    scores = grade_batch(key, submissions)
+    expected = [grade_submission(key, s)["score"] for s in submissions]
+    assert scores.tolist() == expected
+    assert grade_batch(key, []).tolist() == []
+
+
+def test_vectorized_details_match_scalar_grader():
+    key = _key()
+    submissions = [[(10, 101), (20, 202), (30, 201), (99, 101)], [], [(30, 302)]]
+    scores, details = grade_batch_details(key, submissions)
+    assert scores.tolist() == [2, 0, 3]
+    for submission, detail in zip(submissions, details):
+        expected = grade_submission(key, submission)["details"]
+        assert detail == [(d["question_id"], d["is_correct"]) for d in expected]
@@ -0,0 +1,160 @@
+import os
+import time
+import socket
+import asyncio
+import multiprocessing
+
+from ..services.cache import LRUCache, invalidate_quiz, quiz_answer_keys, quiz_snapshots
+from ..services.invalidation import InvalidationBus, UnixSocketTransport, invalidation_bus, remove_worker_sockets
+
+# Délai maximal accepté entre une écriture dans un worker et l'éviction dans un autre
+MAX_PROPAGATION_SECONDS = 1.0
+
+
+async def wait_until_evicted(cache: LRUCache, key, timeout: float = 10.0) -> float:
+    deadline = time.monotonic() + timeout
+    while key in cache:
+        assert time.monotonic() < deadline, f"{key} toujours en cache"
+        await asyncio.sleep(0.002)
+    return time.time()
+
+
+def other_worker(directory: str, results):
+    """Autre worker : garde le quiz 8 en cache, modifie le quiz 7, puis attend l'invalidation du quiz 8"""
+    async def run():
+        await invalidation_bus.start(UnixSocketTransport(directory))
+        try:
+            quiz_snapshots.set(8, ('"v1"', b"{}"))
+            results.put(("published", time.time()))
+            invalidate_quiz(7)
+            evicted_at = await wait_until_evicted(quiz_snapshots, 8)
+            results.put(("evicted", evicted_at))
+        finally:
+            await invalidation_bus.stop()
+
+    asyncio.run(run())
+
+
+# Une écriture dans un processus évince le cache de l'autre, dans les deux sens, en un temps borné
+def test_write_in_one_worker_evicts_cache_in_another(tmp_path):
+    directory = str(tmp_path / "bus")
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+
+    async def scenario():
+        await invalidation_bus.start(UnixSocketTransport(directory))
+        process = context.Process(target=other_worker, args=(directory, results))
+        try:
+            quiz_snapshots.set(7, ('"v1"', b"{}"))
+            quiz_answer_keys.set(7, "clé compilée")
+            process.start()
+
+            kind, published_at = await asyncio.to_thread(results.get, timeout=60)
+            assert kind == "published"
+            evicted_at = await wait_until_evicted(quiz_snapshots, 7)
+            assert 7 not in quiz_answer_keys
+            forward = evicted_at - published_at
+
+            published_at = time.time()
+            invalidate_quiz(8)
+            kind, evicted_at = await asyncio.to_thread(results.get, timeout=30)
+            assert kind == "evicted"
+            return forward, evicted_at - published_at
+        finally:
+            await invalidation_bus.stop()
+            await asyncio.to_thread(process.join, 30)
+
+    forward, backward = asyncio.run(scenario())
+    assert forward < MAX_PROPAGATION_SECONDS
+    assert backward < MAX_PROPAGATION_SECONDS
+    # Chaque worker retire son socket à l'arrêt
+    assert os.listdir(directory) == []
+
+
+def test_bus_guards_against_stale_loads_and_dead_workers(tmp_path):
+    bus = InvalidationBus()
+    cache = LRUCache()
+    responses = LRUCache()
+    bus.subscribe("quiz", cache)
+    bus.subscribe("course", responses, keys=lambda course_id: [("bundle", course_id), ("lessons", course_id)])
+
+    # Valeur chargée pendant qu'une invalidation arrivait : pas gardée
+    generation = cache.generation
+    bus.publish("quiz", 3)
+    cache.set(3, "ancienne version", generation=generation)
+    assert 3 not in cache
+    cache.set(3, "nouvelle version", generation=cache.generation)
+    assert cache.get(3) == "nouvelle version"
+
+    responses.set(("bundle", 5), b"{}")
+    responses.set(("lessons", 5), b"[]")
+    responses.set(("bundle", 6), b"{}")
+    bus.publish("course", 5)
+    assert (("bundle", 5) in responses, ("lessons", 5) in responses, ("bundle", 6) in responses) == (False, False, True)
+
+    # Socket d'un worker mort : retiré au premier envoi ; ceux d'un pid arrêté, par le hook gunicorn
+    directory = str(tmp_path / "bus")
+    dead = os.path.join(directory, "999999-mort.sock")
+
+    async def scenario():
+        await bus.start(UnixSocketTransport(directory))
+        try:
+            orphan = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            orphan.bind(dead)
+            orphan.close()
+            bus.publish("quiz", 4)
+            return os.path.exists(dead)
+        finally:
+            await bus.stop()
+
+    assert asyncio.run(scenario()) is False
+    for name in ("4242-a.sock", "4242-b.sock", "42420-c.sock"):
+        open(os.path.join(directory, name), "w").close()
+    remove_worker_sockets(directory, 4242)
+    assert os.listdir(directory) == ["42420-c.sock"]
+
+
+# Worker qui ne lit plus son socket : les envois ne bloquent pas, et les messages perdus vident ses caches
+def test_full_socket_does_not_block_and_lost_messages_resync(tmp_path):
+    directory = str(tmp_path / "bus")
+    sender = InvalidationBus()
+    receiver = InvalidationBus()
+    cache = LRUCache()
+    receiver.subscribe("quiz", cache)
+    stuck_path = os.path.join(directory, "1-bloque.sock")
+
+    async def scenario():
+        transport = UnixSocketTransport(directory)
+        await sender.start(transport)
+        stuck = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            stuck.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+            stuck.bind(stuck_path)
+            stuck.setblocking(False)
+            started = time.monotonic()
+            for quiz_id in range(2000):
+                sender.publish("quiz", quiz_id)
+            elapsed = time.monotonic() - started
+            assert stuck_path in transport._lagging
+
+            # Le worker reprend : il lit ce qui est passé, puis le dernier message renvoyé
+            def drain():
+                while True:
+                    try:
+                        receiver._deliver(stuck.recv(65536))
+                    except BlockingIOError:
+                        return
+            drain()
+            cache.set("sans rapport", 1)
+            transport._resend()
+            drain()
+            return elapsed, stuck_path in transport._lagging
+        finally:
+            stuck.close()
+            await sender.stop()
+
+    elapsed, still_lagging = asyncio.run(scenario())
+    assert elapsed < 1.0
+    assert still_lagging is False
+    # Trou de numérotation : tous les caches abonnés vidés
+    assert "sans rapport" not in cache
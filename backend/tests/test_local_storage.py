@@ -0,0 +1,153 @@
+import io
+import os
+import asyncio
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
+
+import aiohttp
+import pytest
+from fastapi.testclient import TestClient
+
+from ..services import blob_service
+from ..services.blob_service import UploadTooLargeError
+from ..services.local_storage import FilesystemStorage
+from .test_api import client_fixture  # noqa: F401
+
+
+@pytest.fixture(name="storage")
+def storage_fixture(tmp_path):
+    storage = FilesystemStorage(root=str(tmp_path / "stockage"), secret=b"secret-de-test", public_url="http://fichiers.test/files")
+    blob_service.set_storage_backend(storage)
+    blob_service.sas_cache.clear()
+    yield storage
+    blob_service.set_storage_backend(None)
+    blob_service.sas_cache.clear()
+
+
+def test_filesystem_backend_writes_reads_and_deletes(storage: FilesystemStorage):
+    blob_service.upload_file_to_blob(b"%PDF-1.4 contenu", "cours.pdf")
+    # Flux lu bloc par bloc, rangé dans un sous-dossier
+    written = blob_service.upload_stream_to_blob(io.BytesIO(b"v" * 1000), "videos/intro.mp4", block_size=64)
+    assert written == 1000
+
+    async def scenario():
+        info = await blob_service.get_blob_info_async("cours.pdf")
+        part = await blob_service.download_blob_range_async("cours.pdf", 5, 3)
+        missing = await blob_service.get_blob_info_async("absent.pdf")
+        return info, part, missing
+
+    info, part, missing = asyncio.run(scenario())
+    assert (info.size, info.content_type) == (16, "application/pdf")
+    assert part == b"1.4"
+    assert missing is None
+    assert sorted(name for name, _ in blob_service.list_container_blobs()) == ["cours.pdf", "videos/intro.mp4"]
+
+    # Réécriture : nouvel ETag (les morceaux en cache de l'ancienne version ne servent plus)
+    os.utime(storage.path("cours.pdf"), ns=(0, 0))
+    old_etag = asyncio.run(blob_service.get_blob_info_async("cours.pdf")).etag
+    blob_service.upload_file_to_blob(b"%PDF-1.5 contenu", "cours.pdf")
+    assert asyncio.run(blob_service.get_blob_info_async("cours.pdf")).etag != old_etag
+
+    assert blob_service.delete_file_from_blob("cours.pdf") is True
+    assert blob_service.delete_file_from_blob("cours.pdf") is False
+    # Lot : un fichier déjà absent compte comme supprimé
+    assert asyncio.run(blob_service.delete_blobs_batch(["videos/intro.mp4", "absent.pdf", "../passwd"])) == {
+        "../passwd": "Nom de fichier invalide : '../passwd'",
+    }
+    assert list(blob_service.list_container_blobs()) == []
+
+
+def test_filesystem_writes_are_atomic(storage: FilesystemStorage):
+    blob_service.upload_file_to_blob(b"ancienne version", "support.pdf")
+
+    class Broken(io.BytesIO):
+        def read(self, size=-1):
+            if self.tell() >= 100:
+                raise ConnectionResetError("client parti")
+            return super().read(size)
+
+    # Upload interrompu : l'ancienne version reste intacte, aucun fichier temporaire ne traîne
+    with pytest.raises(ConnectionResetError):
+        blob_service.upload_stream_to_blob(Broken(b"x" * 1000), "support.pdf", block_size=50)
+    with pytest.raises(UploadTooLargeError):
+        blob_service.upload_stream_to_blob(io.BytesIO(b"x" * 1000), "support.pdf", block_size=50, max_size=500)
+    with open(storage.path("support.pdf"), "rb") as f:
+        assert f.read() == b"ancienne version"
+    assert os.listdir(storage.temp_dir) == []
+
+    for name in ("../hors.pdf", "/etc/passwd", ".tmp/x", "a//b", ""):
+        with pytest.raises(ValueError):
+            storage.path(name)
+
+
+def test_signed_urls_expire_and_cannot_be_forged(storage: FilesystemStorage):
+    now = datetime(2026, 1, 1, 12, 0, 5, tzinfo=timezone.utc)
+    url = blob_service.generate_sas_url("dossier/cours.pdf", now=now)
+    parts = urlsplit(url)
+    assert url.startswith("http://fichiers.test/files/dossier/cours.pdf?")
+    query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+
+    assert storage.verify("dossier/cours.pdf", query["exp"], query["sig"], now=now)
+    # Expirée, signée pour un autre fichier, autre expiration ou autre secret : refusée
+    assert not storage.verify("dossier/cours.pdf", query["exp"], query["sig"], now=now + timedelta(hours=2))
+    assert not storage.verify("dossier/autre.pdf", query["exp"], query["sig"], now=now)
+    assert not storage.verify("dossier/cours.pdf", int(query["exp"]) + 3600, query["sig"], now=now)
+    assert not storage.verify("dossier/cours.pdf", "demain", query["sig"], now=now)
+    other = FilesystemStorage(root=storage.root, secret=b"autre secret")
+    assert not other.verify("dossier/cours.pdf", query["exp"], query["sig"], now=now)
+
+
+# Le serveur de fichiers envoie le contenu avec os.sendfile et gère Range
+def test_file_server_uses_sendfile(storage: FilesystemStorage):
+    from ..benchmarks.bench_async import free_port
+
+    content = bytes(range(256)) * 4096
+    blob_service.upload_file_to_blob(content, "video.mp4")
+    port = free_port()
+    storage.public_url = f"http://127.0.0.1:{port}/files"
+    url = blob_service.generate_sas_url("video.mp4")
+
+    async def scenario():
+        await storage.start(host="127.0.0.1", port=port)
+        try:
+            async with aiohttp.ClientSession() as http:
+                async with http.get(url) as response:
+                    full = (response.status, response.headers["Content-Type"], await response.read())
+                async with http.get(url, headers={"Range": "bytes=1000-1999"}) as response:
+                    part = (response.status, response.headers["Content-Range"], await response.read())
+                async with http.get(url.replace("sig=", "sig=0")) as response:
+                    forged = response.status
+                async with http.get(url.replace("video.mp4", "autre.mp4")) as response:
+                    other = response.status
+            return full, part, forged, other
+        finally:
+            await storage.aclose()
+
+    with patch.object(os, "sendfile", wraps=os.sendfile) as sendfile:
+        full, part, forged, other = asyncio.run(scenario())
+
+    assert full == (200, "video/mp4", content)
+    assert part == (206, f"bytes 1000-1999/{len(content)}", content[1000:2000])
+    assert (forged, other) == (403, 403)
+    assert sendfile.called
+
+
+# Une leçon uploadée avec le backend filesystem est lisible via l'API
+def test_lesson_upload_with_filesystem_backend(client: TestClient, storage: FilesystemStorage):
+    from ..services.content_proxy import content_proxy
+
+    course_id = client.post("/api/courses", json={"title": "Cours local", "slug": "cours-local"}).json()["id"]
+    response = client.post(
+        "/api/lessons",
+        data={"course_id": course_id, "title": "Support local", "content_type": "pdf"},
+        files={"file": ("support.pdf", b"%PDF-1.4 local", "application/pdf")},
+    )
+    assert response.status_code == 200, response.text
+    lesson = response.json()
+    assert os.path.isfile(storage.path(lesson["content_url"]))
+
+    content_proxy.infos.clear()
+    content = client.get(f"/api/lessons/{lesson['id']}/content")
+    assert content.status_code == 200
+    assert content.content == b"%PDF-1.4 local"
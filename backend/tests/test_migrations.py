@@ -0,0 +1,109 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import VARCHAR, event, inspect, text
+from sqlalchemy.dialects import mssql
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import create_engine
+
+from .. import migrations
+from ..models import Course
+from ..migrations import SCHEMA_VERSION, SchemaVersionError, check_schema_version, migrate
+
+
+@pytest.fixture(name="db_path")
+def db_path_fixture(tmp_path):
+    return tmp_path / "schema.db"
+
+
+def _check(db_path):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        try:
+            return await check_schema_version(engine)
+        finally:
+            await engine.dispose()
+    return asyncio.run(run())
+
+
+# Base neuve : tout est créé, puis un second passage ne fait plus que lire la version
+def test_migrate_fresh_database_is_idempotent(db_path):
+    engine = create_engine(f"sqlite:///{db_path}")
+    with pytest.raises(SchemaVersionError):
+        _check(db_path)
+
+    assert migrate(engine) == SCHEMA_VERSION
+    assert {"course", "lesson", "quiz", "schema_version"} <= set(inspect(engine).get_table_names())
+    assert _check(db_path) == SCHEMA_VERSION
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    assert migrate(engine) == SCHEMA_VERSION
+    assert not any(s.lstrip().upper().startswith(("CREATE", "ALTER", "UPDATE")) for s in statements)
+
+
+# Base créée par l'ancien create_all (sans course.version ni index du catalogue) : mise à niveau sans perte
+def test_migrate_upgrades_legacy_schema(db_path):
+    engine = create_engine(f"sqlite:///{db_path}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE course (id INTEGER PRIMARY KEY, title VARCHAR(255) NOT NULL, description VARCHAR, "
+            "category VARCHAR(12) NOT NULL, level VARCHAR, image_url VARCHAR, slug VARCHAR(255) NOT NULL, created_at DATETIME NOT NULL)"
+        ))
+        conn.execute(text(
+            "INSERT INTO course (id, title, category, slug, created_at) VALUES (1, 'Ancien', 'programming', 'ancien', '2024-01-01')"
+        ))
+
+    assert migrate(engine) == SCHEMA_VERSION
+
+    inspector = inspect(engine)
+    assert "version" in {c["name"] for c in inspector.get_columns("course")}
+    assert "ix_course_created_at_id" in {ix["name"] for ix in inspector.get_indexes("course")}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT title, version FROM course")).one() == ("Ancien", 0)
+
+    # Un worker plus récent que la base refuse de démarrer
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE schema_version SET version = 1"))
+    with pytest.raises(SchemaVersionError):
+        _check(db_path)
+
+
+# Compteurs de références : une référence par leçon pour les fichiers déjà en place
+def test_blob_refs_backfilled_from_lessons(db_path):
+    engine = create_engine(f"sqlite:///{db_path}")
+    migrate(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE blobref"))
+        conn.execute(text("UPDATE schema_version SET version = 7"))
+        conn.execute(text(
+            "INSERT INTO course (id, title, category, slug, created_at, version) VALUES (1, 'C', 'programming', 'c', '2024-01-01', 0)"
+        ))
+        for i, url in enumerate(["a.pdf", "a.pdf", "b.mp4", "https://example.com", None]):
+            conn.execute(
+                text("INSERT INTO lesson (title, content_type, content_url, \"order\", course_id) VALUES (:t, 'pdf', :u, :o, 1)"),
+                {"t": f"L{i}", "u": url, "o": i},
+            )
+
+    assert migrate(engine) == SCHEMA_VERSION
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT blob_name, refcount FROM blobref ORDER BY blob_name")).all() == [("a.pdf", 2), ("b.mp4", 1)]
+        # Et mis en file pour l'extraction des métadonnées
+        assert conn.execute(text("SELECT blob_name, status FROM lessonmetadata ORDER BY blob_name")).all() == [
+            ("a.pdf", "pending"), ("b.mp4", "pending"),
+        ]
+
+
+# SQL Server n'indexe pas VARCHAR(max) : course.level est borné avant la création de l'index du catalogue
+def test_course_level_bounded_before_catalog_index(monkeypatch):
+    assert "level VARCHAR(50) NULL" in str(CreateTable(Course.__table__).compile(dialect=mssql.dialect()))
+
+    calls = []
+    inspector = SimpleNamespace(get_columns=lambda table: [{"name": "level", "type": VARCHAR()}])
+    monkeypatch.setattr(migrations, "inspect", lambda conn: inspector)
+    monkeypatch.setattr(migrations, "_create_missing_indexes", lambda conn, table: calls.append(("index", table)))
+    conn = SimpleNamespace(dialect=mssql.dialect(), execute=lambda statement: calls.append(str(statement)))
+    migrations._course_catalog_indexes(conn)
+    assert calls == ["ALTER TABLE course ALTER COLUMN level VARCHAR(50) NULL", ("index", "course")]
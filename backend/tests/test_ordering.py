@@ -0,0 +1,60 @@
+import random
+
+from ..services.ordering import ORDER_GAP, next_order, plan_reorder
+
+
+def _apply(current, new_ids):
+    changes, renumbered = plan_reorder(current, new_ids)
+    result = {**current, **changes}
+    # Le nouvel ordre est bien celui demandé
+    assert sorted(new_ids, key=lambda i: result[i]) == new_ids
+    assert len(set(result.values())) == len(result)
+    return changes, renumbered
+
+
+def test_moving_one_lesson_rewrites_one_row():
+    current = {i: next_order((i - 1) * ORDER_GAP if i > 1 else None) for i in range(1, 101)}
+    ids = list(current)
+
+    # Dernière leçon placée en tête
+    changes, renumbered = _apply(current, [ids[-1]] + ids[:-1])
+    assert list(changes) == [100] and not renumbered
+    assert changes[100] < current[1]
+
+    # Au milieu : entre ses deux nouvelles voisines
+    changes, _ = _apply(current, ids[:10] + [ids[50]] + ids[10:50] + ids[51:])
+    assert changes == {51: (current[10] + current[11]) // 2}
+    assert plan_reorder(current, ids) == ({}, False)
+
+
+def test_renumbers_only_when_gap_is_exhausted():
+    # Anciennes valeurs 1, 2, 3... : plus de place entre deux voisines
+    current = {1: 1, 2: 2, 3: 3, 4: 4}
+    changes, renumbered = _apply(current, [1, 4, 2, 3])
+    assert renumbered
+    assert {**current, **changes} == {1: ORDER_GAP, 4: 2 * ORDER_GAP, 2: 3 * ORDER_GAP, 3: 4 * ORDER_GAP}
+
+    # Insérer répétitivement au même endroit finit par épuiser l'écart
+    current = {1: ORDER_GAP, 2: 2 * ORDER_GAP}
+    moves = 0
+    for new_id in range(3, 30):
+        current[new_id] = 3 * ORDER_GAP
+        order = sorted(current, key=current.get)
+        order.insert(1, order.pop())  # la nouvelle leçon juste après la première
+        changes, renumbered = _apply(current, order)
+        current.update(changes)
+        if renumbered:
+            break
+        moves += 1
+        assert len(changes) == 1
+    assert renumbered and moves >= 9
+
+
+def test_random_permutations_keep_requested_order():
+    rng = random.Random(7)
+    current = {i: rng.randint(-5, 5) * 10 for i in range(1, 40)}  # doublons compris
+    for _ in range(200):
+        ids = list(current)
+        rng.shuffle(ids)
+        changes, _ = _apply(current, ids)
+        current.update(changes)
@@ -0,0 +1,174 @@
+from unittest.mock import AsyncMock, patch
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+import pytest
+
+from backend.main import app
+from ..routes import courses, storage
+from ..services.blob_service import BlobInfo
+from ..services import query_budget
+from ..services.attempts import attempt_buffer
+from ..services.query_budget import QueryBudgetExceeded, unbudgeted
+from .test_api import client_fixture, count_queries, _quiz_payload  # noqa: F401
+
+# Budget déclaré par chaque route (le même que son @max_queries)
+BUDGETS = {
+    "list_courses": 1,
+    "create_course": 3,
+    "get_course": 1,
+    "get_course_bundle": 3,
+    "delete_course": 15,
+    "list_lessons_for_course": 2,
+    "reorder_lessons": 4,
+    "create_lesson": 9,
+    "get_lesson_details": 2,
+    "get_lesson_content": 1,
+    "update_lesson": 12,
+    "delete_lesson": 7,
+    "create_full_quiz": 6,
+    "replace_quiz_for_course": 8,
+    "list_quiz_for_course": 1,
+    "get_quiz_details_for_student": 1,
+    "get_quiz_details_for_editor": 2,
+    "submit_quiz": 8,
+    "submit_quiz_batch": 8,
+    "get_quiz_stats": 2,
+    "delete_quiz": 8,
+    "search": 0,
+    "upload_file": 2,
+    "delete_uploaded_file": 1,
+    "initiate_upload": 2,
+    "complete_upload": 10,
+    "sign_course_files": 2,
+}
+
+
+def _api_routes():
+    return [
+        route for route in app.routes
+        if isinstance(route, APIRoute) and route.endpoint.__module__.startswith("backend.routes")
+    ]
+
+
+@pytest.fixture(autouse=True)
+def raise_on_overrun(monkeypatch):
+    monkeypatch.setattr(query_budget, "QUERY_BUDGET_MODE", "raise")
+
+
+def test_query_budget_context_manager():
+    sync_engine = create_engine("sqlite://")
+    with sync_engine.connect() as conn:
+        with query_budget.query_budget(2, "ok") as budget:
+            conn.execute(text("SELECT 1"))
+            with unbudgeted():
+                conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 1"))
+        assert budget.count == 2
+
+        with pytest.raises(QueryBudgetExceeded, match="trop : 2 requêtes SQL pour un budget de 1"):
+            with query_budget.query_budget(1, "trop"):
+                conn.execute(text("SELECT 1"))
+                conn.execute(text("SELECT 1"))
+
+        # Mode warn : la requête aboutit, le dépassement est seulement signalé
+        query_budget.QUERY_BUDGET_MODE = "warn"
+        with query_budget.query_budget(0, "warn") as budget:
+            conn.execute(text("SELECT 1"))
+        assert budget.count == 1
+
+
+def test_every_route_declares_its_budget():
+    routes = _api_routes()
+    assert {route.endpoint.__name__ for route in routes} == set(BUDGETS)
+    for route in routes:
+        assert getattr(route.endpoint, "query_budget", None) == BUDGETS[route.endpoint.__name__], route.path
+
+
+def _dataset(client: TestClient, tag: str, size: int):
+    course_id = client.post("/api/courses", json={"title": f"Budget {tag}", "slug": f"budget-{tag}"}).json()["id"]
+    with patch.object(courses, "upload_deduplicated_async", return_value="fichier.pdf"):
+        lessons = [
+            client.post(
+                "/api/lessons",
+                data={"course_id": course_id, "title": f"Leçon budget {i}", "content_type": "pdf"},
+                files={"file": ("f.pdf", b"%PDF", "application/pdf")},
+            ).json()["id"]
+            for i in range(size)
+        ]
+    quiz_id = client.post(f"/api/courses/{course_id}/quiz", json=_quiz_payload(course_id, size)).json()["id"]
+    questions = client.get(f"/api/quiz/{quiz_id}/full").json()["questions"]
+    answers = [{"question_id": q["id"], "choice_id": q["choices"][1]["id"]} for q in questions]
+    return course_id, lessons, quiz_id, answers
+
+
+def _scenario(client: TestClient, tag: str, size: int):
+    """Appelle chaque route sur un jeu de données de `size` leçons / questions ; {route: requêtes SQL}"""
+    course_id, lessons, quiz_id, answers = _dataset(client, tag, size)
+    counts = {}
+
+    def call(name, method, url, status=200, **kwargs):
+        with count_queries() as statements:
+            response = client.request(method, url, **kwargs)
+        assert response.status_code == status, (name, response.text)
+        counts[name] = len(statements)
+        return response
+
+    call("list_courses", "GET", "/api/courses")
+    call("create_course", "POST", "/api/courses", json={"title": f"Budget bis {tag}"})
+    call("get_course", "GET", f"/api/courses/{course_id}")
+    call("get_course_bundle", "GET", f"/api/courses/{course_id}/full")
+    call("list_lessons_for_course", "GET", f"/api/courses/{course_id}/lessons")
+    call("reorder_lessons", "PATCH", f"/api/courses/{course_id}/lessons/order", json={"lesson_ids": lessons[::-1]})
+    with patch.object(courses, "upload_deduplicated_async", return_value=f"autre-{tag}.pdf"):
+        call("create_lesson", "POST", "/api/lessons",
+             data={"course_id": course_id, "title": "Leçon ajoutée", "content_type": "pdf"},
+             files={"file": ("f.pdf", b"%PDF", "application/pdf")})
+    call("get_lesson_details", "GET", f"/api/lessons/{lessons[0]}")
+    with patch.object(courses.content_proxy, "info", AsyncMock(return_value=None)):
+        call("get_lesson_content", "GET", f"/api/lessons/{lessons[0]}/content", status=404)
+    call("update_lesson", "PUT", f"/api/lessons/{lessons[0]}", json={"title": "Renommée", "course_id": course_id})
+
+    call("list_quiz_for_course", "GET", f"/api/courses/{course_id}/quiz")
+    call("get_quiz_details_for_student", "GET", f"/api/quiz/{quiz_id}")
+    call("get_quiz_details_for_editor", "GET", f"/api/quiz/{quiz_id}/full")
+    # Seuil d'écriture atteint dès la première copie : le coût du flush est compté
+    with patch.object(attempt_buffer, "max_size", 1):
+        call("submit_quiz", "POST", f"/api/quiz/{quiz_id}/submit", json=answers)
+        call("submit_quiz_batch", "POST", f"/api/quiz/{quiz_id}/submit/batch", json=[{"answers": answers}] * size)
+    call("get_quiz_stats", "GET", f"/api/quiz/{quiz_id}/stats")
+    replacement = _quiz_payload(course_id, size)
+    replacement["questions"].pop()
+    call("replace_quiz_for_course", "PUT", f"/api/courses/{course_id}/quiz", json=replacement)
+    call("create_full_quiz", "POST", f"/api/courses/{course_id}/quiz", json=_quiz_payload(course_id, size))
+
+    call("sign_course_files", "POST", "/api/storage/sign", json={"course_id": course_id})
+    # Chargement de l'index et relecture des documents écrits plus haut : hors budget, non comptés
+    client.get("/api/search", params={"q": "leçon budget"})
+    call("search", "GET", "/api/search", params={"q": "leçon budget"})
+    with patch.object(storage, "upload_deduplicated_async", return_value="fichier.pdf"):
+        call("upload_file", "POST", "/api/upload", files={"file": ("f.pdf", b"%PDF", "application/pdf")})
+    with patch.object(storage, "delete_file_from_blob_async", return_value=True):
+        call("delete_uploaded_file", "DELETE", "/api/upload/orphelin.pdf")
+    upload_target = {"method": "PUT", "url": "https://stockage/direct.pdf", "headers": {}}
+    with patch.object(storage, "generate_upload_url", return_value=upload_target):
+        upload_id = call("initiate_upload", "POST", "/api/uploads/initiate",
+                         json={"course_id": course_id, "filename": "direct.pdf", "size": 4, "mime_type": "application/pdf"}).json()["upload_id"]
+    with patch.object(storage, "get_blob_info_async", AsyncMock(return_value=BlobInfo(4, "application/pdf", '"1"'))):
+        call("complete_upload", "POST", "/api/uploads/complete", json={"upload_id": upload_id, "title": "Leçon directe"})
+
+    call("delete_lesson", "DELETE", f"/api/lessons/{lessons[1]}")
+    call("delete_quiz", "DELETE", f"/api/quiz/{quiz_id}")
+    call("delete_course", "DELETE", f"/api/courses/{course_id}")
+    return counts
+
+
+# Chaque route tient son budget, et son nombre de requêtes ne dépend pas de la taille des données
+def test_endpoints_stay_within_budget_for_any_dataset_size(client: TestClient):
+    small = _scenario(client, "petit", 2)
+    large = _scenario(client, "grand", 25)
+
+    assert set(small) == set(BUDGETS)
+    for name, budget in BUDGETS.items():
+        assert small[name] <= budget, (name, small[name])
+        assert large[name] == small[name], (name, small[name], large[name])
@@ -0,0 +1,122 @@
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.pool import StaticPool
+
+from ..models import Course, Lesson
+from ..services.invalidation import InvalidationBus
+from ..services.search_index import SearchIndex, tokenize
+
+
+def _index():
+    index = SearchIndex()
+    index.add("course", 1, "Introduction au Cloud", ["Découvrez l'élasticité et la haute disponibilité."])
+    index.add("course", 2, "Python pour débutants", ["Variables, boucles et fonctions."])
+    index.add("lesson", 10, "Les conteneurs", ["Docker et Kubernetes dans le cloud"], course_id=1)
+    index.add("lesson", 11, "Déploiement continu", ["Pipelines CI/CD vers Azure"], course_id=1)
+    return index
+
+
+def test_tokenize_folds_accents_and_drops_stop_words():
+    assert tokenize("L'Élasticité des Données à la demande") == ["elasticite", "donnees", "demande"]
+
+
+def test_bm25_ranking_accents_and_prefix():
+    index = _index()
+    # Le titre pèse plus lourd que le corps
+    assert [r["id"] for r in index.search("cloud")] == [1, 10]
+    assert index.search("ELASTICITE")[0]["id"] == 1
+    assert index.search("déploiement")[0]["id"] == 11
+    # Recherche par préfixe (saisie en cours)
+    assert index.search("kuber")[0]["id"] == 10
+    assert [r["id"] for r in index.search("cloud", kind="lesson")] == [10]
+    assert index.search("le la les") == []
+
+
+def test_incremental_update_and_remove():
+    index = _index()
+    index.add("lesson", 10, "Les machines virtuelles", ["Hyperviseurs"], course_id=1)
+    assert index.search("docker") == []
+    assert index.search("hyperviseur")[0]["id"] == 10
+    index.remove("lesson", 10)
+    assert index.search("hyperviseurs") == []
+    assert "hyperviseurs" not in index.terms
+    assert len(index) == 3
+
+
+def test_snapshot_round_trip(tmp_path):
+    index = _index()
+    index.course_versions = {1: 3, 2: 0}
+    path = str(tmp_path / "index.json")
+    index.save(path)
+
+    restored = SearchIndex()
+    assert restored.load(path) is True
+    assert restored.search("conteneurs") == index.search("conteneurs")
+    assert restored.course_versions == {1: 3, 2: 0}
+    assert restored.load(str(tmp_path / "absent.json")) is False
+
+
+# Snapshot dans un dossier modifiable par d'autres utilisateurs : ni écrit ni relu
+def test_snapshot_refused_in_shared_directory(tmp_path):
+    shared = tmp_path / "partage"
+    shared.mkdir()
+    path = str(shared / "index.json")
+    _index().save(path)
+    shared.chmod(0o777)
+    try:
+        assert SearchIndex().load(path) is False
+        assert _index().save(str(shared / "autre.json")) is False
+    finally:
+        shared.chmod(0o700)
+    assert SearchIndex().load(path) is True
+
+
+def _ids(index: SearchIndex, query: str):
+    return [(r["type"], r["id"]) for r in index.search(query)]
+
+
+# Deux workers, un seul snapshot : les suppressions et modifications de l'un ne reviennent pas chez l'autre
+def test_workers_stay_in_sync_and_snapshot_is_reconciled(tmp_path):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    path = str(tmp_path / "index.json")
+    with Session(engine) as session:
+        session.add(Course(id=1, title="Introduction au Cloud", slug="cloud"))
+        session.add(Lesson(id=10, course_id=1, title="Les conteneurs", content_text="Docker et Kubernetes"))
+        session.add(Lesson(id=11, course_id=1, title="Déploiement continu", content_text="Pipelines CI/CD"))
+        session.commit()
+
+        bus = InvalidationBus()
+        first, second = SearchIndex(), SearchIndex()
+        for index in (first, second):
+            bus.subscribe("lesson", index, keys=lambda lesson_id: [("lesson", lesson_id)])
+            index.ensure_ready(session, path)
+        assert _ids(first, "docker") == _ids(second, "docker") == [("lesson", 10)]
+
+        # Écritures de l'un des workers : leçon 10 supprimée, leçon 11 modifiée (version du cours incrémentée)
+        session.delete(session.get(Lesson, 10))
+        lesson = session.get(Lesson, 11)
+        lesson.title = "Déploiement sur Kubernetes"
+        session.get(Course, 1).version += 1
+        session.commit()
+        bus.publish("lesson", 10, 11)
+        for index in (first, second):
+            index.refresh(session)
+            assert _ids(index, "docker") == []
+            assert _ids(index, "kubernetes") == [("lesson", 11)]
+
+        # Snapshot écrit avant ces écritures (dernier worker arrêté) : relu, il est réconcilié avec la BDD
+        stale = SearchIndex()
+        assert stale.load(path) is True
+        assert _ids(stale, "docker") == [("lesson", 10)]
+        stale.save(path)
+        restarted = SearchIndex()
+        restarted.ensure_ready(session, path)
+        assert _ids(restarted, "docker") == []
+        assert _ids(restarted, "kubernetes") == [("lesson", 11)]
+        assert len(restarted) == 2
+
+        # Bus coupé (messages perdus) : réconciliation complète à la prochaine recherche
+        bus.resync()
+        assert first.ready is False
+        first.ensure_ready(session, path)
+        assert first.ready is True and len(first) == 2
@@ -22,11 +22,26 @@ interface LessonSummary {
   course_id: number;
 }
 
+interface QuizSummary {
+  id: number;
+  title: string;
+  description?: string | null;
+  order: number;
+  question_count: number;
+}
+
+// Réponse de GET /api/courses/{id}/full : cours + leçons + quiz en un appel
+interface CourseBundle extends CourseDetail {
+  lessons: LessonSummary[];
+  quizzes: QuizSummary[];
+}
+
 const CourseDetailPage: React.FC = () => {
   const { courseId } = useParams<{ courseId: string }>();
 
   const [course, setCourse] = useState<CourseDetail | null>(null);
   const [lessons, setLessons] = useState<LessonSummary[]>([]);
+  const [quizzes, setQuizzes] = useState<QuizSummary[]>([]);
   const [loading, setLoading] = useState<boolean>(true);
   const [error, setError] = useState<string>("");
 
@@ -38,23 +53,18 @@ const CourseDetailPage: React.FC = () => {
       setError("");
 
       try {
-        const [courseRes, lessonsRes] = await Promise.all([
-          apiFetch(`/api/courses/${courseId}`),
-          apiFetch(`/api/courses/${courseId}/lessons`),
-        ]);
+        const res = await apiFetch(`/api/courses/${courseId}/full`);
 
-        if (!courseRes.ok) {
-          throw new Error("Erreur HTTP cours " + courseRes.status);
-        }
-        if (!lessonsRes.ok) {
-          throw new Error("Erreur HTTP leçons " + lessonsRes.status);
+        if (!res.ok) {
+          throw new Error("Erreur HTTP cours " + res.status);
         }
 
-        const courseData: CourseDetail = await courseRes.json();
-        const lessonsData: LessonSummary[] = await lessonsRes.json();
+        const { lessons: lessonsData, quizzes: quizzesData, ...courseData }: CourseBundle =
+          await res.json();
 
         setCourse(courseData);
         setLessons(lessonsData);
+        setQuizzes(quizzesData);
       } catch (err) {
         const message = err instanceof Error ? err.message : "Erreur inconnue";
         setError(message);
@@ -179,7 +189,7 @@ const CourseDetailPage: React.FC = () => {
                     >
                       <div className="course-page-lesson-header">
                         <span className="course-page-lesson-order">
-                          Leçon {lesson.order ?? index + 1}
+                          Leçon {index + 1}
                         </span>
                         <h3 className="course-page-lesson-title">
                           {lesson.title}
@@ -214,7 +224,9 @@ const CourseDetailPage: React.FC = () => {
             <section className="course-page-section">
               <h2 className="course-page-section-title">Quiz du cours</h2>
               <p className="course-page-info">
-                Teste tes connaissances ou configure le quiz associé à ce cours.
+                {quizzes.length > 0
+                  ? `${quizzes[0].title} · ${quizzes[0].question_count} question(s)`
+                  : "Teste tes connaissances ou configure le quiz associé à ce cours."}
               </p>
               <div className="course-page-quiz-actions">
                 <Link
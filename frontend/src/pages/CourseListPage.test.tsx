@@ -52,15 +52,27 @@ describe('CourseListPage', () => {
     expect(screen.getByText('Beginner')).toBeInTheDocument();
   });
 
-  test('Le filtre de recherche fonctionne', async () => {
+  test('Le filtre de recherche interroge le serveur', async () => {
     const fakeCourses = [
-      { id: 1, title: 'Python', category: 'Backend' },
-      { id: 2, title: 'CSS Master', category: 'Frontend' },
+      { id: 1, title: 'Python', category: 'Programming' },
+      { id: 2, title: 'CSS Master', category: 'Design' },
     ];
 
-    (global.fetch as jest.Mock).mockResolvedValue({
+    (global.fetch as jest.Mock).mockImplementation((url: string) => {
+      if (url.includes('/lessons')) {
+        return Promise.resolve({ ok: true, json: () => Promise.resolve([]) });
+      }
+      // Filtres appliqués par l'API (title_prefix, category)
+      const params = new URL(url, 'http://localhost').searchParams;
+      const items = fakeCourses.filter(
+        (c) =>
+          c.title.startsWith(params.get('title_prefix') ?? '') &&
+          (!params.get('category') || c.category === params.get('category'))
+      );
+      return Promise.resolve({
         ok: true,
-        json: () => Promise.resolve(fakeCourses),
+        json: () => Promise.resolve({ items, next_cursor: null }),
+      });
     });
 
     render(
@@ -74,8 +86,42 @@ describe('CourseListPage', () => {
     const searchInput = screen.getByPlaceholderText(/Titre du cours/i);
     fireEvent.change(searchInput, { target: { value: 'CSS' } });
 
-    expect(screen.queryByText('Python')).not.toBeInTheDocument();
+    await waitFor(() => expect(screen.queryByText('Python')).not.toBeInTheDocument());
     expect(screen.getByText('CSS Master')).toBeInTheDocument();
+    expect(global.fetch).toHaveBeenCalledWith(`${API_BASE_URL}/api/courses?title_prefix=CSS`, undefined);
+
+    fireEvent.change(searchInput, { target: { value: '' } });
+    fireEvent.change(screen.getByLabelText(/Catégorie/i), { target: { value: 'Programming' } });
+
+    await waitFor(() => expect(screen.getByText('Python')).toBeInTheDocument());
+    expect(screen.queryByText('CSS Master')).not.toBeInTheDocument();
+    expect(global.fetch).toHaveBeenCalledWith(`${API_BASE_URL}/api/courses?category=Programming`, undefined);
+  });
+
+  test('Charge la page suivante avec next_cursor', async () => {
+    (global.fetch as jest.Mock).mockImplementation((url: string) => {
+      if (url.includes('/lessons')) {
+        return Promise.resolve({ ok: true, json: () => Promise.resolve([]) });
+      }
+      const page = url.includes('cursor=page-2')
+        ? { items: [{ id: 2, title: 'Deuxième page' }], next_cursor: null }
+        : { items: [{ id: 1, title: 'Première page' }], next_cursor: 'page-2' };
+      return Promise.resolve({ ok: true, json: () => Promise.resolve(page) });
+    });
+
+    render(
+      <BrowserRouter>
+        <CourseListPage />
+      </BrowserRouter>
+    );
+
+    await waitFor(() => expect(screen.getByText('Première page')).toBeInTheDocument());
+    fireEvent.click(screen.getByText(/Charger plus de cours/i));
+
+    await waitFor(() => expect(screen.getByText('Deuxième page')).toBeInTheDocument());
+    expect(screen.getByText('Première page')).toBeInTheDocument();
+    // Dernière page : plus de bouton
+    expect(screen.queryByText(/Charger plus de cours/i)).not.toBeInTheDocument();
   });
 
   test('Gère les erreurs API', async () => {
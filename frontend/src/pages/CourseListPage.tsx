@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import { Link } from "react-router-dom";
 import { apiFetch } from "../config/api";
 import "./CourseListPage.css";
@@ -12,66 +12,138 @@ export type CourseSummary = {
   lessonCount?: number;
 };
 
+type CoursePage = {
+  items: CourseSummary[];
+  next_cursor: string | null;
+};
+
+// Valeurs de CategoryName côté API
+const CATEGORIES: { value: string; label: string }[] = [
+  { value: "Programming", label: "Programmation" },
+  { value: "Cloud", label: "Cloud" },
+  { value: "Data Science", label: "Data Science" },
+  { value: "Design", label: "Design" },
+  { value: "Marketing", label: "Marketing" },
+  { value: "Business", label: "Business" },
+];
+
+// Délai après la dernière frappe avant d'interroger l'API
+const SEARCH_DEBOUNCE_MS = 300;
+
+// Une page du catalogue, filtrée côté serveur (title_prefix, category)
+const fetchCoursePage = (
+  titlePrefix: string,
+  category: string,
+  cursor?: string
+): Promise<CoursePage> => {
+  const params = new URLSearchParams();
+  if (titlePrefix) params.set("title_prefix", titlePrefix);
+  if (category) params.set("category", category);
+  if (cursor) params.set("cursor", cursor);
+  const query = params.toString();
+  return apiFetch(`/api/courses${query ? `?${query}` : ""}`)
+    .then((res) => {
+      if (!res.ok) {
+        throw new Error("Erreur HTTP " + res.status);
+      }
+      return res.json();
+    })
+    .then((data: CourseSummary[] | CoursePage) =>
+      Array.isArray(data)
+        ? { items: data, next_cursor: null }
+        : { items: data.items, next_cursor: data.next_cursor ?? null }
+    );
+};
+
+const errorMessage = (err: unknown) =>
+  err instanceof Error ? err.message : "Erreur inconnue";
+
 const CourseListPage: React.FC = () => {
   const [courses, setCourses] = useState<CourseSummary[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [loading, setLoading] = useState<boolean>(true);
+  const [loadingMore, setLoadingMore] = useState<boolean>(false);
   const [error, setError] = useState<string>("");
   const [search, setSearch] = useState("");
+  const [titlePrefix, setTitlePrefix] = useState("");
+  const [category, setCategory] = useState("");
   const [lessonCounts, setLessonCounts] = useState<Record<number, number>>({});
+  // Incrémenté à chaque changement de filtre : les pages d'une ancienne recherche sont ignorées
+  const listGeneration = useRef(0);
+  const countedCourses = useRef<Set<number>>(new Set());
+
+  useEffect(() => {
+    const timer = setTimeout(() => setTitlePrefix(search.trim()), SEARCH_DEBOUNCE_MS);
+    return () => clearTimeout(timer);
+  }, [search]);
 
+  // Première page à chaque changement de filtre
   useEffect(() => {
-    apiFetch("/api/courses")
-      .then((res) => {
-        if (!res.ok) {
-          throw new Error("Erreur HTTP " + res.status);
-        }
-        return res.json();
+    const generation = ++listGeneration.current;
+    setLoading(true);
+    setError("");
+    fetchCoursePage(titlePrefix, category)
+      .then((page) => {
+        if (generation !== listGeneration.current) return;
+        setCourses(page.items);
+        setNextCursor(page.next_cursor);
       })
-      .then((data: CourseSummary[]) => {
-        setCourses(data);
+      .catch((err: unknown) => {
+        if (generation !== listGeneration.current) return;
+        setError(errorMessage(err));
+      })
+      .finally(() => {
+        if (generation === listGeneration.current) setLoading(false);
+      });
+  }, [titlePrefix, category]);
+
+  // Page suivante (curseur renvoyé par l'API), ajoutée à la liste
+  const loadMore = () => {
+    if (!nextCursor || loadingMore) return;
+    const generation = listGeneration.current;
+    setLoadingMore(true);
+    fetchCoursePage(titlePrefix, category, nextCursor)
+      .then((page) => {
+        if (generation !== listGeneration.current) return;
+        setCourses((previous) => [...previous, ...page.items]);
+        setNextCursor(page.next_cursor);
       })
       .catch((err: unknown) => {
-        const message = err instanceof Error ? err.message : "Erreur inconnue";
-        setError(message);
+        if (generation !== listGeneration.current) return;
+        setError(errorMessage(err));
       })
-      .finally(() => setLoading(false));
-  }, []);
+      .finally(() => setLoadingMore(false));
+  };
 
   // Fetch lessons for each course to compute counts (lessonCount not provided by API)
+  // Only for courses not counted yet: "load more" and filters don't refetch known courses
   useEffect(() => {
-    if (!courses.length) return;
+    const missing = courses.filter((c) => !countedCourses.current.has(c.id));
+    if (!missing.length) return;
+    missing.forEach((c) => countedCourses.current.add(c.id));
 
-    let cancelled = false;
     const loadCounts = async () => {
       try {
         const lessonsArrays = await Promise.all(
-          courses.map((c) =>
+          missing.map((c) =>
             apiFetch(`/api/courses/${c.id}/lessons`)
               .then((res) => (res.ok ? res.json() : Promise.resolve([])))
               .catch(() => [])
           )
         );
-        if (cancelled) return;
         const counts: Record<number, number> = {};
         lessonsArrays.forEach((arr, idx) => {
-          const courseId = courses[idx].id;
+          const courseId = missing[idx].id;
           counts[courseId] = Array.isArray(arr) ? arr.length : 0;
         });
-        setLessonCounts(counts);
+        setLessonCounts((previous) => ({ ...previous, ...counts }));
       } catch {
         // Ignore count errors silently
       }
     };
     loadCounts();
-    return () => {
-      cancelled = true;
-    };
   }, [courses]);
 
-  const filteredCourses = courses.filter((course) =>
-    course.title.toLowerCase().includes(search.toLowerCase())
-  );
-
   return (
     <section className="catalog-wrapper">
       {/* Bloc titre + description */}
@@ -93,12 +165,28 @@ const CourseListPage: React.FC = () => {
           <input
             id="course-search"
             type="text"
-            placeholder="Titre du cours, catégorie..."
+            placeholder="Titre du cours..."
             value={search}
             onChange={(e) => setSearch(e.target.value)}
             className="catalog-search-input"
           />
         </div>
+        <label htmlFor="course-category" className="catalog-search-label catalog-filter-label">
+          Catégorie
+        </label>
+        <select
+          id="course-category"
+          value={category}
+          onChange={(e) => setCategory(e.target.value)}
+          className="catalog-category-select"
+        >
+          <option value="">Toutes les catégories</option>
+          {CATEGORIES.map((c) => (
+            <option key={c.value} value={c.value}>
+              {c.label}
+            </option>
+          ))}
+        </select>
       </div>
 
       {/* Messages info */}
@@ -114,13 +202,13 @@ const CourseListPage: React.FC = () => {
       {/* Liste des cours */}
       {!loading && !error && (
         <>
-          {filteredCourses.length === 0 ? (
+          {courses.length === 0 ? (
             <p className="catalog-info-text">
               Aucun cours ne correspond à ta recherche.
             </p>
           ) : (
             <div className="catalog-grid">
-              {filteredCourses.map((course) => (
+              {courses.map((course) => (
                 <Link
                   key={course.id}
                   to={`/courses/${course.id}`}
@@ -161,6 +249,19 @@ const CourseListPage: React.FC = () => {
               ))}
             </div>
           )}
+
+          {nextCursor && (
+            <div className="catalog-load-more">
+              <button
+                type="button"
+                className="course-btn-outline"
+                onClick={loadMore}
+                disabled={loadingMore}
+              >
+                {loadingMore ? "Chargement..." : "Charger plus de cours"}
+              </button>
+            </div>
+          )}
         </>
       )}
     </section>
@@ -204,7 +204,7 @@ const LessonCreatePage: React.FC = () => {
                     min={0}
                     value={form.order}
                     onChange={handleChange}
-                    placeholder="0, 1, 2…"
+                    placeholder="0 = à la fin du cours"
                   />
                 </div>
               </div>
@@ -1,3 +1,6 @@
+import os
+import shutil
+import tempfile
 import multiprocessing
 
 max_requests = 1000
@@ -8,3 +11,44 @@ timeout = 230
 num_cpus = multiprocessing.cpu_count()
 workers = (num_cpus * 2) + 1
 worker_class = "uvicorn.workers.UvicornWorker"
+
+# --- MÉTRIQUES PROMETHEUS (agrégées sur tous les workers) ---
+# Défini ici, avant le fork : chaque worker hérite de la variable
+multiproc_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "elearning-prometheus")
+)
+
+# --- INVALIDATION DES CACHES ENTRE WORKERS (voir backend/services/invalidation.py) ---
+# Un socket Unix par worker dans ce dossier ; sans effet si CACHE_BUS_BACKEND=redis ou none
+cache_bus_dir = os.environ.setdefault(
+    "CACHE_BUS_DIR", os.path.join(tempfile.gettempdir(), "elearning-cache-bus")
+)
+
+# --- MIGRATIONS DU SCHÉMA (une fois, dans le master, avant le fork des workers) ---
+# Les workers ne font ensuite qu'une vérification de version ; RUN_MIGRATIONS=false si
+# les migrations sont lancées à part (python -m backend.migrations)
+run_migrations = os.getenv("RUN_MIGRATIONS", "true").lower() in ("1", "true", "yes")
+
+def on_starting(server):
+    # On repart d'un dossier vide : les fichiers d'un ancien démarrage fausseraient les compteurs
+    shutil.rmtree(multiproc_dir, ignore_errors=True)
+    os.makedirs(multiproc_dir, exist_ok=True)
+    # Sockets d'un ancien démarrage : plus personne ne les lit
+    shutil.rmtree(cache_bus_dir, ignore_errors=True)
+    os.makedirs(cache_bus_dir, exist_ok=True)
+
+    if run_migrations:
+        from backend.migrations import migrate
+        from backend.database import get_engine
+        version = migrate()
+        # Pas de connexion héritée par les workers forkés
+        get_engine().dispose()
+        server.log.info(f"Schéma à jour (version {version})")
+
+def child_exit(server, worker):
+    # Worker recyclé (max_requests) : ses valeurs restent comptées, ses jauges "live" sont retirées
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid, multiproc_dir)
+    # Son socket d'invalidation ne sera plus lu
+    from backend.services.invalidation import remove_worker_sockets
+    remove_worker_sockets(cache_bus_dir, worker.pid)